@@ -45,12 +45,116 @@ class Config:
     REPLY_ON_NO_MATCH = REPLY_ON_NO_MATCH_RAW in ('true', '1', 't')
     logger.info(f"REPLY_ON_NO_MATCH установлен в: {REPLY_ON_NO_MATCH}")
 
+    # Локальный движок правил (keyword/regex без вызова RouterAgent)
+    LOCAL_RULE_ENGINE = os.getenv('LOCAL_RULE_ENGINE', 'true').lower() in ('true', '1', 't')
+    # Если True, сработавшее keyword/regex правило не ждет оценки description_match правил с более высоким приоритетом
+    # (кроме правил с uses_history: true). По умолчанию выключено: порядок приоритетов rules.yaml соблюдается строго.
+    LOCAL_RULES_KEYWORD_PRECEDENCE = os.getenv('LOCAL_RULES_KEYWORD_PRECEDENCE', 'false').lower() in ('true', '1', 't')
+    logger.info(f"LOCAL_RULE_ENGINE: {LOCAL_RULE_ENGINE}, LOCAL_RULES_KEYWORD_PRECEDENCE: {LOCAL_RULES_KEYWORD_PRECEDENCE}")
+
+    # Локальный детектор языка: порог уверенности, ниже которого вызывается LanguageValidatorAgent
+    LANGUAGE_DETECTOR_CONFIDENCE = float(os.getenv('LANGUAGE_DETECTOR_CONFIDENCE', '0.7'))
+    LANGUAGE_CACHE_SIZE = int(os.getenv('LANGUAGE_CACHE_SIZE', '4096'))
+    logger.info(f"LANGUAGE_DETECTOR_CONFIDENCE: {LANGUAGE_DETECTOR_CONFIDENCE}")
+
+    # Спекулятивный режим: валидация языка и маршрутизация выполняются параллельно
+    SPECULATIVE_ROUTING = os.getenv('SPECULATIVE_ROUTING', 'false').lower() in ('true', '1', 't')
+    logger.info(f"SPECULATIVE_ROUTING: {SPECULATIVE_ROUTING}")
+
+    # Кэш решений RouterAgent (размер 0 отключает кэш, TTL в секундах)
+    ROUTER_CACHE_SIZE = int(os.getenv('ROUTER_CACHE_SIZE', '2048'))
+    ROUTER_CACHE_TTL = float(os.getenv('ROUTER_CACHE_TTL', '3600'))
+    ROUTER_CACHE_HISTORY_TURNS = int(os.getenv('ROUTER_CACHE_HISTORY_TURNS', '4'))
+    logger.info(f"ROUTER_CACHE_SIZE: {ROUTER_CACHE_SIZE}, ROUTER_CACHE_TTL: {ROUTER_CACHE_TTL}s")
+
+    # Режим предварительной обработки: 'two_call' (LanguageValidator + RouterAgent) или 'combined' (один TriageAgent)
+    TRIAGE_MODE = os.getenv('TRIAGE_MODE', 'two_call').lower()
+    if TRIAGE_MODE not in ('two_call', 'combined'):
+        logger.error(f"Некорректное значение TRIAGE_MODE: '{TRIAGE_MODE}'. Используется 'two_call'.")
+        TRIAGE_MODE = 'two_call'
+    logger.info(f"TRIAGE_MODE: {TRIAGE_MODE}")
+
+    # Семантический пре-роутер: description_match условия с порогами в rules.yaml решаются по эмбеддингам
+    SEMANTIC_ROUTER = os.getenv('SEMANTIC_ROUTER', 'false').lower() in ('true', '1', 't')
+    SEMANTIC_ROUTER_MODEL = os.getenv('SEMANTIC_ROUTER_MODEL', 'text-embedding-3-small')
+    logger.info(f"SEMANTIC_ROUTER: {SEMANTIC_ROUTER} (model: {SEMANTIC_ROUTER_MODEL})")
+
+    # Семантический кэш ответов AnswerAgent (похожие вопросы без контекстных отсылок получают готовый ответ)
+    ANSWER_CACHE = os.getenv('ANSWER_CACHE', 'false').lower() in ('true', '1', 't')
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))
+    ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '86400'))
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+    logger.info(f"ANSWER_CACHE: {ANSWER_CACHE} (size: {ANSWER_CACHE_SIZE}, ttl: {ANSWER_CACHE_TTL}s, threshold: {ANSWER_CACHE_THRESHOLD})")
+
+    # Потоковая отправка ответа AnswerAgent: первое сообщение по мере генерации, затем правки
+    ANSWER_STREAMING = os.getenv('ANSWER_STREAMING', 'false').lower() in ('true', '1', 't')
+    ANSWER_STREAMING_EDIT_INTERVAL = float(os.getenv('ANSWER_STREAMING_EDIT_INTERVAL', '1.5'))
+    ANSWER_STREAMING_MIN_CHARS = int(os.getenv('ANSWER_STREAMING_MIN_CHARS', '40'))
+    logger.info(f"ANSWER_STREAMING: {ANSWER_STREAMING} (edit interval: {ANSWER_STREAMING_EDIT_INTERVAL}s)")
+
+    # Количество одновременно обрабатываемых обновлений (1 - последовательная обработка).
+    # Сообщения одного пользователя всегда обрабатываются по порядку.
+    MAX_CONCURRENT_UPDATES = max(1, int(os.getenv('MAX_CONCURRENT_UPDATES', '1')))
+    logger.info(f"MAX_CONCURRENT_UPDATES: {MAX_CONCURRENT_UPDATES}")
+
+    # Режим получения обновлений: polling (getUpdates) или webhook (встроенный HTTP(S) сервер)
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    if BOT_MODE not in ('polling', 'webhook'):
+        logger.warning(f"Неизвестный BOT_MODE '{BOT_MODE}', используется 'polling'.")
+        BOT_MODE = 'polling'
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+    # Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (1-256 символов: A-Z, a-z, 0-9, _ и -)
+    WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN') or None
+    # Публичный URL webhook. Если задан, бот сам вызывает setWebhook при запуске
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL') or None
+    WEBHOOK_TLS_CERT = os.getenv('WEBHOOK_TLS_CERT') or None
+    WEBHOOK_TLS_KEY = os.getenv('WEBHOOK_TLS_KEY') or None
+    WEBHOOK_QUEUE_SIZE = max(1, int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000')))
+    logger.info(f"BOT_MODE: {BOT_MODE}")
+    if BOT_MODE == 'webhook':
+        logger.info(f"Webhook: {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} (TLS: {bool(WEBHOOK_TLS_CERT)}, queue: {WEBHOOK_QUEUE_SIZE})")
+        if not WEBHOOK_SECRET_TOKEN:
+            logger.warning("WEBHOOK_SECRET_TOKEN не задан: запросы к webhook не проверяются.")
+
+    # Количество рабочих процессов (1 - один процесс). При значении > 1 процесс-супервизор
+    # принимает обновления и распределяет их по процессам по хэшу пользователя.
+    WORKER_PROCESSES = max(1, int(os.getenv('WORKER_PROCESSES', '1')))
+    WORKER_QUEUE_SIZE = max(1, int(os.getenv('WORKER_QUEUE_SIZE', '1000')))
+    logger.info(f"WORKER_PROCESSES: {WORKER_PROCESSES}")
+
+    # Компактная история: последние сообщения дословно в пределах бюджета токенов,
+    # старые сообщения сворачиваются в резюме (обновляется в фоне)
+    HISTORY_COMPACTION = os.getenv('HISTORY_COMPACTION', 'false').lower() in ('true', '1', 't')
+    ROUTER_HISTORY_TOKENS = int(os.getenv('ROUTER_HISTORY_TOKENS', '400'))
+    ANSWER_HISTORY_TOKENS = int(os.getenv('ANSWER_HISTORY_TOKENS', '1200'))
+    HISTORY_SUMMARY_TOKENS = int(os.getenv('HISTORY_SUMMARY_TOKENS', '200'))
+    HISTORY_SUMMARY_MODEL = os.getenv('HISTORY_SUMMARY_MODEL', 'gpt-4o-mini')
+    logger.info(f"HISTORY_COMPACTION: {HISTORY_COMPACTION} (router: {ROUTER_HISTORY_TOKENS}, answer: {ANSWER_HISTORY_TOKENS}, summary: {HISTORY_SUMMARY_TOKENS} tokens)")
+
     # Настройки для Vision модели
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_VISION_MODEL = os.getenv('OPENAI_VISION_MODEL', 'gpt-4o-mini')
     OPENAI_VISION_PROMPT = os.getenv('OPENAI_VISION_PROMPT', 'Опиши, что изображено на этой картинке, кратко и по существу.')
     logger.info(f"Vision модель: {OPENAI_VISION_MODEL}")
 
+    # Изображения: бюджет пикселей (выбор PhotoSize и уменьшение), качество JPEG при пережатии
+    # (нужен Pillow) и размер кэша закодированных изображений и их описаний
+    IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', '1000000'))
+    IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+    IMAGE_CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', '256'))
+    logger.info(f"IMAGE_MAX_PIXELS: {IMAGE_MAX_PIXELS}, IMAGE_CACHE_SIZE: {IMAGE_CACHE_SIZE}")
+
+    # Логирование: запись в консоль/файл фоновым потоком через очередь
+    LOG_QUEUE = os.getenv('LOG_QUEUE', 'true').lower() in ('true', '1', 't')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    # Канал больших данных (промпты, контексты RAG, JSON роутера) на уровне DEBUG и доля выводимых записей
+    LOG_PAYLOADS = os.getenv('LOG_PAYLOADS', 'false').lower() in ('true', '1', 't')
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+    # Ограничения по логгерам, записей в секунду: "src.tools.rag_tools=5,src.bot.message_handler=20"
+    LOG_RATE_LIMITS = os.getenv('LOG_RATE_LIMITS', '')
+
     @staticmethod
     def validate_token():
         """Проверяет наличие токена."""
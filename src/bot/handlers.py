@@ -4,16 +4,29 @@
 
 from telegram import Update
 from telegram.ext import ContextTypes
-import base64
-import io
 
 from .config import Config, logger
 from .services import bot_services # Импортируем централизованные сервисы
 from .message_handler import handle_text_message # Импортируем основной обработчик
+from .update_processor import ChatOrderedUpdateProcessor
+from src.tools.rag_tools import document_retriever
+from src.prompts import prompt_manager
+from src.utils.logging_setup import logging_stats
 from openai import AsyncOpenAI
 
 # ========= Обработчики команд =========
 
+def reload_rules_and_prompts() -> bool:
+    """
+    Перечитывает rules.yaml и prompts.yaml в текущем процессе.
+    В многопроцессном режиме супервизор дополнительно рассылает перезагрузку всем рабочим процессам.
+    """
+    success = bot_services.rules_manager.reload_rules()
+    # Промпты перечитываются вместе с правилами; смена версии промптов сбрасывает кэш ответов
+    if not prompt_manager.reload_prompts():
+        logger.warning("Не удалось перечитать prompts.yaml при перезагрузке правил.")
+    return success
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, memory_manager=None) -> None:
     """Обработчик команды /start."""
     user_id = update.effective_user.id
@@ -22,6 +35,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE, memory_manag
     response = "Hello! I am a support bot. How can I help you?"
 
     if memory_manager:
+        await memory_manager.load_user(user_id)
         memory_manager.add_message(user_id, "assistant", response)
     
     await update.message.reply_text(response)
@@ -34,12 +48,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE, memor
     response = "You can ask me any questions, and I will do my best to help you."
 
     if memory_manager:
+        await memory_manager.load_user(user_id)
         memory_manager.add_message(user_id, "assistant", response)
     
     await update.message.reply_text(response)
 
 async def reload_rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обработчик команды /reload_rules для перезагрузки правил из rules.yaml."""
+    """Обработчик команды /reload_rules для перезагрузки правил из rules.yaml (и промптов из prompts.yaml)."""
     user_id = update.effective_user.id
     logger.info(f"Получена команда /reload_rules от пользователя {user_id}.")
 
@@ -68,7 +83,7 @@ async def reload_rules_command(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     logger.info(f"Администратор {user_id} инициировал перезагрузку правил.")
-    success = bot_services.rules_manager.reload_rules()
+    success = reload_rules_and_prompts()
     
     if success:
         num_rules = len(bot_services.rules_manager.get_rules())
@@ -84,6 +99,53 @@ async def reload_rules_command(update: Update, context: ContextTypes.DEFAULT_TYP
             text="Ошибка при перезагрузке правил. Детали ошибки залогированы."
         )
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обработчик команды /stats: показывает статистику кэшей (только для администраторов)."""
+    user_id = update.effective_user.id
+    logger.info(f"Получена команда /stats от пользователя {user_id}.")
+
+    if user_id not in Config.ADMIN_USER_IDS:
+        logger.warning(f"Неавторизованный пользователь {user_id} попытался выполнить /stats.")
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="У вас нет прав для выполнения этой команды."
+        )
+        return
+
+    sections = {
+        "Language cache": bot_services.language_validator.cache_stats(),
+    }
+    if bot_services.router_cache:
+        sections["Router cache"] = bot_services.router_cache.stats()
+    if bot_services.answer_cache:
+        sections["Answer cache"] = bot_services.answer_cache.stats()
+    if document_retriever:
+        rag_stats = document_retriever.cache_stats()
+        sections["RAG embedding cache"] = rag_stats["embeddings"]
+        sections["RAG result cache"] = {**rag_stats["results"], "store_version": rag_stats["store_version"]}
+
+    memory_manager = context.application.bot_data.get('memory_manager')
+    if memory_manager:
+        sections["Conversation memory"] = memory_manager.stats()
+    if bot_services.history_compactor:
+        sections["History summaries"] = bot_services.history_compactor.stats()
+    sections["Images"] = bot_services.image_pipeline.stats()
+    if bot_services.logger_agent.sink:
+        sections["Interaction log"] = bot_services.logger_agent.stats()
+    sections["Logging"] = logging_stats()
+
+    update_processor = context.application.update_processor
+    if isinstance(update_processor, ChatOrderedUpdateProcessor):
+        sections["Update queue"] = update_processor.stats()
+    webhook_server = context.application.bot_data.get('webhook_server')
+    if webhook_server:
+        sections["Webhook intake"] = webhook_server.stats()
+
+    lines = []
+    for title, stats in sections.items():
+        lines.append(f"{title}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+    await context.bot.send_message(chat_id=update.effective_chat.id, text="\n".join(lines))
+
 # ========= Обработчик изображений =========
 
 async def describe_image_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -105,16 +167,16 @@ async def describe_image_handler(update: Update, context: ContextTypes.DEFAULT_T
             logger.error(f"Клиент OpenAI не найден в контексте для чата {chat_id}.")
             raise ValueError("OpenAI client not configured.")
 
-        # 2. Получаем и скачиваем файл изображения в память
-        photo = update.message.photo[-1]  # Берем фото самого высокого разрешения
-        photo_file = await photo.get_file()
-        
-        image_stream = io.BytesIO()
-        await photo_file.download_to_memory(image_stream)
-        image_stream.seek(0)
-        
-        # 3. Кодируем изображение в base64
-        base64_image = base64.b64encode(image_stream.read()).decode('utf-8')
+        # 2. Описание этого изображения уже могло быть получено ранее (кэш по file_unique_id)
+        image_pipeline = bot_services.image_pipeline
+        description = image_pipeline.get_description(update.message.photo)
+        if description:
+            logger.info(f"Описание изображения из чата {chat_id} взято из кэша.")
+            await context.bot.send_message(chat_id=chat_id, text=description, reply_to_message_id=message_id)
+            return
+
+        # 3. Скачиваем изображение подходящего размера и кодируем в base64
+        base64_image = await image_pipeline.get_base64(update.message.photo)
 
         # 4. Отправляем запрос в LLM для получения описания
         logger.info(f"Отправка изображения из чата {chat_id} в Vision LLM ({Config.OPENAI_VISION_MODEL}).")
@@ -143,6 +205,7 @@ async def describe_image_handler(update: Update, context: ContextTypes.DEFAULT_T
         # 5. Отправляем ответ пользователю
         if description:
             logger.info(f"Успешно получено описание для изображения из чата {chat_id}.")
+            image_pipeline.store_description(update.message.photo, description)
             await context.bot.send_message(
                 chat_id=chat_id,
                 text=description,
@@ -160,4 +223,4 @@ async def describe_image_handler(update: Update, context: ContextTypes.DEFAULT_T
             reply_to_message_id=message_id
         )
 
-__all__ = ["start", "help_command", "reload_rules_command", "handle_text_message", "describe_image_handler"]
\ No newline at end of file
+__all__ = ["start", "help_command", "reload_rules_command", "stats_command", "handle_text_message", "describe_image_handler"]
\ No newline at end of file
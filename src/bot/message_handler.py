@@ -2,51 +2,70 @@
 # Этот файл содержит основную логику обработки текстовых сообщений от пользователя.
 
 import json
+import time
+import asyncio
 from datetime import datetime
-from telegram import Update
+from pydantic import ValidationError
+from telegram import Update, Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import ContextTypes
+from openai.types.responses import ResponseTextDeltaEvent
 from .config import Config, logger
 from .services import bot_services
-from src.bot_agents import RouterDecision, InteractionLog, ReplyHandoffData, RouterDecisionParams
+from src.bot_agents import RouterDecision, InteractionLog, ReplyHandoffData, RouterDecisionParams, TriageDecision
+from src.bot_agents.language_validator_agent import LanguageValidationResult
+from src.bot_agents.answer_cache import AnswerScope, is_context_dependent
 from src.utils.telegram_utils import MessageForwarder
+from src.utils.image_pipeline import LazyImage
+from src.utils.logging_setup import log_payload
 from src.bot_agents import answer_agent
-import base64
-import io
-from typing import Optional
+from typing import Optional, Dict, Awaitable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class RouterOutputError(Exception):
+    """Ответ RouterAgent не удалось разобрать как RouterDecision."""
+    pass
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE, memory_manager=None) -> None:
     """Обработчик для всех текстовых сообщений, включает валидацию языка."""
     user_id = update.effective_user.id
     text = update.message.text or update.message.caption or ""
     message_id = update.message.message_id
-    base64_image = None
-
-    # Получаем фото, если оно есть:
-    if update.message.photo:
-        photo = update.message.photo[-1]  # Берем фото самого высокого разрешения
-        photo_file = await photo.get_file()
-        
-        image_stream = io.BytesIO()
-        await photo_file.download_to_memory(image_stream)
-        image_stream.seek(0)
-        
-        # Кодируем изображение в base64
-        base64_image = base64.b64encode(image_stream.read()).decode('utf-8')
+    # Фото скачивается лениво: только если выбранное действие его использует
+    image = LazyImage(update.message.photo, bot_services.image_pipeline) if update.message.photo else None
 
-    logger.info(f"Received message from {user_id}. Text: '{text[:100]}...'. Image attached: {base64_image is not None}")
+    logger.info(f"Received message from {user_id}. Text: '{text[:100]}...'. Image attached: {image is not None}")
 
-    if not text and not base64_image:
+    if not text and not image:
         logger.warning(f"Empty message (no text, no photo) received from user {user_id}. Skipping.")
         return
 
     if memory_manager:
+        await memory_manager.load_user(user_id)
         memory_manager.add_message(user_id, "user", text)
 
-    # 1. Валидация языка
+    routing_available = bool(bot_services.router_agent and bot_services.rules_manager)
+    timings: Dict[str, float] = {}
+    started_at = time.perf_counter()
+
+    combined_triage = bool(bot_services.triage_agent and routing_available)
+    router_decision: Optional[RouterDecision] = None
+
+    # Спекулятивный режим: маршрутизация запускается параллельно с валидацией языка
+    router_task: Optional[asyncio.Task] = None
+    if Config.SPECULATIVE_ROUTING and routing_available and not combined_triage:
+        router_task = asyncio.create_task(_timed(decide_route(text, user_id, memory_manager), timings, "router"))
+
+    # 1. Валидация языка (в режиме combined - вместе с маршрутизацией, одним вызовом LLM)
     try:
-        validation_result = await bot_services.language_validator.validate_language(text)
+        if combined_triage:
+            validation_result, router_decision = await _timed(triage_message(text, user_id, memory_manager), timings, "triage")
+        else:
+            validation_result = await _timed(bot_services.language_validator.validate_language(text), timings, "language")
         logger.info(f"Language validation result for user {user_id}: is_english={validation_result.is_english}, detected_language={validation_result.detected_language}")
         if not validation_result.is_english:
+            _discard_router_task(router_task, user_id, timings)
             detected_lang = validation_result.detected_language or "an unknown language"
             reply_message = f"This chat is for English language communication. You texted me in {detected_lang}. Please rephrase your question in English."
             await update.message.reply_text(
@@ -54,6 +73,7 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                 reply_to_message_id=message_id)
             return
     except Exception as e:
+        _discard_router_task(router_task, user_id, timings)
         logger.error(f"Language validation error for user {user_id}: {e}", exc_info=True)
         await update.message.reply_text("Sorry, I had trouble processing the language of your message.", reply_to_message_id=message_id)
         return
@@ -61,34 +81,30 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     logger.info(f"Message from {user_id} passed language validation. Calling RouterAgent...")
 
     # Проверяем, что ключевые сервисы инициализированы
-    if not bot_services.router_agent or not bot_services.rules_manager:
+    if not routing_available:
         logger.error(f"RouterAgent или RulesManager не инициализирован. Отправка сообщения об ошибке пользователю {user_id}.")
         await update.message.reply_text(
             "Sorry, the message routing system is currently unavailable. Please try again later."
         )
         return
 
-    # 2. Запуск RouterAgent
+    # 2. Локальный движок правил, затем (при необходимости) RouterAgent.
+    # Решение применяется только после успешной валидации языка.
     try:
-        history = memory_manager.get_history_as_text(user_id) if memory_manager else ""
-        run_result = await bot_services.runner.run(
-            bot_services.router_agent,
-            text,
-            context={"history": history}
-        )
-        
-        raw_decision_str = run_result.final_output
-        logger.info(f"RouterAgent raw output for user {user_id}: {raw_decision_str}")
-
-        if not isinstance(raw_decision_str, str):
-            logger.error(f"RouterAgent for user {user_id} returned non-string output: {type(raw_decision_str)}. Expected JSON string.")
-            await update.message.reply_text("Sorry, I received an unexpected response from the routing system.")
-            return
-        
-        parsed_json_str = raw_decision_str.strip().removeprefix("```json").removesuffix("```").strip()
-        router_decision = RouterDecision.model_validate_json(parsed_json_str)
+        # В режиме combined маршрут уже может быть определен TriageAgent
+        if router_decision is None:
+            if router_task is not None:
+                router_decision = await router_task
+            else:
+                # triage_message уже проверил локальные правила, кэш и семантический пре-роутер
+                router_decision = await _timed(
+                    decide_route(text, user_id, memory_manager, check_locally=not combined_triage), timings, "router"
+                )
+        _log_stage_timings(user_id, timings, started_at, speculative=router_task is not None)
 
-        log_data = {
+        logger.info("RouterAgent decision for user %s: action=%s, matched_rule_id=%s",
+                    user_id, router_decision.action, router_decision.matched_rule_id)
+        log_payload(logger, "RouterAgent decision details: %s", lambda: json.dumps({
             "uid": user_id,
             "message_id": update.message.message_id,
             "q": text,
@@ -96,20 +112,169 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             "matched_rule_id": router_decision.matched_rule_id,
             "behavioral_rule_ids": router_decision.behavioral_rule_ids,
             "params": router_decision.params.model_dump_json(exclude_none=True)
-        }
-        logger.info(f"RouterAgent decision details: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        }, ensure_ascii=False, indent=2))
 
         # 3. Обработка решения RouterAgent
-        await execute_router_decision(update, context, router_decision, text, user_id, memory_manager, base64_image)
+        await execute_router_decision(update, context, router_decision, text, user_id, memory_manager, image)
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Ошибка декодирования JSON от RouterAgent для user {user_id}: {e}. Строка: '{raw_decision_str}'", exc_info=True)
+    except RouterOutputError as e:
+        logger.error(f"Ошибка разбора ответа RouterAgent для user {user_id}: {e}", exc_info=True)
         await update.message.reply_text("Sorry, I couldn't understand the response from the routing system.")
     except Exception as e:
         logger.error(f"Общая ошибка при обработке решения RouterAgent для user {user_id}: {e}", exc_info=True)
         await update.message.reply_text("Sorry, an unexpected error occurred while processing your message.")
 
-async def execute_router_decision(update: Update, context: ContextTypes.DEFAULT_TYPE, decision: RouterDecision, text: str, user_id: int, memory_manager, image_base64: Optional[str] = None) -> None:
+def get_history_for_prompt(memory_manager, user_id: int, budget: int) -> str:
+    """История для промпта: компактная (в пределах бюджета токенов), если включен HistoryCompactor."""
+    if not memory_manager:
+        return ""
+    if bot_services.history_compactor:
+        return bot_services.history_compactor.render(memory_manager, user_id, budget)
+    return memory_manager.get_history_as_text(user_id)
+
+async def decide_route_locally(text: str, user_id: int, memory_manager) -> Optional[RouterDecision]:
+    """
+    Определяет маршрут без chat-LLM: локальный движок правил, кэш решений,
+    затем семантический пре-роутер по эмбеддингам. None - нужен RouterAgent.
+    """
+    if Config.LOCAL_RULE_ENGINE:
+        router_decision = bot_services.router_agent.decide_locally(
+            text, keyword_precedence=Config.LOCAL_RULES_KEYWORD_PRECEDENCE
+        )
+        if router_decision is not None:
+            logger.info(f"Route for user {user_id} settled by the local rule engine, RouterAgent call skipped.")
+            return router_decision
+
+    if bot_services.router_cache:
+        recent_history = memory_manager.get_history(user_id) if memory_manager else []
+        cached_decision = bot_services.router_cache.get(text, recent_history)
+        if cached_decision is not None:
+            logger.info(f"Route for user {user_id} served from the router decision cache, RouterAgent call skipped.")
+            return cached_decision
+
+    if bot_services.semantic_router:
+        description_verdicts = await bot_services.semantic_router.classify(text)
+        if description_verdicts:
+            # Без keyword_precedence: правило выше по приоритету, которое пре-роутер не оценил
+            # (например, Reask_Questions с uses_history), всегда оставляет решение RouterAgent
+            router_decision = bot_services.router_agent.decide_locally(
+                text,
+                keyword_precedence=False,
+                description_verdicts=description_verdicts,
+            )
+            if router_decision is not None:
+                logger.info(f"Route for user {user_id} settled by the semantic pre-router, RouterAgent call skipped.")
+                return router_decision
+
+    return None
+
+async def decide_route(text: str, user_id: int, memory_manager, check_locally: bool = True) -> RouterDecision:
+    """
+    Определяет маршрут сообщения: сначала локальный движок правил и кэш, затем RouterAgent.
+    check_locally=False - локальная проверка уже выполнена (combined triage) и не дала решения.
+
+    Raises:
+        RouterOutputError: если ответ RouterAgent не удалось разобрать
+    """
+    if check_locally:
+        router_decision = await decide_route_locally(text, user_id, memory_manager)
+        if router_decision is not None:
+            return router_decision
+
+    recent_history = memory_manager.get_history(user_id) if memory_manager else []
+    router_cache = bot_services.router_cache
+    history = get_history_for_prompt(memory_manager, user_id, Config.ROUTER_HISTORY_TOKENS)
+    run_result = await bot_services.runner.run(
+        bot_services.router_agent,
+        text,
+        context={"history": history}
+    )
+
+    raw_decision_str = run_result.final_output
+    log_payload(logger, "RouterAgent raw output for user %s: %s", user_id, raw_decision_str)
+
+    if not isinstance(raw_decision_str, str):
+        raise RouterOutputError(f"RouterAgent returned non-string output: {type(raw_decision_str)}. Expected JSON string.")
+
+    parsed_json_str = raw_decision_str.strip().removeprefix("```json").removesuffix("```").strip()
+    try:
+        router_decision = RouterDecision.model_validate_json(parsed_json_str)
+    except ValidationError as e:
+        raise RouterOutputError(f"Invalid RouterDecision JSON: '{raw_decision_str}'") from e
+
+    if router_cache:
+        router_cache.put(text, recent_history, router_decision)
+    return router_decision
+
+async def triage_message(text: str, user_id: int, memory_manager) -> Tuple[LanguageValidationResult, Optional[RouterDecision]]:
+    """
+    Combined triage: язык и маршрут определяются одним структурированным вызовом TriageAgent.
+    LLM вызывается, только если ни локальный детектор языка, ни локальный маршрутизатор не дали ответа.
+    Если маршрут не определен (None), его нужно получить через decide_route(..., check_locally=False): локальная проверка уже выполнена.
+    """
+    validation_result = bot_services.language_validator.validate_locally(text)
+    router_decision = await decide_route_locally(text, user_id, memory_manager)
+
+    if validation_result is None and router_decision is None:
+        recent_history = memory_manager.get_history(user_id) if memory_manager else []
+        history = get_history_for_prompt(memory_manager, user_id, Config.ROUTER_HISTORY_TOKENS)
+        try:
+            run_result = await bot_services.runner.run(
+                bot_services.triage_agent,
+                text,
+                context={"history": history}
+            )
+            triage = run_result.final_output_as(TriageDecision)
+            validation_result = LanguageValidationResult(
+                is_english=triage.is_english,
+                detected_language=triage.detected_language,
+            )
+            bot_services.language_validator.remember(text, validation_result)
+            if triage.is_english:
+                router_decision = triage.routing
+                if bot_services.router_cache:
+                    bot_services.router_cache.put(text, recent_history, router_decision)
+            logger.info(f"TriageAgent result for user {user_id}: is_english={triage.is_english}, action={triage.routing.action}, matched_rule_id={triage.routing.matched_rule_id}")
+        except Exception as e:
+            # Откатываемся на двухшаговый конвейер
+            logger.warning(f"TriageAgent failed for user {user_id}: {type(e).__name__} - {e}. Falling back to two-call pipeline.")
+
+    if validation_result is None:
+        validation_result = await bot_services.language_validator.validate_language(text)
+    return validation_result, router_decision
+
+async def _timed(awaitable: Awaitable[T], timings: Dict[str, float], stage: str) -> T:
+    """Выполняет корутину и записывает длительность этапа в миллисекундах (в том числе при отмене)."""
+    stage_started_at = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = (time.perf_counter() - stage_started_at) * 1000
+
+def _discard_router_task(router_task: Optional[asyncio.Task], user_id: int, timings: Dict[str, float]) -> None:
+    """Отменяет спекулятивную маршрутизацию для сообщения, не прошедшего валидацию языка."""
+    if router_task is None:
+        return
+    if router_task.done():
+        # Маршрут уже посчитан - результат выбрасываем, исключение забираем, чтобы не было предупреждений asyncio
+        if not router_task.cancelled():
+            router_task.exception()
+        logger.info(f"Speculative routing for user {user_id} discarded after completion (wasted router time: {timings.get('router', 0):.0f} ms).")
+    else:
+        router_task.cancel()
+        logger.info(f"Speculative routing for user {user_id} cancelled: message rejected by language validation.")
+
+def _log_stage_timings(user_id: int, timings: Dict[str, float], started_at: float, speculative: bool) -> None:
+    """Логирует длительность этапов и сэкономленное спекулятивным режимом время."""
+    total_ms = (time.perf_counter() - started_at) * 1000
+    saved_ms = max(0.0, timings.get("language", 0.0) + timings.get("router", 0.0) - total_ms) if speculative else 0.0
+    stages = ", ".join(f"{stage}={duration_ms:.0f} ms" for stage, duration_ms in timings.items())
+    logger.info(
+        f"Stage timings for user {user_id}: {stages}, "
+        f"pre-action total={total_ms:.0f} ms, speculative={speculative}, saved={saved_ms:.0f} ms"
+    )
+
+async def execute_router_decision(update: Update, context: ContextTypes.DEFAULT_TYPE, decision: RouterDecision, text: str, user_id: int, memory_manager, image: Optional[LazyImage] = None) -> None:
     """Выполняет действие, определенное RouterAgent."""
     action = decision.action
     params = decision.params
@@ -133,7 +298,7 @@ async def execute_router_decision(update: Update, context: ContextTypes.DEFAULT_
         await handle_forward_action(update, context, params, user_id, matched_rule_id)
 
     elif action in ["reply", "default_reply"]:
-        await handle_reply_action(update, context, text, user_id, memory_manager, matched_rule_id, params, image_base64)
+        await handle_reply_action(update, context, text, user_id, memory_manager, matched_rule_id, params, image)
 
     else:
         logger.warning(f"Unknown action '{action}' from RouterAgent for user {user_id}. Decision: {decision}")
@@ -163,7 +328,7 @@ async def handle_forward_action(update: Update, context: ContextTypes.DEFAULT_TY
         logger.warning(f"Failed to forward message for user {user_id}. Matched rule: {matched_rule_id}")
         await update.message.reply_text("Sorry, I could not forward your message at this time.")
 
-async def handle_reply_action(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, user_id: int, memory_manager, matched_rule_id: str | None, params: RouterDecisionParams, image_base64: Optional[str] = None) -> None:
+async def handle_reply_action(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, user_id: int, memory_manager, matched_rule_id: str | None, params: RouterDecisionParams, image: Optional[LazyImage] = None) -> None:
     """Обрабатывает действие 'reply' или 'default_reply'."""
     # Если есть response_text, то отправляем его пользователю
     if params.response_text:
@@ -179,8 +344,8 @@ async def handle_reply_action(update: Update, context: ContextTypes.DEFAULT_TYPE
     if params.system_prompt_key:
         # Если есть картинка, но нет текста, не передаем пустой текст агенту
         # Вместо этого агент получит специальную инструкцию в agent_input
-        message_for_agent = text if text or not image_base64 else None
-        await handle_answer_agent_handoff(update, context, message_for_agent, user_id, memory_manager, matched_rule_id, params, image_base64)
+        message_for_agent = text if text or image is None else None
+        await handle_answer_agent_handoff(update, context, message_for_agent, user_id, memory_manager, matched_rule_id, params, image)
         return
     
     logger.error(f"Action 'reply' for user {user_id}, but no 'response_text' or 'system_prompt_key'. Matched rule: {matched_rule_id}.")
@@ -190,9 +355,24 @@ async def handle_reply_action(update: Update, context: ContextTypes.DEFAULT_TYPE
         reply_to_message_id=update.message.message_id
     )
 
-async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFAULT_TYPE, text: Optional[str], user_id: int, memory_manager, matched_rule_id: str | None, params: RouterDecisionParams, image_base64: Optional[str] = None) -> None:
+async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFAULT_TYPE, text: Optional[str], user_id: int, memory_manager, matched_rule_id: str | None, params: RouterDecisionParams, image: Optional[LazyImage] = None) -> None:
     """Handles the RAG and AnswerAgent pipeline."""
-    history = memory_manager.get_history_as_text(user_id) if memory_manager else ""
+    image_base64 = None
+    if image is not None:
+        # Единственное место, где изображение скачивается (с кэшем по file_unique_id)
+        try:
+            image_base64 = await image.base64()
+        except Exception as e:
+            logger.error(f"Failed to load image {image.file_unique_id} for user {user_id}: {e}", exc_info=True)
+            if not text:
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text="Sorry, I couldn't download your image. Please try sending it again.",
+                    reply_to_message_id=update.message.message_id
+                )
+                return
+
+    history = get_history_for_prompt(memory_manager, user_id, Config.ANSWER_HISTORY_TOKENS)
     
     final_instructions = []
     if matched_rule_id and (rule := bot_services.rules_manager.get_rule_by_id(matched_rule_id)) and hasattr(rule, 'instruction') and rule.instruction:
@@ -210,6 +390,15 @@ async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFA
         image_base64=image_base64
     )
 
+    answer_scope, question_vector, store_answer = None, None, False
+    if bot_services.answer_cache and text and image is None:
+        answer_scope, question_vector, cached_answer, store_answer = await lookup_cached_answer(
+            text, user_id, memory_manager, matched_rule_id, params
+        )
+        if cached_answer is not None:
+            await send_cached_answer(update, context, text, user_id, memory_manager, matched_rule_id, cached_answer)
+            return
+
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action='typing')
 
     try:
@@ -218,7 +407,9 @@ async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFA
         run_context_wrapper = RunContextWrapper(context=handoff_data)
         final_prompt_for_agent = await build_answer_prompt(run_context_wrapper, answer_agent)
         
-        logger.info(f"Final prompt for AnswerAgent (user: {user_id}):\n--- PROMPT START ---\n{final_prompt_for_agent}\n--- PROMPT END ---")
+        logger.info("Final prompt for AnswerAgent built (user: %s, %d chars).", user_id, len(final_prompt_for_agent))
+        log_payload(logger, "Final prompt for AnswerAgent (user: %s):\n--- PROMPT START ---\n%s\n--- PROMPT END ---",
+                    user_id, final_prompt_for_agent)
         
         agent_input = text
         # Мультимодальный ввод для gpt-4o-mini
@@ -241,7 +432,11 @@ async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFA
             # Формируем итоговый ввод для агента
             agent_input = {"role": "user", "content": content_list}
         
-        answer_result = await bot_services.runner.run(answer_agent, agent_input, context=handoff_data)
+        streamed_message: Optional[Message] = None
+        if Config.ANSWER_STREAMING:
+            answer_result, streamed_message = await stream_answer_agent(update, context, agent_input, handoff_data)
+        else:
+            answer_result = await bot_services.runner.run(answer_agent, agent_input, context=handoff_data)
         
         final_response = str(answer_result.final_output)
         
@@ -271,11 +466,18 @@ async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFA
         )
         await bot_services.logger_agent.log_interaction(log_entry)
         
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=final_response,
-            reply_to_message_id=update.message.message_id
-        )
+        if streamed_message is not None:
+            # Финальная правка: полный ответ без индикатора продолжения
+            await _finalize_streamed_message(update, context, streamed_message, final_response)
+        else:
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text=final_response,
+                reply_to_message_id=update.message.message_id
+            )
+
+        if store_answer and answer_scope is not None and question_vector is not None:
+            bot_services.answer_cache.store(text, answer_scope, final_response, question_vector)
 
     except Exception as e:
         error_message = "Sorry, I encountered an error while generating a detailed response."
@@ -286,4 +488,169 @@ async def handle_answer_agent_handoff(update: Update, context: ContextTypes.DEFA
             chat_id=update.effective_chat.id,
             text=error_message,
             reply_to_message_id=update.message.message_id
-        ) 
\ No newline at end of file
+        ) 
+
+async def lookup_cached_answer(text: str, user_id: int, memory_manager, matched_rule_id: str | None,
+                               params: RouterDecisionParams) -> Tuple[Optional[AnswerScope], Optional[object], Optional[str], bool]:
+    """
+    Ищет готовый ответ в семантическом кэше.
+    Возвращает (область кэша, эмбеддинг вопроса, ответ, можно ли сохранить новый ответ). Область None
+    означает, что кэш не используется для этого вопроса (зависит от истории диалога или произошла ошибка).
+    Сохранять можно только ответ, сгенерированный без истории: иначе он может ссылаться на
+    предыдущий диалог и не подойдет другим пользователям.
+    """
+    history_list = memory_manager.get_history(user_id) if memory_manager else []
+    # Текущее сообщение уже добавлено в историю в handle_text_message
+    if history_list and history_list[-1].get('role') == 'user' and history_list[-1].get('text') == text:
+        history_list = history_list[:-1]
+    if is_context_dependent(text, history_list):
+        logger.info(f"Answer cache bypassed for user {user_id}: the question depends on the conversation history.")
+        return None, None, None, False
+
+    scope: AnswerScope = (params.system_prompt_key, matched_rule_id, tuple(params.behavioral_prompts or []))
+    try:
+        cached_answer, question_vector = await bot_services.answer_cache.lookup(text, scope)
+    except Exception as e:
+        logger.warning(f"Answer cache lookup failed for user {user_id}: {type(e).__name__} - {e}. Running AnswerAgent.")
+        return None, None, None, False
+    return scope, question_vector, cached_answer, not history_list
+
+async def send_cached_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, user_id: int, memory_manager,
+                             matched_rule_id: str | None, answer: str) -> None:
+    """Отправляет ответ из семантического кэша, сохраняя историю и лог взаимодействия."""
+    logger.info(f"Answer cache hit for user {user_id}. Skipping AnswerAgent.")
+    if memory_manager:
+        memory_manager.add_message(user_id, "user", text)
+        memory_manager.add_message(user_id, "assistant", answer)
+
+    log_entry = InteractionLog(
+        timestamp=datetime.utcnow(),
+        user_id=user_id,
+        matched_rule_id=matched_rule_id,
+        action="reply_with_answer_cache",
+        question=text,
+        answer=answer,
+        final_prompt="",
+    )
+    await bot_services.logger_agent.log_interaction(log_entry)
+
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=answer,
+        reply_to_message_id=update.message.message_id
+    )
+
+# Максимальная длина сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+STREAMING_CURSOR = " ▌"
+
+async def _edit_streamed_message(message: Message, text: str) -> Optional[float]:
+    """
+    Правит сообщение, игнорируя "message is not modified".
+    Возвращает None при успехе или паузу в секундах из RetryAfter.
+    """
+    try:
+        await message.edit_text(text[:TELEGRAM_MESSAGE_LIMIT])
+        return None
+    except RetryAfter as e:
+        retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+        logger.warning(f"Telegram edit rate limit hit, retry after {retry_after}s.")
+        return retry_after
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            logger.warning(f"Failed to edit streamed message: {e}")
+        return None
+
+def _split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Делит текст на части не длиннее limit, по возможности по границе абзаца, строки или слова."""
+    parts = []
+    while len(text) > limit:
+        cut = max(text.rfind("\n\n", 0, limit), text.rfind("\n", 0, limit), text.rfind(" ", 0, limit))
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+async def _finalize_streamed_message(update: Update, context: ContextTypes.DEFAULT_TYPE, message: Message, text: str) -> None:
+    """
+    Заменяет частичный ответ полным. Ответ длиннее лимита Telegram правится до первой части,
+    остальные части отправляются следующими сообщениями. При RetryAfter ждет указанное время
+    и повторяет правку; если правка так и не удалась, ответ отправляется новыми сообщениями.
+    """
+    parts = _split_message(text)
+    follow_up = parts[1:]
+    try:
+        retry_after = await _edit_streamed_message(message, parts[0])
+        if retry_after is not None:
+            await asyncio.sleep(retry_after)
+            retry_after = await _edit_streamed_message(message, parts[0])
+        if retry_after is not None:
+            logger.warning("Streamed answer could not be finalized by edit. Sending it as a new message.")
+            follow_up = parts
+    except TelegramError as e:
+        logger.warning(f"Final edit of streamed message failed: {e}. Sending the answer as a new message.")
+        follow_up = parts
+    for part in follow_up:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=part,
+            reply_to_message_id=update.message.message_id
+        )
+
+async def stream_answer_agent(update: Update, context: ContextTypes.DEFAULT_TYPE, agent_input, handoff_data: ReplyHandoffData):
+    """
+    Запускает AnswerAgent в потоковом режиме. Первое сообщение отправляется, как только накоплено
+    ANSWER_STREAMING_MIN_CHARS символов, далее оно правится не чаще ANSWER_STREAMING_EDIT_INTERVAL секунд
+    (лимиты Telegram на редактирование).
+
+    Returns:
+        (результат запуска после завершения потока, отправленное сообщение или None)
+    """
+    result = bot_services.runner.run_streamed(answer_agent, agent_input, context=handoff_data)
+    chunks = []
+    message: Optional[Message] = None
+    shown_text = ""
+    next_edit_at = 0.0
+
+    try:
+        async for event in result.stream_events():
+            if event.type != "raw_response_event":
+                continue
+            if getattr(event.data, "type", None) == "response.created":
+                # Новый ответ модели (например, после вызовов инструментов): показываем только его текст
+                chunks = []
+                continue
+            if not isinstance(event.data, ResponseTextDeltaEvent):
+                continue
+
+            chunks.append(event.data.delta)
+            text = "".join(chunks)
+            now = time.monotonic()
+            if message is None:
+                if len(text.strip()) < Config.ANSWER_STREAMING_MIN_CHARS:
+                    continue
+                message = await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=(text + STREAMING_CURSOR)[:TELEGRAM_MESSAGE_LIMIT],
+                    reply_to_message_id=update.message.message_id
+                )
+                shown_text = text
+                next_edit_at = now + Config.ANSWER_STREAMING_EDIT_INTERVAL
+            elif now >= next_edit_at and text != shown_text:
+                retry_after = await _edit_streamed_message(message, text + STREAMING_CURSOR)
+                if retry_after is None:
+                    shown_text = text
+                    next_edit_at = now + Config.ANSWER_STREAMING_EDIT_INTERVAL
+                else:
+                    # После RetryAfter не правим сообщение, пока не истечет пауза Telegram
+                    next_edit_at = now + max(Config.ANSWER_STREAMING_EDIT_INTERVAL, retry_after)
+    except Exception:
+        if message is not None:
+            # Убираем индикатор продолжения у частично показанного ответа
+            await _edit_streamed_message(message, shown_text)
+        raise
+
+    return result, message
@@ -9,10 +9,19 @@ from .config import logger, Config
 from src.bot_agents import (
     LanguageValidatorAgentWrapper,
     RouterAgent,
+    RouterDecisionCache,
+    TriageAgent,
     answer_agent,
     Logger as BotLogger,
 )
+from src.bot_agents.semantic_router import SemanticPreRouter
+from src.bot_agents.answer_cache import SemanticAnswerCache
+from src.prompts import prompt_manager
+from src.tools.rag_tools import document_retriever
 from src.rules_manager.manager import RulesManager, RulesFileError
+from src.utils.history_compactor import HistoryCompactor, make_openai_summarizer
+from src.utils.image_pipeline import ImagePipeline
+from src.utils.config import MEMORY_SETTINGS
 from agents import Runner
 
 class BotServices:
@@ -23,10 +32,23 @@ class BotServices:
     def __init__(self, rules_file_path="rules.yaml"):
         self.rules_manager = self._initialize_rules_manager(rules_file_path)
         self.router_agent = self._initialize_router_agent(self.rules_manager)
-        self.language_validator = LanguageValidatorAgentWrapper()
+        self.router_cache = self._initialize_router_cache(self.rules_manager)
+        self.triage_agent = self._initialize_triage_agent(self.router_agent)
+        self.language_validator = LanguageValidatorAgentWrapper(
+            confidence_threshold=Config.LANGUAGE_DETECTOR_CONFIDENCE,
+            cache_size=Config.LANGUAGE_CACHE_SIZE,
+        )
         self.logger_agent = BotLogger()
         self.runner = Runner  # Класс Runner для запуска агентов
         self.openai_client = self._initialize_openai_client()
+        self.semantic_router = self._initialize_semantic_router(self.rules_manager, self.openai_client)
+        self.answer_cache = self._initialize_answer_cache(self.rules_manager)
+        self.history_compactor = self._initialize_history_compactor(self.openai_client)
+        self.image_pipeline = ImagePipeline(
+            max_pixels=Config.IMAGE_MAX_PIXELS,
+            jpeg_quality=Config.IMAGE_JPEG_QUALITY,
+            cache_size=Config.IMAGE_CACHE_SIZE,
+        )
 
     def _initialize_openai_client(self) -> AsyncOpenAI | None:
         """Инициализирует асинхронный клиент OpenAI."""
@@ -59,5 +81,70 @@ class BotServices:
             logger.error(f"CRITICAL: Failed to initialize RouterAgent: {e}", exc_info=True)
             return None
 
+    def _initialize_router_cache(self, manager: RulesManager | None) -> RouterDecisionCache | None:
+        if not manager or Config.ROUTER_CACHE_SIZE <= 0:
+            logger.info("Router decision cache is disabled.")
+            return None
+        return RouterDecisionCache(
+            rules_manager=manager,
+            maxsize=Config.ROUTER_CACHE_SIZE,
+            ttl=Config.ROUTER_CACHE_TTL or None,
+            history_turns=Config.ROUTER_CACHE_HISTORY_TURNS,
+        )
+
+    def _initialize_triage_agent(self, router_agent: RouterAgent | None) -> TriageAgent | None:
+        if Config.TRIAGE_MODE != "combined":
+            return None
+        if not router_agent:
+            logger.error("Cannot initialize TriageAgent because RouterAgent failed to initialize. Falling back to two-call pipeline.")
+            return None
+        try:
+            agent = TriageAgent(router_agent=router_agent)
+            logger.info("TriageAgent initialized successfully (combined triage mode).")
+            return agent
+        except Exception as e:
+            logger.error(f"Failed to initialize TriageAgent: {e}. Falling back to two-call pipeline.", exc_info=True)
+            return None
+
+    def _initialize_semantic_router(self, manager: RulesManager | None, client: AsyncOpenAI | None) -> SemanticPreRouter | None:
+        if not Config.SEMANTIC_ROUTER:
+            return None
+        if not manager or not client:
+            logger.error("Cannot initialize SemanticPreRouter: RulesManager or OpenAI client is unavailable.")
+            return None
+        logger.info(f"SemanticPreRouter initialized with model {Config.SEMANTIC_ROUTER_MODEL}.")
+        return SemanticPreRouter(rules_manager=manager, client=client, model=Config.SEMANTIC_ROUTER_MODEL)
+
+    def _initialize_answer_cache(self, manager: RulesManager | None) -> SemanticAnswerCache | None:
+        if not Config.ANSWER_CACHE or Config.ANSWER_CACHE_SIZE <= 0:
+            return None
+        if not manager or not document_retriever:
+            logger.error("Cannot initialize SemanticAnswerCache: RulesManager or DocumentRetriever is unavailable.")
+            return None
+        logger.info(f"SemanticAnswerCache initialized (size: {Config.ANSWER_CACHE_SIZE}, threshold: {Config.ANSWER_CACHE_THRESHOLD}).")
+        return SemanticAnswerCache(
+            rules_manager=manager,
+            prompts_version=lambda: prompt_manager.version,
+            store_version=lambda: document_retriever.store_version,
+            # Эмбеддинг вопроса идет через кэш эмбеддингов RAG: исходный вопрос обычно совпадает с запросом к базе знаний
+            embed=document_retriever.aembed_query,
+            maxsize=Config.ANSWER_CACHE_SIZE,
+            ttl=Config.ANSWER_CACHE_TTL or None,
+            threshold=Config.ANSWER_CACHE_THRESHOLD,
+        )
+
+    def _initialize_history_compactor(self, client: AsyncOpenAI | None) -> HistoryCompactor | None:
+        if not Config.HISTORY_COMPACTION:
+            return None
+        if not client:
+            logger.error("Cannot initialize HistoryCompactor: OpenAI client is unavailable.")
+            return None
+        logger.info(f"HistoryCompactor initialized (summary model: {Config.HISTORY_SUMMARY_MODEL}).")
+        return HistoryCompactor(
+            summarize=make_openai_summarizer(client, Config.HISTORY_SUMMARY_MODEL, Config.HISTORY_SUMMARY_TOKENS),
+            summary_tokens=Config.HISTORY_SUMMARY_TOKENS,
+            max_users=MEMORY_SETTINGS['max_users'] or 10000,
+        )
+
 # Создаем единый экземпляр-синглтон, который будет использоваться во всем приложении
 bot_services = BotServices() 
\ No newline at end of file
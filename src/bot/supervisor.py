@@ -0,0 +1,256 @@
+# src/bot/supervisor.py
+# Многопроцессный режим: один процесс принимает обновления (polling или webhook)
+# и распределяет их по N рабочим процессам по хэшу пользователя.
+#
+# Векторный индекс и остальные сервисы загружаются при импорте (до fork), поэтому
+# рабочие процессы разделяют эту память copy-on-write, а индексы ivfpq/hnsw/sq8
+# дополнительно читаются через общий memory-map.
+#
+# Команда /reload_rules обрабатывается рабочим процессом администратора (он отвечает
+# в чат), а остальным рабочим процессам супервизор рассылает RELOAD_RULES.
+
+import signal
+import asyncio
+import multiprocessing
+from queue import Full
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import NetworkError
+
+from .config import Config, logger
+from .webhook_server import WebhookServer
+from .handlers import reload_rules_and_prompts
+from .services import bot_services
+from src.utils.logging_setup import stop_logging
+
+SENTINEL = None
+RELOAD_RULES = "reload_rules"
+
+
+def shard_for(payload: Dict[str, Any], shards: int) -> int:
+    """
+    Номер шарда для обновления: по id отправителя, иначе по id чата.
+    Все обновления одного пользователя попадают в один рабочий процесс, поэтому
+    MemoryManager и порядок сообщений остаются локальными для процесса.
+    """
+    key = payload.get("update_id", 0)
+    for value in payload.values():
+        if not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user")
+        if isinstance(sender, dict) and "id" in sender:
+            key = sender["id"]
+            break
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            key = chat["id"]
+            break
+    return int(key) % shards
+
+
+def is_reload_command(payload: Dict[str, Any]) -> bool:
+    """Команда /reload_rules (в том числе /reload_rules@bot) от администратора."""
+    message = payload.get("message") or {}
+    command = (message.get("text") or "").split(maxsplit=1)[:1]
+    if not command or command[0].split("@", 1)[0] != "/reload_rules":
+        return False
+    return (message.get("from") or {}).get("id") in Config.ADMIN_USER_IDS
+
+
+def _worker_main(bot, shard: int, queue) -> None:
+    """Точка входа рабочего процесса (после fork)."""
+    # Остановкой управляет супервизор через SENTINEL
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Журнал взаимодействий ротируется независимо в каждом процессе, поэтому файлы раздельные
+    if bot_services.logger_agent.sink:
+        bot_services.logger_agent.sink.use_shard(shard)
+    logger.info(f"Worker {shard} started.")
+    try:
+        asyncio.run(_run_worker(bot, shard, queue))
+        logger.info(f"Worker {shard} stopped.")
+    except Exception as e:
+        logger.critical(f"Worker {shard} crashed: {e}", exc_info=True)
+        raise
+    finally:
+        # Рабочий процесс завершается без atexit: дописываем очередь логов явно
+        stop_logging()
+
+
+async def _run_worker(bot, shard: int, queue) -> None:
+    application = bot.application
+    loop = asyncio.get_running_loop()
+    # Не забираем из очереди больше обновлений, чем можем обработать одновременно
+    slots = asyncio.Semaphore(Config.MAX_CONCURRENT_UPDATES)
+    tasks = set()
+
+    async def dispatch(payload: Dict[str, Any]) -> None:
+        try:
+            await bot._dispatch_update(payload)
+        except Exception as e:
+            logger.error(f"Worker {shard} failed to process update {payload.get('update_id')}: {e}", exc_info=True)
+        finally:
+            slots.release()
+
+    async with application:
+        await application.start()
+        try:
+            while True:
+                await slots.acquire()
+                payload = await loop.run_in_executor(None, queue.get)
+                if payload is SENTINEL:
+                    slots.release()
+                    break
+                if payload == RELOAD_RULES:
+                    slots.release()
+                    logger.info(f"Worker {shard}: reloading rules and prompts.")
+                    reload_rules_and_prompts()
+                    continue
+                # Задачи стартуют в порядке создания и сразу занимают блокировку пользователя
+                task = asyncio.create_task(dispatch(payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await application.stop()
+            await bot._post_shutdown(application)
+            bot.memory_manager.close()
+
+
+class ShardedSupervisor:
+    """
+    Запускает workers рабочих процессов и маршрутизирует обновления в их очереди.
+    Упавший рабочий процесс перезапускается с той же очередью.
+    """
+    def __init__(self, bot, workers: int, queue_size: int = 1000, monitor_interval: float = 5.0):
+        self.bot = bot
+        self.workers = workers
+        self.monitor_interval = monitor_interval
+        self._context = multiprocessing.get_context("fork")
+        self.queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._stopping = False
+        self.routed = [0] * workers
+
+    @staticmethod
+    def is_supported() -> bool:
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    def _start_worker(self, shard: int) -> None:
+        process = self._context.Process(
+            target=_worker_main, args=(self.bot, shard, self.queues[shard]), name=f"bot-worker-{shard}", daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+
+    async def _put(self, shard: int, item: Any) -> None:
+        # Очередь рабочего процесса заполнена: ждем, а входная очередь webhook тем временем
+        # заполняется и начинает отвечать 503
+        while True:
+            try:
+                self.queues[shard].put_nowait(item)
+                return
+            except Full:
+                await asyncio.sleep(0.05)
+
+    async def _route(self, payload: Dict[str, Any]) -> None:
+        shard = shard_for(payload, self.workers)
+        await self._put(shard, payload)
+        self.routed[shard] += 1
+        if is_reload_command(payload):
+            # Супервизор тоже перечитывает правила: перезапущенные рабочие процессы наследуют их при fork
+            reload_rules_and_prompts()
+            for other in range(self.workers):
+                if other != shard:
+                    await self._put(other, RELOAD_RULES)
+
+    async def _monitor(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self.monitor_interval)
+            for shard, process in enumerate(self.processes):
+                if not self._stopping and process is not None and not process.is_alive():
+                    logger.error(f"Worker {shard} exited with code {process.exitcode}. Restarting.")
+                    self._start_worker(shard)
+
+    async def _poll_updates(self) -> None:
+        """Прием обновлений через getUpdates в процессе супервизора."""
+        async with Bot(self.bot.token) as bot:
+            await bot.delete_webhook()
+            offset = None
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=25, allowed_updates=Update.ALL_TYPES)
+                except NetworkError as e:
+                    logger.warning(f"getUpdates failed: {e}. Retrying.")
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    offset = update.update_id + 1
+                    await self._route(update.to_dict())
+
+    async def _serve_webhook(self) -> None:
+        server = WebhookServer(
+            self._route,
+            path=Config.WEBHOOK_PATH,
+            secret_token=Config.WEBHOOK_SECRET_TOKEN,
+            host=Config.WEBHOOK_LISTEN,
+            port=Config.WEBHOOK_PORT,
+            ssl_context=WebhookServer.build_ssl_context(Config.WEBHOOK_TLS_CERT, Config.WEBHOOK_TLS_KEY),
+            queue_size=Config.WEBHOOK_QUEUE_SIZE,
+        )
+        await server.start()
+        if Config.WEBHOOK_URL:
+            async with Bot(self.bot.token) as bot:
+                await bot.set_webhook(
+                    url=Config.WEBHOOK_URL,
+                    secret_token=Config.WEBHOOK_SECRET_TOKEN,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            logger.info(f"Webhook зарегистрирован в Telegram: {Config.WEBHOOK_URL}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    async def _run(self) -> None:
+        monitor = asyncio.create_task(self._monitor())
+        try:
+            if Config.BOT_MODE == 'webhook':
+                await self._serve_webhook()
+            else:
+                await self._poll_updates()
+        finally:
+            self._stopping = True
+            monitor.cancel()
+
+    def run(self) -> None:
+        # Рабочие процессы создаются до запуска цикла событий супервизора
+        for shard in range(self.workers):
+            self._start_worker(shard)
+        logger.info(f"Supervisor started {self.workers} workers ({Config.BOT_MODE} intake).")
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            logger.info("Supervisor interrupted.")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stopping = True
+        for queue in self.queues:
+            try:
+                queue.put(SENTINEL, timeout=1)
+            except Full:
+                pass
+        for shard, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Worker {shard} did not stop in {timeout}s. Terminating.")
+                process.terminate()
+        logger.info(f"Supervisor stopped. Routed updates per worker: {self.routed}")
+
+
+__all__ = ["ShardedSupervisor", "shard_for", "is_reload_command"]
@@ -1,8 +1,16 @@
+import asyncio
+
+from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from .config import Config, logger
-from .handlers import start, help_command, handle_text_message, reload_rules_command, describe_image_handler
+from .handlers import start, help_command, handle_text_message, reload_rules_command, stats_command, describe_image_handler
 from .services import bot_services
+from .update_processor import ChatOrderedUpdateProcessor
+from .webhook_server import WebhookServer
+from .supervisor import ShardedSupervisor
 from ..utils.memory_manager import MemoryManager  # Добавляем импорт MemoryManager
+from ..utils.memory_backends import create_memory_backend
+from ..utils.logging_setup import setup_logging, parse_rate_limits
 
 class TelegramBot:
     def __init__(self, token: str):
@@ -11,8 +19,25 @@ class TelegramBot:
             logger.critical("Токен Telegram бота не предоставлен!")
             raise ValueError("Токен не может быть пустым")
         self.token = token
-        self.application = Application.builder().token(self.token).build()
-        self.memory_manager = MemoryManager()  # Инициализируем менеджер памяти
+        # Все модули уже импортированы и настроили logging: переводим обработчики на очередь
+        setup_logging(
+            queue_mode=Config.LOG_QUEUE,
+            queue_size=Config.LOG_QUEUE_SIZE,
+            payloads=Config.LOG_PAYLOADS,
+            payload_sample_rate=Config.LOG_PAYLOAD_SAMPLE_RATE,
+            rate_limits=parse_rate_limits(Config.LOG_RATE_LIMITS),
+        )
+        # post_shutdown вызывается run_polling; в режиме webhook журнал закрывается явно
+        builder = Application.builder().token(self.token).post_shutdown(self._post_shutdown)
+        if Config.MAX_CONCURRENT_UPDATES > 1:
+            # Параллельная обработка разных пользователей с сохранением порядка внутри пользователя
+            builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(Config.MAX_CONCURRENT_UPDATES))
+            logger.info(f"Параллельная обработка обновлений: до {Config.MAX_CONCURRENT_UPDATES} одновременно.")
+        self.application = builder.build()
+        self.memory_manager = MemoryManager(backend=create_memory_backend())  # Инициализируем менеджер памяти
+        self.application.bot_data['memory_manager'] = self.memory_manager
+        if bot_services.history_compactor:
+            bot_services.history_compactor.attach(self.memory_manager)
 
         # Передаем сервисы в контекст
         if bot_services.openai_client:
@@ -40,6 +65,7 @@ class TelegramBot:
         self.application.add_handler(CommandHandler("help", help_with_memory))
         self.application.add_handler(MessageHandler((filters.TEXT | filters.PHOTO) & ~filters.COMMAND, handle_text_with_memory))
         self.application.add_handler(CommandHandler("reload_rules", reload_rules_command))
+        self.application.add_handler(CommandHandler("stats", stats_command))
         
         # Регистрируем новый обработчик для изображений
         # self.application.add_handler(MessageHandler(filters.PHOTO, describe_image_handler))
@@ -52,8 +78,64 @@ class TelegramBot:
             logger.error("Приложение не инициализировано.")
             return
             
-        logger.info("Запуск бота...")
-        self.application.run_polling()
+        if Config.WORKER_PROCESSES > 1:
+            if ShardedSupervisor.is_supported():
+                logger.info(f"Запуск бота в многопроцессном режиме ({Config.WORKER_PROCESSES} процессов)...")
+                ShardedSupervisor(self, Config.WORKER_PROCESSES, queue_size=Config.WORKER_QUEUE_SIZE).run()
+                return
+            logger.warning("Многопроцессный режим требует fork. Бот запускается в одном процессе.")
+
+        try:
+            if Config.BOT_MODE == 'webhook':
+                logger.info("Запуск бота в режиме webhook...")
+                asyncio.run(self._run_webhook())
+            else:
+                logger.info("Запуск бота...")
+                self.application.run_polling()
+        finally:
+            self.memory_manager.close()
+
+    async def _post_shutdown(self, application: Application) -> None:
+        """Дописывает журнал взаимодействий перед остановкой."""
+        await bot_services.logger_agent.close()
+
+    async def _dispatch_update(self, payload: dict) -> None:
+        """Передает обновление из webhook в обработчик обновлений PTB (с учетом порядка внутри пользователя)."""
+        update = Update.de_json(payload, self.application.bot)
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+
+    async def _run_webhook(self) -> None:
+        """Запускает встроенный webhook сервер и работает до остановки процесса."""
+        server = WebhookServer(
+            self._dispatch_update,
+            path=Config.WEBHOOK_PATH,
+            secret_token=Config.WEBHOOK_SECRET_TOKEN,
+            host=Config.WEBHOOK_LISTEN,
+            port=Config.WEBHOOK_PORT,
+            ssl_context=WebhookServer.build_ssl_context(Config.WEBHOOK_TLS_CERT, Config.WEBHOOK_TLS_KEY),
+            queue_size=Config.WEBHOOK_QUEUE_SIZE,
+            # Параллелизм и порядок внутри пользователя обеспечивает ChatOrderedUpdateProcessor;
+            # ограничение задач нужно только для обратного давления на входную очередь
+            max_in_flight=Config.WEBHOOK_QUEUE_SIZE,
+        )
+        self.application.bot_data['webhook_server'] = server
+
+        async with self.application:
+            await self.application.start()
+            await server.start()
+            if Config.WEBHOOK_URL:
+                await self.application.bot.set_webhook(
+                    url=Config.WEBHOOK_URL,
+                    secret_token=Config.WEBHOOK_SECRET_TOKEN,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+                logger.info(f"Webhook зарегистрирован в Telegram: {Config.WEBHOOK_URL}")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.stop()
+                await self.application.stop()
+                await self._post_shutdown(self.application)
 
 def main():
     """Основная функция для запуска бота."""
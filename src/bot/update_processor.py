@@ -0,0 +1,146 @@
+# src/bot/update_processor.py
+# Обработчик обновлений PTB: параллельная обработка разных пользователей
+# с сохранением порядка сообщений внутри одного пользователя/чата.
+
+import time
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .config import logger
+
+
+class _KeyStats:
+    __slots__ = ("pending", "processed", "total_wait", "max_wait", "last_wait")
+
+    def __init__(self):
+        self.pending = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обрабатывает до max_concurrent_updates обновлений одновременно, но обновления одного
+    пользователя (или чата без пользователя) выполняются строго по очереди.
+
+    Блокировка пользователя берется до глобального семафора: пока предыдущее сообщение
+    пользователя обрабатывается, его следующее сообщение не занимает слот обработки.
+    asyncio.Lock пропускает ожидающих в порядке FIFO, поэтому порядок сообщений сохраняется
+    и история MemoryManager остается согласованной.
+    """
+    def __init__(self, max_concurrent_updates: int, stats_size: int = 1024):
+        super().__init__(max_concurrent_updates)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._stats: Dict[Hashable, _KeyStats] = {}
+        self._stats_size = stats_size
+        self.active = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        if update.effective_chat:
+            return ("chat", update.effective_chat.id)
+        return None
+
+    def _key_stats(self, key: Hashable) -> _KeyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self._stats_size:
+                # Вытесняем статистику ключа без ожидающих обновлений (самую старую)
+                for old_key, old_stats in self._stats.items():
+                    if old_stats.pending == 0:
+                        del self._stats[old_key]
+                        break
+            stats = self._stats[key] = _KeyStats()
+        return stats
+
+    async def process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        key = self._ordering_key(update)
+        enqueued_at = time.monotonic()
+        if key is None:
+            async with self._slots:
+                await self._run(update, coroutine, enqueued_at, None)
+            return
+
+        stats = self._key_stats(key)
+        stats.pending += 1
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        try:
+            async with lock:
+                async with self._slots:
+                    await self._run(update, coroutine, enqueued_at, stats)
+        finally:
+            stats.pending -= 1
+            if stats.pending == 0:
+                # Никто больше не ждет эту блокировку
+                self._locks.pop(key, None)
+
+    async def _run(self, update: object, coroutine: "Awaitable[Any]", enqueued_at: float,
+                   stats: Optional[_KeyStats]) -> None:
+        wait = time.monotonic() - enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if stats is not None:
+            stats.last_wait = wait
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+        if wait > 5.0:
+            logger.warning(f"Update waited {wait:.1f}s in the processing queue.")
+
+        self.active += 1
+        try:
+            await self.do_process_update(update, coroutine)
+        finally:
+            self.active -= 1
+            self.processed += 1
+            if stats is not None:
+                stats.processed += 1
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self, top: int = 5) -> Dict[str, Any]:
+        """Общая статистика очереди и самые загруженные пользователи/чаты."""
+        queued = sum(stats.pending for stats in self._stats.values()) - self.active
+        busiest = sorted(
+            ((key, stats) for key, stats in self._stats.items() if stats.processed or stats.pending),
+            key=lambda item: (item[1].pending, item[1].max_wait),
+            reverse=True
+        )[:top]
+        return {
+            "concurrency": self.max_concurrent_updates,
+            "active": self.active,
+            "queued": max(queued, 0),
+            "processed": self.processed,
+            "avg_wait_ms": round(self.total_wait / self.processed * 1000, 1) if self.processed else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "busiest": "; ".join(
+                f"{kind}:{ident} depth={stats.pending} "
+                f"avg_wait={stats.total_wait / stats.processed * 1000 if stats.processed else 0.0:.0f}ms "
+                f"max_wait={stats.max_wait * 1000:.0f}ms"
+                for (kind, ident), stats in busiest
+            ) or "-",
+        }
+
+
+__all__ = ["ChatOrderedUpdateProcessor"]
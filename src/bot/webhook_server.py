@@ -0,0 +1,218 @@
+# src/bot/webhook_server.py
+# Минималистичный HTTP(S) сервер для приема обновлений Telegram через webhook.
+# Построен на asyncio streams, без дополнительных зависимостей.
+
+import ssl
+import hmac
+import json
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import logger
+
+SECRET_TOKEN_HEADER = "x-telegram-bot-api-secret-token"
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+# Получатель обновления (JSON-объект Update из тела запроса)
+UpdateSink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class WebhookServer:
+    """
+    Принимает POST-запросы с обновлениями на заданном пути, проверяет секретный токен
+    (заголовок X-Telegram-Bot-Api-Secret-Token) и кладет обновления в ограниченную очередь.
+    Если очередь заполнена, отвечает 503, и Telegram повторит доставку позже.
+
+    Потребитель забирает обновления из очереди по порядку и запускает sink отдельной задачей
+    (как Application в PTB), поэтому ограничения параллелизма и порядок внутри пользователя
+    обеспечивает обработчик обновлений. Одновременно выполняется не больше max_in_flight
+    задач; при max_in_flight=1 обновления передаются в sink строго последовательно.
+
+    Для локальной проверки достаточно отправить записанный JSON обновления:
+        curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: <secret>" -d @update.json http://127.0.0.1:8443/telegram
+    """
+    def __init__(self, sink: UpdateSink, path: str = "/telegram", secret_token: Optional[str] = None,
+                 host: str = "0.0.0.0", port: int = 8443, ssl_context: Optional[ssl.SSLContext] = None,
+                 queue_size: int = 1000, max_in_flight: int = 1):
+        self.sink = sink
+        self.path = path if path.startswith("/") else f"/{path}"
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self.received = 0
+        self.rejected = 0
+
+    @staticmethod
+    def build_ssl_context(cert_path: Optional[str], key_path: Optional[str]) -> Optional[ssl.SSLContext]:
+        if not cert_path:
+            return None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_path, key_path)
+        return context
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, ssl=self.ssl_context, limit=MAX_HEADER_BYTES
+        )
+        self._consumer = asyncio.create_task(self._consume())
+        scheme = "https" if self.ssl_context else "http"
+        logger.info(f"Webhook server listening on {scheme}://{self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Дожидаемся обработки уже принятых обновлений
+        if self._consumer:
+            await self.queue.join()
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("Webhook server stopped.")
+
+    async def _consume(self) -> None:
+        while True:
+            payload = await self.queue.get()
+            try:
+                await self._in_flight.acquire()
+                # Задачи стартуют в порядке создания, поэтому порядок обновлений сохраняется
+                task = asyncio.create_task(self._dispatch(payload))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            finally:
+                self.queue.task_done()
+
+    async def _dispatch(self, payload: Dict[str, Any]) -> None:
+        try:
+            await self.sink(payload)
+        except Exception as e:
+            logger.error(f"Failed to dispatch webhook update {payload.get('update_id')}: {e}", exc_info=True)
+        finally:
+            self._in_flight.release()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ValueError("Malformed request line")
+
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY_BYTES:
+            raise OverflowError("Request body is too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except OverflowError:
+                    await self._respond(writer, 413, close=True)
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self._respond(writer, 400, close=True)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status = self._handle_request(method, path, headers, body)
+                close = headers.get("connection", "").lower() == "close"
+                await self._respond(writer, status, close=close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+    def _handle_request(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> int:
+        if path == "/healthz" and method == "GET":
+            return 200
+        if path != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret_token and not hmac.compare_digest(
+            headers.get(SECRET_TOKEN_HEADER, "").encode(), self.secret_token.encode()
+        ):
+            logger.warning("Webhook request rejected: invalid secret token.")
+            return 403
+
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            return 400
+        if not isinstance(payload, dict) or "update_id" not in payload:
+            return 400
+
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Webhook intake queue is full ({self.queue.maxsize}). Update {payload['update_id']} rejected with 503.")
+            return 503
+        self.received += 1
+        return 200
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, close: bool = False) -> None:
+        headers = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Length: 0",
+            f"Connection: {'close' if close else 'keep-alive'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "in_flight": len(self._tasks),
+            "received": self.received,
+            "rejected": self.rejected,
+        }
+
+
+__all__ = ["WebhookServer", "UpdateSink"]
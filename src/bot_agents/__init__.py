@@ -3,9 +3,14 @@ Bot agents package containing AI agent implementations
 """
 # Language Validator
 from .language_validator_agent import LanguageValidatorAgentWrapper
+from .language_detector import LocalLanguageDetector, LanguageDetection
 
 # Router Agent
 from .router_agent import RouterAgent
+from .router_cache import RouterDecisionCache
+
+# Combined Triage Agent
+from .triage_agent import TriageAgent, TriageDecision
 
 # Answer Agent
 from .answer_agent import answer_agent
@@ -19,7 +24,12 @@ from .models import RouterDecision, ReplyHandoffData, InteractionLog, RouterDeci
 
 __all__ = [
     "LanguageValidatorAgentWrapper",
+    "LocalLanguageDetector",
+    "LanguageDetection",
     "RouterAgent",
+    "RouterDecisionCache",
+    "TriageAgent",
+    "TriageDecision",
     "answer_agent",
     "Logger",
     "RouterDecision",
@@ -1,5 +1,5 @@
 from agents import Agent, ModelSettings
-from src.tools.rag_tools import retrieve_rag_context
+from src.tools.rag_tools import retrieve_rag_context, retrieve_rag_context_batch
 
 # Импортируем нашу новую динамическую функцию-сборщик промптов
 from src.prompts import build_answer_prompt
@@ -9,10 +9,12 @@ answer_agent = Agent(
     name="AnswerAgent",
     model="gpt-4o-mini",
     instructions=build_answer_prompt,
-    tools=[retrieve_rag_context],
+    tools=[retrieve_rag_context_batch, retrieve_rag_context],
     model_settings=ModelSettings(
         temperature=0.7,
         max_tokens=500,
+        # Уточняющие запросы к базе знаний выполняются параллельно
+        parallel_tool_calls=True,
     ),
 )
 
@@ -0,0 +1,164 @@
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.rules_manager.manager import RulesManager
+from src.utils.lru_cache import normalize_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Область кэша: (system_prompt_key, matched_rule_id, поведенческие промпты)
+AnswerScope = Tuple[Optional[str], Optional[str], Tuple[str, ...]]
+
+# Признаки того, что вопрос опирается на предыдущие сообщения диалога
+_REFERENCE_RE = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|there|same|above|previous|again|also|else|another|"
+    r"instead)\b",
+    re.IGNORECASE,
+)
+_FOLLOW_UP_START_RE = re.compile(r"^\s*(and|but|so|or|what about|how about|ok|okay|why|and then)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_context_dependent(text: str, history: List[dict], min_words: int = 4) -> bool:
+    """
+    Эвристика: вопрос зависит от контекста, если в диалоге уже есть сообщения и вопрос
+    короткий, начинается как продолжение ("and ...", "what about ...") или содержит отсылки ("it", "that").
+    """
+    if not history:
+        return False
+    if len(_WORD_RE.findall(text)) < min_words:
+        return True
+    return bool(_FOLLOW_UP_START_RE.search(text) or _REFERENCE_RE.search(text))
+
+
+class _AnswerEntry:
+    __slots__ = ("vector", "answer", "created")
+
+    def __init__(self, vector: np.ndarray, answer: str, created: float):
+        self.vector = vector
+        self.answer = answer
+        self.created = created
+
+
+class SemanticAnswerCache:
+    """
+    Семантический кэш ответов AnswerAgent.
+
+    Вопрос ищется по косинусному сходству эмбеддингов среди ответов той же области
+    (system_prompt_key, правило, поведенческие промпты). Записи ограничены TTL и общим
+    размером (вытеснение LRU). Кэш очищается при смене версии промптов, правил или
+    векторного хранилища.
+    """
+    def __init__(self, rules_manager: RulesManager, prompts_version: Callable[[], str],
+                 store_version: Callable[[], str], embed: Callable[[str], Any],
+                 maxsize: int = 1024, ttl: Optional[float] = 86400, threshold: float = 0.95):
+        self.rules_manager = rules_manager
+        self._prompts_version = prompts_version
+        self._store_version = store_version
+        self._embed = embed
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple[AnswerScope, str], _AnswerEntry]" = OrderedDict()
+        # Матрица эмбеддингов каждой области, пересобирается после изменений
+        self._scope_index: Dict[AnswerScope, Tuple[List[Tuple[AnswerScope, str]], np.ndarray]] = {}
+        self._version: Tuple = ()
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_version(self) -> None:
+        version = (self._prompts_version(), self.rules_manager.version, self._store_version())
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Prompts, rules or vector store changed. Answer cache invalidated ({len(self._entries)} entries).")
+            self._entries.clear()
+            self._scope_index.clear()
+            self._version = version
+
+    def _expired(self, entry: _AnswerEntry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created > self.ttl
+
+    def _get_scope_index(self, scope: AnswerScope) -> Optional[Tuple[List[Tuple[AnswerScope, str]], np.ndarray]]:
+        index = self._scope_index.get(scope)
+        if index is None:
+            keys = [key for key in self._entries if key[0] == scope]
+            if not keys:
+                return None
+            index = (keys, np.vstack([self._entries[key].vector for key in keys]))
+            self._scope_index[scope] = index
+        return index
+
+    @staticmethod
+    def _normalize(vector: Any) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, text: str, scope: AnswerScope) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Возвращает (ответ или None, эмбеддинг вопроса). Эмбеддинг передается в store(),
+        чтобы не считать его повторно.
+        """
+        self._sync_version()
+        now = time.monotonic()
+        exact_key = (scope, normalize_cache_key(text))
+        entry = self._entries.get(exact_key)
+        if entry is not None and not self._expired(entry, now):
+            self._entries.move_to_end(exact_key)
+            self.hits += 1
+            return entry.answer, entry.vector
+
+        vector = self._normalize(await self._embed(text))
+        index = self._get_scope_index(scope)
+        if index is not None:
+            keys, matrix = index
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            entry = self._entries.get(keys[best])
+            if entry is not None and similarities[best] >= self.threshold and not self._expired(entry, now):
+                self._entries.move_to_end(keys[best])
+                self.hits += 1
+                logger.info(f"Answer cache hit (similarity {similarities[best]:.3f}).")
+                return entry.answer, vector
+
+        self.misses += 1
+        return None, vector
+
+    def store(self, text: str, scope: AnswerScope, answer: str, vector: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        self._sync_version()
+        key = (scope, normalize_cache_key(text))
+        self._entries[key] = _AnswerEntry(vector, answer, time.monotonic())
+        self._entries.move_to_end(key)
+        self._scope_index.pop(scope, None)
+
+        now = time.monotonic()
+        while len(self._entries) > self.maxsize:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._scope_index.pop(evicted_key[0], None)
+        # Просроченные записи в начале очереди удаляются заодно
+        while self._entries:
+            oldest_key = next(iter(self._entries))
+            if not self._expired(self._entries[oldest_key], now):
+                break
+            del self._entries[oldest_key]
+            self._scope_index.pop(oldest_key[0], None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+__all__ = ["SemanticAnswerCache", "AnswerScope", "is_context_dependent"]
@@ -0,0 +1,271 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+# Токены, которые не несут информации о языке: ссылки, упоминания, адреса кошельков, хэши
+_NON_LINGUISTIC_RE = re.compile(r"https?://\S+|www\.\S+|\S+@\S+|@\w+|\S*\d\S*")
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Диапазоны Unicode -> письменность
+_SCRIPT_RANGES: List[Tuple[int, int, str]] = [
+    (0x0041, 0x024F, "Latin"),
+    (0x1E00, 0x1EFF, "Latin"),
+    (0x0370, 0x03FF, "Greek"),
+    (0x0400, 0x052F, "Cyrillic"),
+    (0x0530, 0x058F, "Armenian"),
+    (0x0590, 0x05FF, "Hebrew"),
+    (0x0600, 0x06FF, "Arabic"),
+    (0x0750, 0x077F, "Arabic"),
+    (0xFB50, 0xFDFF, "Arabic"),
+    (0xFE70, 0xFEFF, "Arabic"),
+    (0x0900, 0x097F, "Devanagari"),
+    (0x0980, 0x09FF, "Bengali"),
+    (0x0E00, 0x0E7F, "Thai"),
+    (0x10A0, 0x10FF, "Georgian"),
+    (0x1100, 0x11FF, "Hangul"),
+    (0x3130, 0x318F, "Hangul"),
+    (0xAC00, 0xD7AF, "Hangul"),
+    (0x3040, 0x30FF, "Kana"),
+    (0x3400, 0x4DBF, "Han"),
+    (0x4E00, 0x9FFF, "Han"),
+]
+
+# Язык по умолчанию для каждой письменности (кроме латиницы)
+_SCRIPT_LANGUAGES: Dict[str, str] = {
+    "Greek": "Greek",
+    "Cyrillic": "Russian",
+    "Armenian": "Armenian",
+    "Hebrew": "Hebrew",
+    "Arabic": "Arabic",
+    "Devanagari": "Hindi",
+    "Bengali": "Bengali",
+    "Thai": "Thai",
+    "Georgian": "Georgian",
+    "Hangul": "Korean",
+    "Kana": "Japanese",
+    "Han": "Chinese",
+}
+
+# Профили латинских языков: частые слова, характерные триграммы и диакритика
+_LATIN_PROFILES: Dict[str, Dict[str, set]] = {
+    "English": {
+        "words": set("the and you your is are was to of in it for on with how what why where when who can could "
+                     "i my me we do does did not no yes have has this that there please hi hello hey thanks thank "
+                     "help get got will would should from about be been an a at by if or but so just need want".split()),
+        "trigrams": set(" th|the|he |and|nd | an|ing|ng | to|to |ion| of|of |ed | in|you| yo|ou |is | is|at |hat|"
+                        " wh|wha|how| ho|ow |er |re | it|it |for| fo|or | my|my |hav|ave|thi|his|ent|ly |can| ca|"
+                        "ase|lea|ple| pl|not".split("|")),
+        "chars": set(),
+    },
+    "Spanish": {
+        "words": set("el la los las de del que y en un una es por para con no se lo como pero mas más qué cómo "
+                     "hola gracias por favor tengo tiene estoy está mi yo usted necesito ayuda donde dónde".split()),
+        "trigrams": set(" de|de | la|la |os |el | el|que|ue | qu| co|as |es | en|en |ión|ció|aci| pa|par|ara|"
+                        " se|ent|nte|ado|ada|con|la | lo|los|las|est|ola|hol".split("|")),
+        "chars": set("ñ¿¡áéíóú"),
+    },
+    "French": {
+        "words": set("le la les de des du et est un une je tu il elle nous vous pas ne que qui pour dans avec "
+                     "sur mon ma mes bonjour merci comment pourquoi ai suis c'est".split()),
+        "trigrams": set(" de|de |es | le|le |ent|nt | la|la |les| qu|que|ue |ion| et|et | pa|our|ous|eme|men|"
+                        " je|je |ais|ait| vo|vou|bon|onj|ci |erc".split("|")),
+        "chars": set("àâçèéêëîïôœùûÿ"),
+    },
+    "German": {
+        "words": set("der die das und ist ich du er sie wir ihr nicht ein eine zu mit auf für von den dem des "
+                     "wie was warum hallo danke bitte habe kann mein".split()),
+        "trigrams": set("en |er | de|der|die|ie |ein| ei|ich|ch |sch|che|und| un|nd |den|cht| di|ten|gen|"
+                        " da|das|ung|hal|all|ank|dan|nke|ist| is".split("|")),
+        "chars": set("äöüß"),
+    },
+    "Portuguese": {
+        "words": set("o a os as de do da dos das que e em um uma é para com não por como mas eu você meu minha "
+                     "olá obrigado obrigada ajuda tenho está".split()),
+        "trigrams": set(" de|de | qu|que|ue |os | co|ão |ção|açã| do|do | da|da | pa|ara|par|ent| em|em |com|"
+                        "nte|ado|obr|bri|ocê|voc".split("|")),
+        "chars": set("ãõçáâêéíóôú"),
+    },
+    "Italian": {
+        "words": set("il lo la i gli le di del della che e è un una per con non sono come ma mi ciao grazie "
+                     "perché io ho hai questo".split()),
+        "trigrams": set(" di|di |che|he | ch|la | la|re |are|ell|lla|del| de|one|ent| co|con|to |zio|ion|ia |"
+                        "cia|iao|gra|azi|ere|per| pe".split("|")),
+        "chars": set("àèéìòù"),
+    },
+    "Dutch": {
+        "words": set("de het een en van ik je is niet dat die op te met voor zijn maar hoe wat waarom hallo "
+                     "dank bedankt alstublieft mijn".split()),
+        "trigrams": set("en | de|de |een| ee|het| he|van| va|an |ij |ijn| ik|ik |oor|aar|nie|iet|ver|"
+                        "ede| ge|dat|ank".split("|")),
+        "chars": set(),
+    },
+    "Turkish": {
+        "words": set("ve bir bu da de ne için ile mi mı ben sen nasıl neden merhaba teşekkürler lütfen var yok".split()),
+        "trigrams": set("lar|ler|ın |in |bir| bi|ir |an |ası|esi|yor|ıyo|iyo|mer|erh|rha|ve | ve|nas|sıl".split("|")),
+        "chars": set("çğışöü"),
+    },
+    "Indonesian": {
+        "words": set("yang dan di ke dari ini itu saya anda tidak ada untuk dengan bagaimana apa kenapa halo "
+                     "terima kasih tolong bisa".split()),
+        "trigrams": set("an |ang|yan| ya|kan| di|nya|ny |ah | me|men|eng|ada| ad|ter|ima|kas|sih| sa|aya".split("|")),
+        "chars": set(),
+    },
+    "Polish": {
+        "words": set("i w z na nie to jest się że do jak co dlaczego cześć dzień dziękuję proszę mam mój".split()),
+        "trigrams": set("nie| ni|ie | pr|prz|rze| si|się|ię | na|ch |ego|ani|wie|dzi|zię".split("|")),
+        "chars": set("ąćęłńóśźż"),
+    },
+}
+
+
+_ENGLISH_WORDS = _LATIN_PROFILES["English"]["words"]
+# Слова, которые есть и в английском ("a", "i", "in", "no", "me"), не свидетельствуют о другом языке
+_FOREIGN_WORDS: Dict[str, set] = {
+    language: profile["words"] - _ENGLISH_WORDS
+    for language, profile in _LATIN_PROFILES.items()
+    if language != "English"
+}
+
+
+class LanguageDetection(BaseModel):
+    """Результат локального определения языка."""
+    is_english: bool
+    language: Optional[str] = Field(default=None, description="Name of the detected language, None if unknown.")
+    confidence: float = Field(ge=0.0, le=1.0)
+    script: Optional[str] = None
+
+
+def _script_of(char: str) -> Optional[str]:
+    code = ord(char)
+    for start, end, script in _SCRIPT_RANGES:
+        if start <= code <= end:
+            return script
+    return None
+
+
+def _trigrams(words: List[str]) -> List[str]:
+    grams = []
+    for word in words:
+        padded = f" {word} "
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class LocalLanguageDetector:
+    """
+    Офлайн-детектор языка по письменности (Unicode) и символьным n-граммам.
+    Возвращает уверенность, по которой вызывающая сторона решает, нужен ли LLM.
+    """
+    # Доля букв одной письменности, при которой текст считается одноязычным (как правило 80% в промпте валидатора)
+    dominant_share = 0.8
+    # Уверенность для текста без слов (только цифры, тикеры с цифрами и т.п.)
+    ascii_prior = 0.85
+    # Сколько слов из профиля другого языка нужно, чтобы без диакритики отклонить текст
+    min_word_hits = 2
+    # Уверенность, когда признаков языка недостаточно (ниже порога валидатора)
+    ambiguous_confidence = 0.5
+
+    def detect(self, text: str) -> LanguageDetection:
+        cleaned = _NON_LINGUISTIC_RE.sub(" ", text or "")
+
+        script_counts: Dict[str, int] = {}
+        total_letters = 0
+        for char in cleaned:
+            if not char.isalpha():
+                continue
+            script = _script_of(char) or "Other"
+            script_counts[script] = script_counts.get(script, 0) + 1
+            total_letters += 1
+
+        # Нет слов (только эмодзи, адрес кошелька, ссылка) - ведем себя как валидатор для пустого текста
+        if total_letters == 0:
+            return LanguageDetection(is_english=True, confidence=1.0)
+
+        # Японский текст содержит и кану, и иероглифы
+        if "Kana" in script_counts and "Han" in script_counts:
+            script_counts["Kana"] += script_counts.pop("Han")
+
+        script, count = max(script_counts.items(), key=lambda item: item[1])
+        share = count / total_letters
+
+        if share < self.dominant_share:
+            # Смешанный текст ("Привет! How are you?") - решение за LLM
+            latin_share = script_counts.get("Latin", 0) / total_letters
+            return LanguageDetection(
+                is_english=latin_share >= 0.5,
+                language=None,
+                confidence=round(max(latin_share, 1 - latin_share) * 0.5, 3),
+                script="Mixed",
+            )
+
+        if script != "Latin":
+            return LanguageDetection(
+                is_english=False,
+                language=self._language_for_script(script, cleaned),
+                confidence=round(share, 3),
+                script=script,
+            )
+
+        return self._detect_latin(cleaned, share)
+
+    @staticmethod
+    def _language_for_script(script: str, text: str) -> Optional[str]:
+        if script == "Cyrillic" and any(char in text for char in "іїєґІЇЄҐ"):
+            return "Ukrainian"
+        if script == "Arabic" and any(char in text for char in "پچژگ"):
+            return "Persian"
+        return _SCRIPT_LANGUAGES.get(script)
+
+    def _detect_latin(self, text: str, script_share: float) -> LanguageDetection:
+        words = [word.lower() for word in _WORD_RE.findall(text)]
+        if not words:
+            return LanguageDetection(is_english=True, confidence=self.ascii_prior, script="Latin")
+
+        # Доля совпавших триграмм не годится как уверенность: для "Gas fee" или "Contact admin"
+        # английский профиль дает 0, и одна случайная триграмма другого языка давала бы ~0.9.
+        # Поэтому решение принимается по абсолютным признакам: словам из профиля и диакритике.
+        english_hits = sum(1 for word in words if word in _ENGLISH_WORDS)
+        grams = _trigrams(words)
+        best: Optional[Tuple[str, int, int]] = None
+        best_key: Tuple[int, int, float] = (0, 0, 0.0)
+        for language, profile in _LATIN_PROFILES.items():
+            if language == "English":
+                continue
+            hits = sum(1 for word in words if word in _FOREIGN_WORDS[language])
+            marks = sum(1 for char in "".join(words) if char in profile["chars"])
+            gram_score = sum(1 for gram in grams if gram in profile["trigrams"]) / len(grams)
+            key = (hits + marks, hits, gram_score)
+            if key > best_key:
+                best, best_key = (language, hits, marks), key
+
+        language, hits, marks = best if best else (None, 0, 0)
+        if hits > english_hits and (hits >= self.min_word_hits or (hits and marks)):
+            return LanguageDetection(
+                is_english=False,
+                language=language,
+                confidence=round(self._evidence_confidence(hits + marks - english_hits) * script_share, 3),
+                script="Latin",
+            )
+        if english_hits > hits and not marks:
+            return LanguageDetection(
+                is_english=True,
+                confidence=round(self._evidence_confidence(english_hits - hits) * script_share, 3),
+                script="Latin",
+            )
+
+        # Короткий текст без признаков языка ("Done", "Mint NFT", "Salut") - решение за LLM
+        is_english = english_hits >= hits
+        return LanguageDetection(
+            is_english=is_english,
+            language=None if is_english else language,
+            confidence=round(self.ambiguous_confidence * script_share, 3),
+            script="Latin",
+        )
+
+    @staticmethod
+    def _evidence_confidence(evidence: int) -> float:
+        # Одно слово из профиля - 0.7 (порог по умолчанию), каждое следующее добавляет 0.1
+        return min(0.95, 0.6 + 0.1 * evidence)
+
+
+__all__ = ["LocalLanguageDetector", "LanguageDetection"]
@@ -1,7 +1,13 @@
+import logging
 from typing import Optional
 from pydantic import BaseModel, Field
 from agents import Agent, Runner, ModelBehaviorError
 
+from .language_detector import LocalLanguageDetector
+from src.utils.lru_cache import LRUCache, normalize_cache_key
+
+logger = logging.getLogger(__name__)
+
 class LanguageValidationResult(BaseModel):
     is_english: bool = Field(description="True if the text is predominantly in English, False otherwise.")
     detected_language: Optional[str] = Field(default=None, description="The name of the detected language if not English (e.g., 'Spanish', 'French').")
@@ -80,7 +86,7 @@ class LanguageValidatorAgentWrapper:
             cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self, model_name: str = "gpt-4o-mini"):
+    def __init__(self, model_name: str = "gpt-4o-mini", confidence_threshold: float = 0.7, cache_size: int = 4096):
         if self._initialized:
             return
 
@@ -90,23 +96,64 @@ class LanguageValidatorAgentWrapper:
             output_type=LanguageValidationResult,
             model=model_name 
         )
+        # Локальный детектор отвечает сразу, если уверенность не ниже порога; иначе вызывается LLM
+        self.detector = LocalLanguageDetector()
+        self.confidence_threshold = confidence_threshold
+        self._cache = LRUCache(maxsize=cache_size)
         self._initialized = True
 
-    async def validate_language(self, user_message: str) -> LanguageValidationResult:
+    def validate_locally(self, user_message: str) -> Optional[LanguageValidationResult]:
         """
-        Validates the language of the user_message using the LLM agent.
-        The user_message is passed as the primary input to the agent.
+        Validates the language without the LLM: empty text, cache or a confident local detection.
+        Returns None when the LLM agent has to decide.
         """
         if not user_message or not user_message.strip():
             return LanguageValidationResult(is_english=True, detected_language=None)
-            
+
+        cache_key = normalize_cache_key(user_message)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached.model_copy()
+
+        detection = self.detector.detect(user_message)
+        if detection.confidence >= self.confidence_threshold:
+            logger.debug(f"Language settled locally: is_english={detection.is_english}, language={detection.language}, confidence={detection.confidence}")
+            result = LanguageValidationResult(
+                is_english=detection.is_english,
+                detected_language=None if detection.is_english else detection.language,
+            )
+            self._cache.set(cache_key, result)
+            return result.model_copy()
+
+        logger.debug(f"Local language detection is ambiguous (confidence={detection.confidence}).")
+        return None
+
+    def remember(self, user_message: str, result: LanguageValidationResult) -> None:
+        """Сохраняет результат, полученный вне валидатора (например, combined triage), в кэш."""
+        self._cache.set(normalize_cache_key(user_message), result.model_copy())
+
+    async def validate_language(self, user_message: str) -> LanguageValidationResult:
+        """
+        Validates the language of the user_message.
+        Confident cases are settled by the local detector, ambiguous ones by the LLM agent.
+        Results are cached by normalized text.
+        """
+        local_result = self.validate_locally(user_message)
+        if local_result is not None:
+            return local_result
+
         try:
             result = await Runner.run(self.agent, user_message) 
             
             validated_output = result.final_output_as(LanguageValidationResult)
+            self.remember(user_message, validated_output)
             return validated_output
         except ModelBehaviorError as mbe:
             return LanguageValidationResult(is_english=False, detected_language="Language check failed: LLM output format issue")
         except Exception as e:
             print(f"Generic error during LanguageValidatorAgent execution: {type(e).__name__} - {e}")
-            return LanguageValidationResult(is_english=True, detected_language=f"Validation Error: An unexpected error occurred ({type(e).__name__})")
\ No newline at end of file
+            return LanguageValidationResult(is_english=True, detected_language=f"Validation Error: An unexpected error occurred ({type(e).__name__})")
+
+    def cache_stats(self) -> dict:
+        """Возвращает статистику кэша результатов валидации."""
+        return self._cache.stats()
@@ -1,12 +1,13 @@
 from agents import Agent
 from agents.run_context import RunContextWrapper
-from .models import RouterDecision, RouterActionType # Наши модели для RouterAgent
+from .models import RouterDecision, RouterActionType, RouterDecisionParams # Наши модели для RouterAgent
 import os
 from dotenv import load_dotenv
-from typing import List, Any, Dict, Callable
+from typing import List, Any, Dict, Callable, Optional
 import json
 import logging
 from src.rules_manager.manager import RulesManager
+from src.rules_manager.matcher import RuleMatchResult, ConditionKey, ConditionVerdict
 from src.rules_manager.models import (
     Rule as RulesManagerRule, 
     AnyCondition as RulesManagerAnyCondition
@@ -14,6 +15,8 @@ from src.rules_manager.models import (
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     print("Warning: OPENAI_API_KEY environment variable not set.")
@@ -21,43 +24,48 @@ if not OPENAI_API_KEY:
 # Тип контекста для RouterAgent
 CtxType = object 
 
-def rule_to_dict_for_prompt(rule: RulesManagerRule) -> Dict[str, Any]:
+def decision_from_match(match: RuleMatchResult) -> RouterDecision:
     """
-    Конвертирует объект RulesManagerRule в словарь, подходящий для JSON-представления в промпте.
-    Использует model_dump() для корректной сериализации, включая вложенные Pydantic модели.
+    Собирает RouterDecision из результата локального матчера в том же виде,
+    в каком его возвращает RouterAgent.
     """
-    return rule.model_dump(exclude_none=True) 
-
-def dynamic_router_instructions(
-    context_wrapper: RunContextWrapper[CtxType], 
-    agent: Agent[CtxType]
-) -> str:
-    rules_manager: RulesManager = agent.rules_manager 
-    rules = rules_manager.get_rules() # Получаем список объектов RulesManagerRule
+    behavioral_prompts: List[str] = []
+    for rule in match.behavioral_rules:
+        behavioral_prompts.extend(getattr(rule.action_params, "behavioral_prompts", None) or [])
+    behavioral_rule_ids = [rule.rule_id for rule in match.behavioral_rules]
+
+    rule = match.matched_rule
+    if rule is None:
+        return RouterDecision(
+            action="default_reply",
+            matched_rule_id=None,
+            behavioral_rule_ids=behavioral_rule_ids,
+            params=RouterDecisionParams(
+                system_prompt_key="default_prompt",
+                behavioral_prompts=behavioral_prompts,
+            ),
+        )
 
-    # Извлекаем историю из контекста
-    history = "No history available."
-    if context_wrapper.context and isinstance(context_wrapper.context, dict):
-        history = context_wrapper.context.get("history", "No history available.")
-    if not history:
-        history = "No history available."
-    
-    rules_for_prompt_str = "No rules available."
-    if rules:
-        rules_for_prompt = [rule_to_dict_for_prompt(rule) for rule in rules]
-        rules_for_prompt_str = json.dumps(rules_for_prompt, indent=2, ensure_ascii=False)
-    
+    params = rule.action_params.model_dump(exclude_none=True)
+    behavioral_prompts.extend(params.pop("behavioral_prompts", None) or [])
+    return RouterDecision(
+        action=rule.action,
+        matched_rule_id=rule.rule_id,
+        behavioral_rule_ids=behavioral_rule_ids,
+        params=RouterDecisionParams(**params, behavioral_prompts=behavioral_prompts),
+    )
 
+def build_static_router_prompt(rules_for_prompt_str: str) -> str:
+    """
+    Собирает статическую часть промпта RouterAgent: инструкции и правила.
+    Она не зависит от пользователя, поэтому идет первой и образует общий префикс
+    для всех запросов (кэширование префикса промпта на стороне провайдера).
+    """
     prompt = f"""
 You are a sophisticated Router Agent. Your task is to process a user's message against a set of rules and produce a final action plan as a JSON object. 
 You MUST return your decision STRICTLY as a JSON string matching the `RouterDecision` schema.
 Do NOT add any explanatory text before or after the JSON string.
 
-Here is the conversation history with the user. Use it for context to better understand the user's intent.
-<history>
-{history}
-</history>
-
 Here are the rules, sorted by priority:
 {rules_for_prompt_str}
 
@@ -131,9 +139,29 @@ Example of a final JSON if both behavioral and terminal rules match:
     ]
   }}
 }}
+```
 """
     return prompt
 
+def dynamic_router_instructions(
+    context_wrapper: RunContextWrapper[CtxType], 
+    agent: Agent[CtxType]
+) -> str:
+    # Извлекаем историю из контекста
+    history = "No history available."
+    if context_wrapper.context and isinstance(context_wrapper.context, dict):
+        history = context_wrapper.context.get("history", "No history available.")
+    if not history:
+        history = "No history available."
+
+    # История пользователя идет в самом конце, после общего статического префикса
+    return f"""{agent.get_static_prompt()}
+Here is the conversation history with the user. Use it for context to better understand the user's intent.
+<history>
+{history}
+</history>
+"""
+
 class RouterAgent(Agent[CtxType]):
     rules_manager: RulesManager
 
@@ -144,6 +172,9 @@ class RouterAgent(Agent[CtxType]):
                  **kwargs):
         
         self.rules_manager = rules_manager 
+        # Статическая часть промпта, собранная для конкретной версии правил
+        self._static_prompt_version: int = -1
+        self._static_prompt: str = ""
 
         super().__init__(
             name=name, 
@@ -151,4 +182,28 @@ class RouterAgent(Agent[CtxType]):
             model=model,
             **kwargs
         )
-        print(f"[RouterAgent] Initialized with REAL RulesManager. Expecting JSON string output.")
\ No newline at end of file
+        print(f"[RouterAgent] Initialized with REAL RulesManager. Expecting JSON string output.")
+
+    def get_static_prompt(self) -> str:
+        """Возвращает статическую часть промпта, пересобирая ее только при смене версии правил."""
+        version = self.rules_manager.version
+        if version != self._static_prompt_version:
+            self._static_prompt = build_static_router_prompt(self.rules_manager.get_rules_prompt())
+            self._static_prompt_version = version
+            logger.info(f"Router prompt snapshot rebuilt for rules version {version} ({len(self._static_prompt)} chars).")
+        return self._static_prompt
+
+    def decide_locally(self, text: str, keyword_precedence: bool = False,
+                       description_verdicts: Optional[Dict[ConditionKey, ConditionVerdict]] = None) -> Optional[RouterDecision]:
+        """
+        Пытается принять решение по keyword/regex правилам (и, если переданы, по вердиктам
+        семантического пре-роутера для description_match) без вызова LLM.
+        Возвращает None, если нужно оценить description_match условие.
+        """
+        match = self.rules_manager.get_matcher().evaluate(
+            text, keyword_precedence=keyword_precedence, description_verdicts=description_verdicts
+        )
+        if not match.settled:
+            logger.debug(f"Local rule engine escalates to LLM. Pending rules: {match.pending_rule_ids}")
+            return None
+        return decision_from_match(match)
\ No newline at end of file
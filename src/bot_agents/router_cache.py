@@ -0,0 +1,106 @@
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from .models import RouterDecision
+from src.rules_manager.manager import RulesManager
+from src.utils.lru_cache import LRUCache, normalize_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class RouterDecisionCache:
+    """
+    LRU+TTL кэш решений RouterAgent.
+
+    Ключ: нормализованный текст, отпечаток последних сообщений истории и версия правил.
+    Решения по правилам с `uses_history: false` кэшируются только по тексту и
+    переиспользуются для любых пользователей независимо от истории, если выше
+    совпавшего правила нет правил, зависящих от истории.
+    При смене версии правил (/reload_rules) кэш очищается автоматически.
+    """
+    def __init__(self, rules_manager: RulesManager, maxsize: int = 2048, ttl: Optional[float] = 3600,
+                 history_turns: int = 4):
+        self.rules_manager = rules_manager
+        self.history_turns = history_turns
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._rules_version = rules_manager.version
+        self.hits = 0
+        self.misses = 0
+
+    def _sync_rules_version(self) -> int:
+        version = self.rules_manager.version
+        if version != self._rules_version:
+            logger.info(f"Rules version changed ({self._rules_version} -> {version}). Router decision cache invalidated.")
+            self._cache.clear()
+            self._rules_version = version
+        return version
+
+    def _history_fingerprint(self, history: List[dict]) -> str:
+        recent = history[-self.history_turns:] if self.history_turns > 0 else []
+        digest = hashlib.sha1()
+        for message in recent:
+            digest.update(f"{message.get('role')}\x1f{message.get('text')}\x1e".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _is_history_independent(self, decision: RouterDecision) -> bool:
+        """
+        Решение можно переиспользовать без учета истории, только если от истории не зависят
+        ни совпавшие правила, ни правила, которые RouterAgent проверяет раньше совпавшего:
+        иначе, например, Reask_Questions (приоритет 1) на "второй попытке" перекрыл бы FAREWELL.
+        """
+        if decision.matched_rule_id is None:
+            # Отсутствие совпадений тоже может зависеть от истории (например, Reask_Questions)
+            return False
+        matched = self.rules_manager.get_rule_by_id(decision.matched_rule_id)
+        if matched is None or matched.uses_history:
+            return False
+        for rule_id in decision.behavioral_rule_ids or []:
+            rule = self.rules_manager.get_rule_by_id(rule_id)
+            if rule is None or rule.uses_history:
+                return False
+        for rule in self.rules_manager.get_rules():
+            if not rule.uses_history or rule.rule_id == matched.rule_id:
+                continue
+            # Поведенческие правила проверяются всегда, терминальные - до совпавшего (по приоритету)
+            if rule.is_behavioral or rule.priority <= matched.priority:
+                return False
+        return True
+
+    def get(self, text: str, history: List[dict]) -> Optional[RouterDecision]:
+        """Возвращает копию закэшированного решения или None."""
+        version = self._sync_rules_version()
+        normalized = normalize_cache_key(text)
+
+        decision = self._cache.get(("text", version, normalized))
+        if decision is None:
+            decision = self._cache.get(("history", version, normalized, self._history_fingerprint(history)))
+        if decision is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Решение изменяется при выполнении (execute_router_decision), поэтому отдаем копию
+        return decision.model_copy(deep=True)
+
+    def put(self, text: str, history: List[dict], decision: RouterDecision) -> None:
+        version = self._sync_rules_version()
+        normalized = normalize_cache_key(text)
+        if self._is_history_independent(decision):
+            key = ("text", version, normalized)
+        else:
+            key = ("history", version, normalized, self._history_fingerprint(history))
+        self._cache.set(key, decision.model_copy(deep=True))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "rules_version": self._rules_version,
+        }
+
+
+__all__ = ["RouterDecisionCache"]
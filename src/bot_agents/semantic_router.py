@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from src.rules_manager.manager import RulesManager
+from src.rules_manager.matcher import ConditionKey, ConditionVerdict
+from src.rules_manager.models import DescriptionMatchCondition
+from src.utils.lru_cache import LRUCache, normalize_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticPreRouter:
+    """
+    Семантический пре-роутер для description_match условий.
+
+    Описания условий с заданными порогами эмбеддятся один раз на версию правил.
+    Правила с uses_history: true пропускаются: эмбеддится только текущее сообщение,
+    а решение по таким правилам зависит от истории диалога.
+    Каждое сообщение эмбеддится одним запросом и сравнивается со всеми описаниями
+    за один векторизованный проход (косинусное сходство). Уверенные совпадения и
+    несовпадения решаются локально, промежуточная зона остается для RouterAgent.
+    """
+    def __init__(self, rules_manager: RulesManager, client: AsyncOpenAI,
+                 model: str = "text-embedding-3-small", query_cache_size: int = 4096):
+        self.rules_manager = rules_manager
+        self.client = client
+        self.model = model
+        self._index_version: int = -1
+        self._keys: List[ConditionKey] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._match_thresholds: Optional[np.ndarray] = None
+        self._reject_thresholds: Optional[np.ndarray] = None
+        self._build_lock = asyncio.Lock()
+        self._query_cache = LRUCache(maxsize=query_cache_size)
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    async def _ensure_index(self) -> None:
+        """Пересобирает матрицу эмбеддингов описаний при смене версии правил."""
+        if self._index_version == self.rules_manager.version:
+            return
+        async with self._build_lock:
+            version = self.rules_manager.version
+            if self._index_version == version:
+                return
+
+            keys: List[ConditionKey] = []
+            descriptions: List[str] = []
+            match_thresholds: List[float] = []
+            reject_thresholds: List[float] = []
+            for rule in self.rules_manager.get_rules():
+                if rule.uses_history:
+                    continue
+                for index, condition in enumerate(rule.conditions):
+                    if not isinstance(condition, DescriptionMatchCondition):
+                        continue
+                    if condition.match_threshold is None and condition.reject_threshold is None:
+                        continue
+                    keys.append((rule.rule_id, index))
+                    descriptions.append(condition.description)
+                    # Отсутствующий порог никогда не срабатывает
+                    match_thresholds.append(condition.match_threshold if condition.match_threshold is not None else np.inf)
+                    reject_thresholds.append(condition.reject_threshold if condition.reject_threshold is not None else -np.inf)
+
+            matrix = await self._embed(descriptions) if descriptions else None
+            self._keys = keys
+            self._matrix = matrix
+            self._match_thresholds = np.array(match_thresholds, dtype=np.float32)
+            self._reject_thresholds = np.array(reject_thresholds, dtype=np.float32)
+            self._index_version = version
+            self._query_cache.clear()
+            logger.info(f"Semantic pre-router index built for rules version {version}: {len(keys)} description conditions.")
+
+    async def classify(self, text: str) -> Dict[ConditionKey, ConditionVerdict]:
+        """
+        Возвращает вердикты для description_match условий с порогами.
+        При ошибке эмбеддинга возвращает пустой словарь (решение остается за RouterAgent).
+        """
+        if not text or not text.strip():
+            return {}
+        try:
+            await self._ensure_index()
+            if self._matrix is None:
+                return {}
+
+            cache_key = normalize_cache_key(text)
+            query = self._query_cache.get(cache_key)
+            if query is None:
+                query = (await self._embed([text]))[0]
+                self._query_cache.set(cache_key, query)
+        except Exception as e:
+            logger.warning(f"Semantic pre-router failed to embed the message: {type(e).__name__} - {e}. Escalating to RouterAgent.")
+            return {}
+
+        similarities = self._matrix @ query
+        verdicts: Dict[ConditionKey, ConditionVerdict] = {}
+        for key, similarity, match_threshold, reject_threshold in zip(
+            self._keys, similarities, self._match_thresholds, self._reject_thresholds
+        ):
+            if similarity >= match_threshold:
+                verdicts[key] = "match"
+            elif similarity < reject_threshold:
+                verdicts[key] = "no_match"
+            else:
+                verdicts[key] = "unknown"
+        logger.debug(f"Semantic pre-router scores: {dict(zip(self._keys, np.round(similarities, 3).tolist()))}")
+        return verdicts
+
+
+__all__ = ["SemanticPreRouter"]
@@ -0,0 +1,94 @@
+import logging
+from typing import Optional
+from pydantic import BaseModel, Field
+from agents import Agent
+from agents.run_context import RunContextWrapper
+
+from .models import RouterDecision
+from .router_agent import RouterAgent, CtxType
+
+logger = logging.getLogger(__name__)
+
+
+class TriageDecision(BaseModel):
+    """Результат combined triage: вердикт по языку и решение маршрутизации в одном ответе."""
+    is_english: bool = Field(description="True if the text is predominantly in English, False otherwise.")
+    detected_language: Optional[str] = Field(default=None, description="The name of the detected language if not English (e.g., 'Spanish', 'French').")
+    routing: RouterDecision = Field(description="The routing decision for the user's message.")
+
+
+TRIAGE_LANGUAGE_SECTION = """
+You are a triage service for a support chat. For every user message you must do two things at once and return ONE structured object:
+1. Decide whether the message's predominant language is English (fields `is_english` and `detected_language`).
+2. Route the message against the rules below (field `routing`).
+
+## Language check
+- Split the message into word-tokens; if >= 80 % of alphabetic tokens are English, the message is English.
+- Otherwise identify the single language with the highest token share.
+- If the top two languages differ by < 10 % of tokens and one of them is English, default to English ("Привет! How are you?" is English).
+- Ignore named mentions of languages ("Where can I ask in Russian language?" is English).
+- `detected_language` is null for English, otherwise the conventional English name of the language (e.g. "Russian", "German").
+- If the message is not English, still fill `routing`; it will be ignored.
+
+## Routing
+Fill `routing` following the Router Agent instructions below. Ignore any instruction about returning a JSON string:
+the response format is enforced by the output schema.
+"""
+
+
+def build_static_triage_prompt(router_static_prompt: str) -> str:
+    """Статическая часть промпта combined triage: правила языка + инструкции и правила роутера."""
+    return f"{TRIAGE_LANGUAGE_SECTION}\n{router_static_prompt}"
+
+
+def dynamic_triage_instructions(
+    context_wrapper: RunContextWrapper[CtxType],
+    agent: Agent[CtxType]
+) -> str:
+    history = "No history available."
+    if context_wrapper.context and isinstance(context_wrapper.context, dict):
+        history = context_wrapper.context.get("history") or "No history available."
+
+    # Как и у RouterAgent, история идет последней, чтобы статический префикс кэшировался провайдером
+    return f"""{agent.get_static_prompt()}
+Here is the conversation history with the user. Use it for context to better understand the user's intent.
+<history>
+{history}
+</history>
+"""
+
+
+class TriageAgent(Agent[CtxType]):
+    """
+    Агент, который за один вызов LLM проверяет язык и выбирает маршрут.
+    Ответ типизирован через output_type, поэтому ручной разбор JSON не нужен.
+    """
+    router_agent: RouterAgent
+
+    def __init__(self,
+                 router_agent: RouterAgent,
+                 name: str = "TriageAgent",
+                 model: str = "gpt-4o-mini",
+                 **kwargs):
+        self.router_agent = router_agent
+        self._static_prompt_version: int = -1
+        self._static_prompt: str = ""
+
+        super().__init__(
+            name=name,
+            instructions=dynamic_triage_instructions,
+            output_type=TriageDecision,
+            model=model,
+            **kwargs
+        )
+
+    def get_static_prompt(self) -> str:
+        """Возвращает статическую часть промпта, пересобирая ее только при смене версии правил."""
+        version = self.router_agent.rules_manager.version
+        if version != self._static_prompt_version:
+            self._static_prompt = build_static_triage_prompt(self.router_agent.get_static_prompt())
+            self._static_prompt_version = version
+        return self._static_prompt
+
+
+__all__ = ["TriageAgent", "TriageDecision"]
@@ -1,5 +1,6 @@
 import yaml
 import os
+import hashlib
 from typing import Dict
 import logging
 
@@ -10,6 +11,8 @@ class PromptManager:
     _prompts: Dict[str, str] = {}
     _default_prompt_key = "default_prompt"
     _prompts_file_path = "prompts.yaml"
+    # Отпечаток содержимого prompts.yaml (используется для инвалидации кэшей ответов)
+    version: str = ""
 
     def __new__(cls):
         if cls._instance is None:
@@ -17,22 +20,25 @@ class PromptManager:
             cls._instance._load_prompts()
         return cls._instance
 
-    def _load_prompts(self):
+    def _load_prompts(self) -> bool:
         try:
             if not os.path.exists(self._prompts_file_path):
                 logger.error(f"Prompts file not found at '{self._prompts_file_path}'. Cannot load prompts.")
                 self._prompts = {}
-                return
+                return False
 
             with open(self._prompts_file_path, 'r', encoding='utf-8') as f:
-                loaded_prompts = yaml.safe_load(f)
+                content = f.read()
+                loaded_prompts = yaml.safe_load(content)
                 if not isinstance(loaded_prompts, dict):
                     logger.error(f"'{self._prompts_file_path}' is not a valid dictionary. No prompts loaded.")
-                    return
+                    return False
                 self._prompts = loaded_prompts
+                self.version = hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
                 if self._default_prompt_key not in self._prompts:
                     logger.error(f"'{self._default_prompt_key}' is missing from '{self._prompts_file_path}'. Fallback mechanism will be impaired.")
                 logger.info(f"Successfully loaded {len(self._prompts)} prompts from '{self._prompts_file_path}'.")
+                return True
 
         except yaml.YAMLError as e:
             logger.error(f"Error parsing YAML file '{self._prompts_file_path}': {e}")
@@ -40,6 +46,21 @@ class PromptManager:
         except Exception as e:
             logger.error(f"An unexpected error occurred while loading prompts: {e}", exc_info=True)
             self._prompts = {}
+        return False
+
+    def reload_prompts(self) -> bool:
+        """
+        Перечитывает prompts.yaml. Возвращает True, если промпты загружены.
+        При ошибке восстанавливаются предыдущие промпты и версия (как в RulesManager.reload_rules).
+        """
+        current_prompts_backup = self._prompts
+        current_version_backup = self.version
+        if self._load_prompts() and self._prompts:
+            return True
+        logger.error(f"Failed to reload prompts. Restoring previous prompt set ({len(current_prompts_backup)} prompts).")
+        self._prompts = current_prompts_backup
+        self.version = current_version_backup
+        return False
 
     def get_prompt(self, key: str) -> str:
         """
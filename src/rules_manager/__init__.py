@@ -16,6 +16,7 @@ from .models import (
     Rule,
     RulesConfig
 )
+from .matcher import RuleMatcher, RuleMatchResult
 from .manager import RulesManager, RulesFileError
 
 __all__ = [
@@ -32,6 +33,8 @@ __all__ = [
     "DropActionParams",
     "Rule",
     "RulesConfig",
+    "RuleMatcher",
+    "RuleMatchResult",
     "RulesManager",
     "RulesFileError"
 ] 
\ No newline at end of file
@@ -2,11 +2,13 @@
 # This file contains the RulesManager class, which is responsible for loading and managing the rules.
 
 import yaml
+import json
 import logging
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import ValidationError
 
 from .models import Rule, RulesConfig # Используем относительный импорт
+from .matcher import RuleMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +16,33 @@ class RulesFileError(Exception):
     """Custom exception for errors related to rules file processing."""
     pass
 
+def rule_to_dict_for_prompt(rule: Rule) -> Dict[str, Any]:
+    """
+    Конвертирует объект Rule в словарь, подходящий для JSON-представления в промпте RouterAgent.
+    Служебные поля, не влияющие на решение LLM, исключаются.
+    """
+    return rule.model_dump(
+        exclude_none=True,
+        exclude={
+            "uses_history": True,
+            "conditions": {"__all__": {"match_threshold", "reject_threshold"}},
+        },
+    )
+
+def serialize_rules_for_prompt(rules: List[Rule]) -> str:
+    """Компактная JSON-сериализация правил для промпта (без отступов и лишних пробелов)."""
+    if not rules:
+        return "No rules available."
+    return json.dumps([rule_to_dict_for_prompt(rule) for rule in rules], ensure_ascii=False, separators=(",", ":"))
+
 class RulesManager:
     def __init__(self, rules_file_path: str):
         self.rules_file_path = rules_file_path
         self._rules: List[Rule] = []
+        self._matcher: RuleMatcher = RuleMatcher([])
+        self._rules_prompt: str = serialize_rules_for_prompt([])
+        # Версия набора правил увеличивается при каждой успешной загрузке (используется для инвалидации кэшей)
+        self.version: int = 0
         self.load_rules()
         logger.info(f"RulesManager initialized successfully. Loaded {len(self._rules)} rules from {self.rules_file_path}")
 
@@ -29,12 +54,12 @@ class RulesManager:
             
             if not raw_config or 'rules' not in raw_config:
                  logger.warning(f"Rules file {self.rules_file_path} is empty or does not contain a 'rules' key. Loading empty rule set.")
-                 self._rules = []
+                 self._apply_rules([])
                  return self._rules
 
             config = RulesConfig(**raw_config)
             
-            self._rules = sorted(config.rules, key=lambda rule: rule.priority)
+            self._apply_rules(sorted(config.rules, key=lambda rule: rule.priority))
             
             logger.info(f"Successfully loaded and validated {len(self._rules)} rules from {self.rules_file_path}.")
             return self._rules
@@ -52,9 +77,29 @@ class RulesManager:
             logger.error(f"An unexpected error occurred while loading rules from {self.rules_file_path}: {e}")
             raise RulesFileError(f"An unexpected error occurred: {e}")
 
+    def _apply_rules(self, rules: List[Rule]) -> None:
+        """
+        Устанавливает новый набор правил вместе с производными структурами.
+        Матчер и сериализация правил для промпта строятся один раз на каждую загрузку.
+        """
+        matcher = RuleMatcher(rules)
+        rules_prompt = serialize_rules_for_prompt(rules)
+        self._rules = rules
+        self._matcher = matcher
+        self._rules_prompt = rules_prompt
+        self.version += 1
+
     def get_rules(self) -> List[Rule]:
         return self._rules
 
+    def get_matcher(self) -> RuleMatcher:
+        """Возвращает локальный матчер keyword/regex условий для текущего набора правил."""
+        return self._matcher
+
+    def get_rules_prompt(self) -> str:
+        """Возвращает заранее подготовленное компактное JSON-представление правил для промпта."""
+        return self._rules_prompt
+
     def get_rule_by_id(self, rule_id: str) -> Optional[Rule]:
         """Находит правило по его ID."""
         if not rule_id:
@@ -67,6 +112,8 @@ class RulesManager:
     def reload_rules(self) -> bool:
         logger.info(f"Attempting to reload rules from {self.rules_file_path}")
         current_rules_backup = list(self._rules)
+        current_matcher_backup = self._matcher
+        current_rules_prompt_backup = self._rules_prompt
         try:
             self.load_rules()
             logger.info(f"Rules reloaded successfully. {len(self._rules)} rules are now active.")
@@ -74,8 +121,12 @@ class RulesManager:
         except RulesFileError as e:
             logger.error(f"Failed to reload rules: {e}. Restoring previous rule set ({len(current_rules_backup)} rules).")
             self._rules = current_rules_backup
+            self._matcher = current_matcher_backup
+            self._rules_prompt = current_rules_prompt_backup
             return False
         except Exception as e:
             logger.error(f"An unexpected critical error occurred during rule reload: {e}. Restoring previous rule set ({len(current_rules_backup)} rules).")
             self._rules = current_rules_backup
+            self._matcher = current_matcher_backup
+            self._rules_prompt = current_rules_prompt_backup
             return False 
\ No newline at end of file
@@ -0,0 +1,292 @@
+# src/rules_manager/matcher.py
+# This file contains the RuleMatcher class, which evaluates keyword/regex conditions locally,
+# without calling the RouterAgent LLM.
+
+import re
+import logging
+from collections import deque
+from typing import Dict, List, Literal, Optional, Set, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from .models import Rule, KeywordMatchCondition, RegexMatchCondition, ReplyActionParams
+
+logger = logging.getLogger(__name__)
+
+# Результат проверки отдельного условия или правила целиком
+ConditionVerdict = Literal["match", "no_match", "unknown"]
+
+# Ключ description_match условия: (rule_id, индекс условия в правиле)
+ConditionKey = Tuple[str, int]
+
+
+class KeywordAutomaton:
+    """
+    Автомат Ахо-Корасик для поиска всех ключевых слов за один проход по тексту.
+    Ключевые слова ищутся как подстроки (как и в описании keyword_match в rules.yaml).
+    """
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[int]] = [set()]
+        self._pattern_ids: Dict[str, int] = {}
+
+    def add(self, pattern: str) -> int:
+        """Добавляет шаблон в автомат и возвращает его идентификатор."""
+        if pattern in self._pattern_ids:
+            return self._pattern_ids[pattern]
+
+        pattern_id = len(self._pattern_ids)
+        self._pattern_ids[pattern] = pattern_id
+
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].add(pattern_id)
+        return pattern_id
+
+    def build(self) -> None:
+        """Строит fail-ссылки (обход в ширину). Вызывается один раз после добавления всех шаблонов."""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Set[int]:
+        """Возвращает идентификаторы всех шаблонов, встретившихся в тексте."""
+        found: Set[int] = set()
+        if not self._pattern_ids:
+            return found
+
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found |= self._output[state]
+        return found
+
+
+class _CompiledCondition:
+    """Условие правила, подготовленное для быстрой локальной проверки."""
+    def __init__(self, kind: str, key: ConditionKey, keyword_ids: Optional[List[int]] = None, case_sensitive: bool = False,
+                 match_type: str = "any", regex: Optional[re.Pattern] = None):
+        self.kind = kind
+        self.key = key
+        self.keyword_ids = keyword_ids or []
+        self.case_sensitive = case_sensitive
+        self.match_type = match_type
+        self.regex = regex
+
+    def evaluate(self, text: str, hits_ci: Set[int], hits_cs: Set[int],
+                 description_verdicts: Optional[Dict[ConditionKey, ConditionVerdict]] = None) -> ConditionVerdict:
+        if self.kind == "keyword_match":
+            if not self.keyword_ids:
+                return "unknown"
+            hits = hits_cs if self.case_sensitive else hits_ci
+            if self.match_type == "all":
+                matched = all(keyword_id in hits for keyword_id in self.keyword_ids)
+            else:
+                matched = any(keyword_id in hits for keyword_id in self.keyword_ids)
+            return "match" if matched else "no_match"
+
+        if self.kind == "regex_match":
+            if self.regex is None:
+                return "unknown"
+            return "match" if self.regex.search(text) else "no_match"
+
+        # description_match оценивает семантический пре-роутер (если передан вердикт) или LLM
+        if description_verdicts:
+            return description_verdicts.get(self.key, "unknown")
+        return "unknown"
+
+
+class _CompiledRule:
+    def __init__(self, rule: Rule, conditions: List[_CompiledCondition]):
+        self.rule = rule
+        self.conditions = conditions
+
+    def evaluate(self, text: str, hits_ci: Set[int], hits_cs: Set[int],
+                 description_verdicts: Optional[Dict[ConditionKey, ConditionVerdict]] = None) -> ConditionVerdict:
+        """
+        Все условия правила должны выполняться одновременно.
+        Достаточно одного невыполненного keyword/regex условия, чтобы отклонить правило без LLM.
+        """
+        verdict: ConditionVerdict = "match"
+        for condition in self.conditions:
+            condition_verdict = condition.evaluate(text, hits_ci, hits_cs, description_verdicts)
+            if condition_verdict == "no_match":
+                return "no_match"
+            if condition_verdict == "unknown":
+                verdict = "unknown"
+        return verdict
+
+
+class RuleMatchResult(BaseModel):
+    """
+    Результат локальной проверки правил.
+    settled=False означает, что решение зависит от description_match и нужен RouterAgent.
+    """
+    settled: bool
+    matched_rule: Optional[Rule] = None
+    behavioral_rules: List[Rule] = Field(default_factory=list)
+    pending_rule_ids: List[str] = Field(default_factory=list)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+def _consumes_behavioral_prompts(rule: Optional[Rule]) -> bool:
+    """
+    Поведенческие промпты используются только AnswerAgent'ом (reply через system_prompt_key
+    или default_reply). Для drop, forward и прямого response_text они не влияют на результат.
+    """
+    if rule is None:
+        return True
+    if rule.action != "reply":
+        return False
+    params = rule.action_params
+    return not (isinstance(params, ReplyActionParams) and params.response_text)
+
+
+class RuleMatcher:
+    """
+    Детерминированный матчер правил. Строится один раз при каждой загрузке правил:
+    все ключевые слова собираются в два автомата Ахо-Корасик (с учетом и без учета регистра),
+    регулярные выражения компилируются заранее.
+    """
+    def __init__(self, rules: List[Rule]):
+        self._automaton_ci = KeywordAutomaton()
+        self._automaton_cs = KeywordAutomaton()
+        self._rules: List[_CompiledRule] = [self._compile_rule(rule) for rule in rules]
+        self._automaton_ci.build()
+        self._automaton_cs.build()
+        logger.debug(f"RuleMatcher built for {len(self._rules)} rules.")
+
+    def _compile_rule(self, rule: Rule) -> _CompiledRule:
+        conditions = []
+        for index, condition in enumerate(rule.conditions):
+            key = (rule.rule_id, index)
+            if isinstance(condition, KeywordMatchCondition):
+                automaton = self._automaton_cs if condition.case_sensitive else self._automaton_ci
+                keyword_ids = []
+                for keyword in condition.keywords:
+                    keyword = keyword.strip()
+                    if not keyword:
+                        continue
+                    if not condition.case_sensitive:
+                        keyword = keyword.lower()
+                    keyword_ids.append(automaton.add(keyword))
+                conditions.append(_CompiledCondition(
+                    kind="keyword_match",
+                    key=key,
+                    keyword_ids=keyword_ids,
+                    case_sensitive=condition.case_sensitive,
+                    match_type=condition.match_type,
+                ))
+            elif isinstance(condition, RegexMatchCondition):
+                try:
+                    regex = re.compile(condition.pattern)
+                except re.error as e:
+                    logger.warning(f"Invalid regex in rule '{rule.rule_id}': {e}. The condition will be judged by RouterAgent.")
+                    regex = None
+                conditions.append(_CompiledCondition(kind="regex_match", key=key, regex=regex))
+            else:
+                conditions.append(_CompiledCondition(kind=condition.type, key=key))
+        return _CompiledRule(rule, conditions)
+
+    def evaluate(self, text: str, keyword_precedence: bool = False,
+                 description_verdicts: Optional[Dict[ConditionKey, ConditionVerdict]] = None) -> RuleMatchResult:
+        """
+        Проходит по правилам в порядке приоритета, как это делает RouterAgent.
+
+        Args:
+            text: сообщение пользователя
+            keyword_precedence: если True, полностью совпавшее терминальное правило
+                не блокируется терминальными правилами с более высоким приоритетом,
+                которые требуют оценки description_match и не используют историю.
+            description_verdicts: вердикты для description_match условий
+                (например, от семантического пре-роутера); отсутствующие считаются "unknown".
+
+        Returns:
+            RuleMatchResult: settled=True, если решение получено без LLM.
+        """
+        text = text or ""
+        hits_ci = self._automaton_ci.find(text.lower())
+        hits_cs = self._automaton_cs.find(text)
+
+        behavioral_rules: List[Rule] = []
+        pending_behavioral: List[str] = []
+        pending_terminal: List[str] = []
+
+        for position, compiled in enumerate(self._rules):
+            rule = compiled.rule
+            verdict = compiled.evaluate(text, hits_ci, hits_cs, description_verdicts)
+
+            if rule.is_behavioral:
+                if verdict == "match":
+                    behavioral_rules.append(rule)
+                elif verdict == "unknown":
+                    pending_behavioral.append(rule.rule_id)
+                continue
+
+            if verdict == "no_match":
+                continue
+
+            if verdict == "unknown":
+                pending_terminal.append(rule.rule_id)
+                # Правило, зависящее от истории (например, "вторая попытка" Reask_Questions),
+                # нельзя пропускать: по одному тексту его исход неизвестен
+                if keyword_precedence and not rule.uses_history:
+                    continue
+                return RuleMatchResult(settled=False, pending_rule_ids=pending_behavioral + pending_terminal)
+
+            # Терминальное правило сработало
+            if pending_behavioral and _consumes_behavioral_prompts(rule):
+                return RuleMatchResult(settled=False, pending_rule_ids=pending_behavioral)
+            # Порядок правил с одинаковым приоритетом для RouterAgent не гарантирован:
+            # неоцененное правило того же приоритета могло бы сработать вместо найденного
+            tied = self._blocking_tied_rules(position, text, hits_ci, hits_cs, keyword_precedence, description_verdicts)
+            if tied:
+                return RuleMatchResult(settled=False, pending_rule_ids=pending_behavioral + pending_terminal + tied)
+            return RuleMatchResult(settled=True, matched_rule=rule, behavioral_rules=behavioral_rules)
+
+        if pending_terminal or pending_behavioral:
+            return RuleMatchResult(settled=False, pending_rule_ids=pending_behavioral + pending_terminal)
+
+        return RuleMatchResult(settled=True, matched_rule=None, behavioral_rules=behavioral_rules)
+
+    def _blocking_tied_rules(self, position: int, text: str, hits_ci: Set[int], hits_cs: Set[int],
+                             keyword_precedence: bool,
+                             description_verdicts: Optional[Dict[ConditionKey, ConditionVerdict]]) -> List[str]:
+        """Терминальные правила с тем же приоритетом после совпавшего, исход которых неизвестен."""
+        priority = self._rules[position].rule.priority
+        blocking = []
+        for compiled in self._rules[position + 1:]:
+            rule = compiled.rule
+            if rule.priority != priority:
+                break
+            if rule.is_behavioral or (keyword_precedence and not rule.uses_history):
+                continue
+            if compiled.evaluate(text, hits_ci, hits_cs, description_verdicts) == "unknown":
+                blocking.append(rule.rule_id)
+        return blocking
@@ -27,6 +27,20 @@ class RegexMatchCondition(BaseCondition):
 class DescriptionMatchCondition(BaseCondition):
     type: Literal["description_match"] = "description_match"
     description: str = Field(..., min_length=1)
+    # Пороги косинусного сходства для семантического пре-роутера (эмбеддинги).
+    # Сходство >= match_threshold - условие выполнено, < reject_threshold - не выполнено,
+    # иначе (или если пороги не заданы) условие оценивает RouterAgent.
+    match_threshold: Optional[float] = Field(default=None, ge=-1.0, le=1.0)
+    reject_threshold: Optional[float] = Field(default=None, ge=-1.0, le=1.0)
+
+    @model_validator(mode='after')
+    def check_thresholds(self) -> 'DescriptionMatchCondition':
+        if (self.match_threshold is not None and self.reject_threshold is not None
+                and self.reject_threshold > self.match_threshold):
+            raise ValueError(
+                f'reject_threshold ({self.reject_threshold}) must not exceed match_threshold ({self.match_threshold}).'
+            )
+        return self
 
 # Union of all condition types using discriminated union
 AnyCondition = Union[KeywordMatchCondition, RegexMatchCondition, DescriptionMatchCondition]
@@ -68,6 +82,7 @@ class Rule(BaseModel):
     action: ActionType
     action_params: Union[ReplyActionParams, ForwardActionParams, DropActionParams]
     instruction: Optional[str] = None # For system prompts
+    uses_history: bool = True # False: решение по правилу не зависит от истории диалога и может кэшироваться по тексту
 
     model_config = ConfigDict(
         extra='forbid',
@@ -1,5 +1,7 @@
+from typing import List
 from agents import function_tool
 from src.utils.rag_retriever import DocumentRetriever, RetrievalError
+from src.utils.logging_setup import log_payload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +16,7 @@ except RetrievalError as e:
     document_retriever = None
 
 @function_tool
-def retrieve_rag_context(query: str) -> str:
+async def retrieve_rag_context(query: str) -> str:
     """
     Retrieves relevant context from the knowledge base (RAG) to answer a user's query.
     Use this tool when you need additional information to provide a comprehensive and accurate answer.
@@ -32,18 +34,55 @@ def retrieve_rag_context(query: str) -> str:
         return "Error: The knowledge base is currently unavailable."
         
     try:
-        context = document_retriever.get_relevant_context(query)
+        # Асинхронный путь: эмбеддинг не блокирует event loop, поиск FAISS идет в пуле потоков
+        packed = await document_retriever.aget_relevant_context(query)
+        context = packed.text
         if not context:
             logger.warning(f"No context found for query: '{query}'")
             return "No specific information found for this query in the knowledge base."
         
-        logger.info(f"Successfully retrieved context for query: '{query}'")
-        # Добавляем подробное логирование извлеченного контекста
-        logger.info(f"--- RETRIEVED CONTEXT START ---\n{context}\n--- RETRIEVED CONTEXT END ---")
+        logger.info("Successfully retrieved context for query: '%s' (%s)", query, packed.summary())
+        # Подробный контекст - в канал payload (DEBUG, с выборкой)
+        log_payload(logger, "--- RETRIEVED CONTEXT START ---\n%s\n--- RETRIEVED CONTEXT END ---", context)
         
         return context
     except Exception as e:
         logger.error(f"An error occurred during context retrieval for query '{query}': {e}", exc_info=True)
         return "An error occurred while trying to access the knowledge base."
 
-__all__ = ["retrieve_rag_context"] 
\ No newline at end of file
+@function_tool
+async def retrieve_rag_context_batch(queries: List[str]) -> str:
+    """
+    Retrieves relevant context from the knowledge base (RAG) for several queries at once.
+    Prefer this tool over multiple `retrieve_rag_context` calls when you have the user's query and follow-up questions:
+    all queries are searched in one request and the results are merged without duplicates.
+    
+    Args:
+        queries: The user's query and the follow-up questions, each self-contained and specific.
+        
+    Returns:
+        A string containing the merged relevant context, or a message indicating that no information was found or an error occurred.
+    """
+    logger.info(f"RAG batch tool triggered with {len(queries)} queries: {queries}")
+    
+    if document_retriever is None:
+        logger.error("DocumentRetriever is not available, cannot retrieve context.")
+        return "Error: The knowledge base is currently unavailable."
+        
+    try:
+        # Один запрос эмбеддингов и один поиск FAISS для всех запросов
+        packed = await document_retriever.aget_relevant_context_many(queries)
+        context = packed.text
+        if not context:
+            logger.warning(f"No context found for queries: {queries}")
+            return "No specific information found for these queries in the knowledge base."
+        
+        logger.info("Successfully retrieved context for %d queries (%s)", len(queries), packed.summary())
+        log_payload(logger, "--- RETRIEVED CONTEXT START ---\n%s\n--- RETRIEVED CONTEXT END ---", context)
+        
+        return context
+    except Exception as e:
+        logger.error(f"An error occurred during batch context retrieval for queries {queries}: {e}", exc_info=True)
+        return "An error occurred while trying to access the knowledge base."
+
+__all__ = ["retrieve_rag_context", "retrieve_rag_context_batch"] 
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Строит альтернативный индекс (IVF-PQ, HNSW или SQ8) и SQLite docstore из flat-хранилища langchain FAISS.
+
+Запуск (из каталога src):
+    python -m utils.build_index --type hnsw
+"""
+
+import os
+import time
+import logging
+import argparse
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+
+from .config import EMBEDDING_MODEL, VECTOR_STORE_PATH, RAG_INDEX_SETTINGS, VectorizationError
+from .vector_index import DOCSTORE_FILENAME, INDEX_TYPES, SQLiteDocstore, factory_string, index_filename
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover
+    faiss = None
+
+
+def build_index(store_path: str = VECTOR_STORE_PATH, index_type: str = RAG_INDEX_SETTINGS['type']) -> str:
+    """
+    Строит индекс выбранного типа из векторов flat-хранилища.
+
+    Returns:
+        str: путь к записанному файлу индекса
+
+    Raises:
+        VectorizationError: при ошибках построения индекса
+    """
+    if index_type == "flat":
+        raise VectorizationError("Тип flat - это исходное хранилище, строить его не нужно")
+    if faiss is None:
+        raise VectorizationError("Для построения индекса требуется пакет faiss")
+
+    try:
+        started = time.perf_counter()
+        # Эмбеддинги не вызываются: векторы берутся из существующего индекса
+        store = FAISS.load_local(store_path, OpenAIEmbeddings(model=EMBEDDING_MODEL), allow_dangerous_deserialization=True)
+        ntotal = store.index.ntotal
+        if ntotal == 0:
+            raise VectorizationError("Исходное хранилище пустое")
+
+        vectors = np.ascontiguousarray(store.index.reconstruct_n(0, ntotal), dtype=np.float32)
+        normalize_L2 = bool(getattr(store, "_normalize_L2", False))
+        if normalize_L2:
+            faiss.normalize_L2(vectors)
+
+        description = factory_string(index_type, vectors.shape[1], ntotal)
+        logger.info(f"Строим индекс {index_type} ({description}) для {ntotal} векторов размерности {vectors.shape[1]}")
+        index = faiss.index_factory(vectors.shape[1], description, faiss.METRIC_L2)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+
+        index_path = os.path.join(store_path, index_filename(index_type))
+        faiss.write_index(index, index_path)
+
+        documents = [
+            (store.index_to_docstore_id[position], store.docstore.search(store.index_to_docstore_id[position]))
+            for position in range(ntotal)
+        ]
+        SQLiteDocstore.write(
+            os.path.join(store_path, DOCSTORE_FILENAME), documents,
+            settings={"normalize_L2": "1" if normalize_L2 else "0"}
+        )
+
+        logger.info(
+            f"Индекс записан в {index_path} ({os.path.getsize(index_path) / 1e6:.1f} MB) "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+        return index_path
+    except VectorizationError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при построении индекса {index_type}: {str(e)}")
+        raise VectorizationError(f"Ошибка построения индекса: {str(e)}")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Построение альтернативного индекса FAISS из flat-хранилища")
+    parser.add_argument("--type", choices=[t for t in INDEX_TYPES if t != "flat"], default=None,
+                        help="Тип индекса (по умолчанию RAG_INDEX_TYPE)")
+    parser.add_argument("--store", default=VECTOR_STORE_PATH, help="Путь к flat-хранилищу")
+    args = parser.parse_args()
+
+    index_type = args.type or RAG_INDEX_SETTINGS['type']
+    build_index(args.store, index_type)
+
+
+if __name__ == "__main__":
+    main()
@@ -71,6 +71,35 @@ RAG_SETTINGS = {
     'k': 5,  # количество документов для возврата
     'score_threshold': 0.3,  # минимальный порог схожести
     'max_tokens': 2000,  # максимальное количество токенов для контекста
+    'duplicate_threshold': 0.8,  # порог Jaccard (3-граммы слов), выше которого чанк считается дубликатом
+    'trim_sentences': True,  # сокращать не помещающийся чанк до самых релевантных предложений
+    'min_chunk_tokens': 32,  # минимальный остаток бюджета для сокращенного чанка
+    'search_mode': os.getenv('RAG_SEARCH_MODE', 'vector').lower(),  # vector | hybrid (FAISS + BM25, RRF)
+    'lexical_only': True,  # гибридный режим: короткие запросы с хэшами/адресами/кодами ошибок ищутся только по BM25
+    'lexical_max_query_tokens': 4,  # максимальная длина такого запроса в словах
+    'hybrid_candidates': 20,  # количество кандидатов из каждого списка для слияния
+    'rrf_k': 60,  # константа reciprocal rank fusion
+    'search_workers': 4,  # размер пула потоков для поиска FAISS (асинхронный путь)
+    'result_cache_size': 1024,  # размер кэша результатов поиска (0 - отключить)
+    'result_cache_ttl': 3600,  # время жизни результата поиска в кэше (секунды)
+}
+
+# Настройки типа индекса (flat - исходное хранилище langchain FAISS;
+# ivfpq / hnsw / sq8 строятся командой `python -m utils.build_index --type <type>`)
+RAG_INDEX_SETTINGS = {
+    'type': os.getenv('RAG_INDEX_TYPE', 'flat').lower(),
+    'mmap': os.getenv('RAG_INDEX_MMAP', 'true').lower() in ('true', '1', 't', 'yes'),  # загрузка через memory-mapping
+    'nprobe': int(os.getenv('RAG_INDEX_NPROBE', '16')),  # число просматриваемых кластеров IVF
+    'ef_search': int(os.getenv('RAG_INDEX_EF_SEARCH', '64')),  # ширина поиска HNSW
+    'ivf_nlist': None,  # число кластеров IVF (None - подбирается по размеру базы)
+    'pq_m': 16,  # число подвекторов PQ (должно делить размерность эмбеддинга)
+    'hnsw_m': 32,  # число связей узла HNSW
+}
+
+# Настройки кэша эмбеддингов запросов (память + SQLite, переживает перезапуски)
+EMBEDDING_CACHE_SETTINGS = {
+    'path': 'data/embedding_cache.sqlite',
+    'memory_size': 2048,  # количество векторов в памяти процесса
 }
 
 # Настройки разделения текста
@@ -79,6 +108,15 @@ TEXT_SPLITTER_SETTINGS = {
     'chunk_overlap': 100,
 }
 
+# Настройки загрузки базы знаний (python -m utils.ingest)
+INGEST_SETTINGS = {
+    'rows_per_chunk': 1000,  # количество строк CSV, читаемых за раз
+    'embedding_batch_size': 256,  # количество текстов в одном запросе эмбеддингов
+    'embedding_concurrency': 4,  # количество одновременных запросов эмбеддингов
+    'max_retries': 6,  # повторы при rate limit и временных ошибках API
+    'initial_backoff': 1.0,  # начальная задержка перед повтором (секунды)
+}
+
 # Настройки CSV
 CSV_SETTINGS = {
     'delimiter': ',',
@@ -93,4 +131,26 @@ CSV_SETTINGS = {
     ],
 }
 
-NUM_STORED_MESSAGES = 10
\ No newline at end of file
+NUM_STORED_MESSAGES = 10
+
+# Настройки памяти диалогов (MemoryManager)
+MEMORY_SETTINGS = {
+    'max_users': int(os.getenv('MEMORY_MAX_USERS', '10000')),  # максимум пользователей в памяти (LRU, 0 - без ограничения)
+    'idle_ttl': float(os.getenv('MEMORY_IDLE_TTL', '86400')),  # история неактивного пользователя удаляется через N секунд (0 - никогда)
+    'backend': os.getenv('MEMORY_BACKEND', 'memory').lower(),  # memory | sqlite (история переживает перезапуски)
+    'db_path': os.getenv('MEMORY_DB_PATH', 'data/memory.sqlite'),
+    'flush_interval': 0.5,  # интервал фоновой записи в SQLite (секунды)
+    'batch_size': 100,  # запись без ожидания интервала, если накопилось столько операций
+}
+
+# Журнал взаимодействий (InteractionLog): пакетная асинхронная запись в SQLite
+INTERACTION_LOG_SETTINGS = {
+    'enabled': os.getenv('INTERACTION_LOG', 'true').lower() in ('true', '1', 't'),
+    'path': os.getenv('INTERACTION_LOG_PATH', 'data/interactions.sqlite'),
+    'batch_size': 100,  # запись пачкой по достижении этого размера
+    'flush_interval': 2.0,  # или не реже чем раз в N секунд
+    'queue_size': 10000,  # размер очереди; при переполнении применяется drop_policy
+    'drop_policy': 'drop_oldest',  # drop_oldest | drop_newest
+    'max_bytes': 100 * 1024 * 1024,  # ротация файла по размеру
+    'backup_count': 5,  # количество хранимых ротированных файлов
+}
@@ -0,0 +1,176 @@
+import re
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken устанавливается вместе с langchain-openai
+    tiktoken = None
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Заголовок каждого чанка в контексте (формат сохранен прежним)
+CHUNK_HEADER = "Релевантность: {score:.2f}\n"
+CHUNK_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Файл кодировки скачивается при первом использовании; без сети используем оценку
+        logger.warning(f"Не удалось загрузить кодировку tiktoken для {model}: {e}. Используется оценка по символам.")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Считает токены локальным токенизатором (tiktoken).
+    Без tiktoken используется грубая оценка: ~4 символа на токен.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PackedContext(BaseModel):
+    """Контекст, упакованный в бюджет токенов, и статистика упаковки."""
+    text: Optional[str] = None
+    tokens: int = 0
+    max_tokens: int = 0
+    chunks_total: int = 0
+    chunks_used: int = 0
+    chunks_trimmed: int = 0
+    chunks_dropped_duplicate: int = 0
+    chunks_dropped_budget: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.tokens}/{self.max_tokens} tokens, {self.chunks_used}/{self.chunks_total} chunks used "
+            f"({self.chunks_trimmed} trimmed, {self.chunks_dropped_duplicate} near-duplicates, "
+            f"{self.chunks_dropped_budget} over budget)"
+        )
+
+
+def _trim_to_budget(content: str, budget: int, query_terms: Set[str], model: str) -> Optional[str]:
+    """
+    Экстрактивное сжатие чанка: выбирает предложения с наибольшим пересечением с запросом
+    (при равенстве - более ранние), пока они помещаются в бюджет. Порядок предложений сохраняется.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_RE.split(content) if sentence and sentence.strip()]
+    if len(sentences) < 2:
+        return None
+
+    def overlap(index: int) -> int:
+        return len(query_terms & set(_WORD_RE.findall(sentences[index].lower())))
+
+    ranked = sorted(range(len(sentences)), key=lambda index: (-overlap(index), index))
+    selected: List[int] = []
+    seen: Set[str] = set()
+    used = 0
+    for index in ranked:
+        if sentences[index] in seen:
+            continue
+        cost = count_tokens(sentences[index] + " ", model)
+        if used + cost > budget:
+            continue
+        selected.append(index)
+        seen.add(sentences[index])
+        used += cost
+
+    if not selected:
+        return None
+    return " ".join(sentences[index] for index in sorted(selected))
+
+
+def pack_context(
+    documents: List[Dict],
+    max_tokens: int,
+    query: Optional[str] = None,
+    duplicate_threshold: float = 0.8,
+    trim_sentences: bool = True,
+    min_chunk_tokens: int = 32,
+    model: str = "gpt-4o-mini",
+) -> PackedContext:
+    """
+    Жадно упаковывает чанки по убыванию score в бюджет max_tokens.
+
+    - Почти дубликаты уже выбранных чанков (Jaccard по словесным 3-граммам >= duplicate_threshold)
+      отбрасываются, как в MMR.
+    - Чанк, не помещающийся целиком, при trim_sentences сокращается до наиболее релевантных запросу
+      предложений, если остаток бюджета не меньше min_chunk_tokens.
+    """
+    packed = PackedContext(max_tokens=max_tokens, chunks_total=len(documents))
+    if not documents:
+        return packed
+
+    query_terms = set(_WORD_RE.findall(query.lower())) if query else set()
+    selected_shingles: List[Set[tuple]] = []
+    parts: List[str] = []
+    used = 0
+
+    for doc in sorted(documents, key=lambda x: x["score"], reverse=True):
+        content = doc["content"]
+        shingles = _shingles(content)
+        if any(_jaccard(shingles, other) >= duplicate_threshold for other in selected_shingles):
+            packed.chunks_dropped_duplicate += 1
+            continue
+
+        header = CHUNK_HEADER.format(score=doc["score"])
+        overhead = count_tokens(header, model) + (count_tokens(CHUNK_SEPARATOR, model) if parts else 0)
+        cost = overhead + count_tokens(content, model)
+
+        if used + cost > max_tokens:
+            remaining = max_tokens - used - overhead
+            trimmed = None
+            if trim_sentences and remaining >= min_chunk_tokens:
+                trimmed = _trim_to_budget(content, remaining, query_terms, model)
+            if trimmed is None:
+                packed.chunks_dropped_budget += 1
+                continue
+            content = trimmed
+            cost = overhead + count_tokens(content, model)
+            if used + cost > max_tokens:
+                packed.chunks_dropped_budget += 1
+                continue
+            packed.chunks_trimmed += 1
+
+        parts.append(header + content)
+        selected_shingles.append(shingles)
+        used += cost
+
+    packed.text = CHUNK_SEPARATOR.join(parts) if parts else None
+    packed.tokens = count_tokens(packed.text, model) if packed.text else 0
+    packed.chunks_used = len(parts)
+    return packed
+
+
+__all__ = ["PackedContext", "pack_context", "count_tokens"]
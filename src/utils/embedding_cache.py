@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import logging
+from threading import Lock
+from typing import Optional
+
+import numpy as np
+
+from .lru_cache import LRUCache, normalize_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов запросов: LRU в памяти процесса + SQLite на диске,
+    чтобы кэш переживал перезапуски бота.
+
+    Векторы хранятся как float32. Ключ - модель эмбеддингов и нормализованный текст запроса.
+    """
+    def __init__(self, path: str, model: str, memory_size: int = 2048):
+        self.path = path
+        self.model = model
+        self._memory = LRUCache(maxsize=memory_size)
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._disabled = False
+        self.disk_hits = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """
+        Соединение текущего процесса. Открывается лениво: соединение SQLite нельзя
+        переносить через fork, поэтому рабочие процессы открывают собственное.
+        """
+        if self._pid == os.getpid():
+            return self._conn
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._conn = None
+        if self._disabled:
+            return None
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            logger.warning(f"Дисковый кэш эмбеддингов недоступен ({self.path}): {e}. Используется только кэш в памяти.")
+            self._disabled = True
+        return self._conn
+
+    def get_cached(self, query: str) -> Optional[np.ndarray]:
+        """Возвращает вектор только из кэша в памяти (без обращения к диску)."""
+        return self._memory.get(normalize_cache_key(query))
+
+    def load(self, query: str) -> Optional[np.ndarray]:
+        """Возвращает вектор из памяти или с диска. Обращение к диску блокирующее."""
+        key = normalize_cache_key(query)
+        vector = self._memory.get(key)
+        if vector is not None:
+            return vector
+        conn = self._connection()
+        if conn is None:
+            return None
+
+        with self._lock:
+            row = conn.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND query = ?", (self.model, key)
+            ).fetchone()
+        if row is None:
+            return None
+
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        self._memory.set(key, vector)
+        self.disk_hits += 1
+        return vector
+
+    def store(self, query: str, vector) -> np.ndarray:
+        """Сохраняет вектор в память и на диск. Возвращает вектор в виде float32 массива."""
+        key = normalize_cache_key(query)
+        array = np.asarray(vector, dtype=np.float32)
+        self._memory.set(key, array)
+        conn = self._connection()
+        if conn is not None:
+            try:
+                with self._lock:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (model, query, vector) VALUES (?, ?, ?)",
+                        (self.model, key, array.tobytes())
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось сохранить эмбеддинг в дисковый кэш: {e}")
+        return array
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+
+__all__ = ["EmbeddingCache"]
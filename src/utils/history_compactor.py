@@ -0,0 +1,195 @@
+"""
+Компактная история диалога для промптов.
+
+Последние сообщения попадают в промпт дословно, пока укладываются в бюджет токенов.
+Более старые сообщения (не поместившиеся в бюджет или вытесненные из кольцевого буфера
+MemoryManager) сворачиваются в краткое резюме пользователя. Резюме обновляется в фоне
+и не задерживает ответ: до его обновления в промпт идет предыдущая версия.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .context_packer import count_tokens
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# summarize(предыдущее резюме, новые строки диалога) -> новое резюме
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+SUMMARY_PREFIX = "Summary of earlier conversation: "
+TRUNCATION_MARK = " …"
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a support conversation between a user and an assistant. "
+    "Update the existing summary with the new messages. Keep facts the assistant may need later: "
+    "the user's problem, details they provided, questions already asked and answers already given. "
+    "Write in English, third person, no more than {max_words} words. Return only the summary."
+)
+
+
+def make_openai_summarizer(client, model: str, max_tokens: int) -> Summarizer:
+    """Резюмирование через Chat Completions API."""
+    instructions = SUMMARY_INSTRUCTIONS.format(max_words=max(20, int(max_tokens * 0.7)))
+
+    async def summarize(previous: str, new_lines: str) -> str:
+        response = await client.chat.completions.create(
+            model=model,
+            temperature=0,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": f"Existing summary:\n{previous or '(none)'}\n\nNew messages:\n{new_lines}"},
+            ],
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    return summarize
+
+
+class _SummaryState:
+    __slots__ = ("summary", "tokens", "upto", "queued_upto", "pending", "task")
+
+    def __init__(self):
+        self.summary = ""
+        self.tokens = 0
+        self.upto = 0.0  # время создания последнего свернутого сообщения
+        self.queued_upto = 0.0  # время создания последнего сообщения в очереди на сворачивание
+        self.pending: List[Tuple[float, str]] = []
+        self.task: Optional[asyncio.Task] = None
+
+
+class HistoryCompactor:
+    """
+    Рендерит историю пользователя в пределах бюджета токенов и ведет резюме старых сообщений.
+
+    Сообщения, не попавшие в окно render (бюджет промпта минус резюме), и сообщения,
+    вытесненные из буфера MemoryManager, сворачиваются в резюме. Поэтому каждое сообщение
+    попадает в промпт дословно или через резюме; промпт с большим бюджетом может получить
+    часть сообщений и так, и так.
+    """
+    def __init__(self, summarize: Summarizer, summary_tokens: int = 200,
+                 model: str = "gpt-4o-mini", max_users: int = 10000):
+        self._summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.model = model
+        self._states = LRUCache(maxsize=max_users)
+        self.summaries = 0
+        self.failures = 0
+
+    def attach(self, memory_manager) -> None:
+        """Подписывается на сообщения, вытесняемые из буфера MemoryManager, и на удаление истории пользователя."""
+        memory_manager.on_evict = self._on_evict
+        memory_manager.on_forget = self.forget
+
+    def forget(self, user_id: int) -> None:
+        """История пользователя удалена (очищена или вытеснена): резюме к ней больше не относится."""
+        self._states.pop(user_id, None)
+
+    def _state(self, user_id: int, create: bool) -> Optional[_SummaryState]:
+        state = self._states.get(user_id)
+        if state is None and create:
+            state = _SummaryState()
+            self._states.set(user_id, state)
+        return state
+
+    def _tokens(self, record) -> int:
+        if record.tokens is None:
+            record.tokens = count_tokens(record.line, self.model) + 1  # + перевод строки
+        return record.tokens
+
+    def _window(self, records: List[Any], budget: int) -> int:
+        """Количество последних сообщений, которые помещаются в бюджет дословно."""
+        used = 0
+        count = 0
+        for record in reversed(records):
+            used += self._tokens(record)
+            if used > budget:
+                break
+            count += 1
+        return count
+
+    def _truncate(self, record, budget: int) -> str:
+        tokens = self._tokens(record)
+        chars = max(1, int(len(record.line) * budget / tokens) - len(TRUNCATION_MARK))
+        return record.line[:chars] + TRUNCATION_MARK
+
+    def render(self, memory_manager, user_id: int, budget: int) -> str:
+        """История пользователя для промпта: резюме старых сообщений и последние сообщения дословно."""
+        records = memory_manager.get_history(user_id)
+        state = self._state(user_id, create=False)
+        summary = state.summary if state else ""
+        turns_budget = max(budget - (state.tokens if state else 0), budget // 2)
+
+        window = self._window(records, turns_budget)
+        if window:
+            lines = [record.line for record in records[len(records) - window:]]
+        elif records:
+            # Последнее сообщение длиннее всего бюджета
+            lines = [self._truncate(records[-1], turns_budget)]
+        else:
+            lines = []
+
+        self._fold_outside_window(user_id, records, window, state)
+        if summary:
+            lines.insert(0, SUMMARY_PREFIX + summary)
+        return "\n".join(lines)
+
+    def _fold_outside_window(self, user_id: int, records: List[Any], window: int,
+                             state: Optional[_SummaryState]) -> None:
+        # Сворачиваем ровно то, что не показано дословно (последнее сообщение показано хотя бы частично)
+        older = records[:len(records) - max(window, 1)]
+        queued_upto = state.queued_upto if state else 0.0
+        new = [record for record in older if record.created > queued_upto]
+        if new:
+            self._queue(user_id, new)
+
+    def _on_evict(self, user_id: int, record) -> None:
+        state = self._state(user_id, create=False)
+        if state is None or record.created > state.queued_upto:
+            self._queue(user_id, [record])
+
+    def _queue(self, user_id: int, records: List[Any]) -> None:
+        state = self._state(user_id, create=True)
+        for record in records:
+            if record.created > state.queued_upto:
+                state.pending.append((record.created, record.line))
+                state.queued_upto = record.created
+        if state.pending and (state.task is None or state.task.done()):
+            try:
+                state.task = asyncio.get_running_loop().create_task(self._fold(user_id, state))
+            except RuntimeError:
+                # Нет цикла событий (например, загрузка истории вне обработчика): свернем при следующем вызове
+                pass
+
+    async def _fold(self, user_id: int, state: _SummaryState) -> None:
+        while state.pending:
+            batch, state.pending = state.pending, []
+            started = time.monotonic()
+            try:
+                summary = await self._summarize(state.summary, "\n".join(line for _, line in batch))
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"History summary for user {user_id} failed: {type(e).__name__} - {e}")
+                state.pending = batch + state.pending
+                return
+            if summary:
+                state.summary = summary
+                state.tokens = count_tokens(SUMMARY_PREFIX + summary, self.model) + 1
+            state.upto = max(state.upto, batch[-1][0])
+            self.summaries += 1
+            logger.info(f"History summary for user {user_id} updated with {len(batch)} messages "
+                        f"({state.tokens} tokens, {time.monotonic() - started:.2f}s).")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._states),
+            "summaries": self.summaries,
+            "failures": self.failures,
+        }
+
+
+__all__ = ["HistoryCompactor", "make_openai_summarizer", "Summarizer"]
@@ -0,0 +1,166 @@
+"""
+Ленивая загрузка изображений из сообщений Telegram.
+
+Изображение скачивается только тогда, когда оно действительно нужно (AnswerAgent или
+описание Vision моделью). Выбирается наименьший PhotoSize, достаточный для бюджета
+пикселей; если установлен Pillow, изображение дополнительно уменьшается до бюджета и
+пережимается в JPEG. Закодированные изображения и их описания кэшируются по
+file_unique_id, поэтому повторно отправленный скриншот не скачивается заново.
+"""
+
+import io
+import base64
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Sequence
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не обязателен: без него изображение отправляется как есть
+    Image = None
+
+
+def select_photo_size(photos: Sequence[Any], max_pixels: int) -> Any:
+    """
+    Наименьший PhotoSize, у которого не меньше max_pixels пикселей (его можно только
+    уменьшить без потери деталей). Если все варианты меньше бюджета, берется самый большой.
+    """
+    ordered = sorted(photos, key=lambda photo: photo.width * photo.height)
+    for photo in ordered:
+        if photo.width * photo.height >= max_pixels:
+            return photo
+    return ordered[-1]
+
+
+class ImagePipeline:
+    """Загрузка, сжатие и кэширование изображений по file_unique_id."""
+    def __init__(self, max_pixels: int = 1_000_000, jpeg_quality: int = 85, cache_size: int = 256):
+        self.max_pixels = max_pixels
+        self.jpeg_quality = jpeg_quality
+        self._images = LRUCache(maxsize=cache_size)
+        self._descriptions = LRUCache(maxsize=cache_size)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        self.encoded_bytes = 0
+
+    def _recompress(self, data: bytearray, photo: Any) -> bytes:
+        """Уменьшает изображение до бюджета пикселей и пережимает в JPEG (если доступен Pillow)."""
+        if Image is None:
+            return bytes(data)
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                pixels = image.width * image.height
+                if pixels > self.max_pixels:
+                    scale = (self.max_pixels / pixels) ** 0.5
+                    image.thumbnail((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                output = io.BytesIO()
+                image.save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        except Exception as e:
+            logger.warning(f"Не удалось пережать изображение {photo.file_unique_id}: {e}. Используется оригинал.")
+            return bytes(data)
+        # Пережатое изображение может оказаться больше исходного JPEG от Telegram
+        return output.getvalue() if output.tell() < len(data) else bytes(data)
+
+    async def _load(self, photo: Any) -> str:
+        file = await photo.get_file()
+        data = await file.download_as_bytearray()
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        encoded = base64.b64encode(await asyncio.to_thread(self._recompress, data, photo)).decode("ascii")
+        self.encoded_bytes += len(encoded)
+        logger.info(f"Image {photo.file_unique_id} ({photo.width}x{photo.height}) loaded: "
+                    f"{len(data)} bytes downloaded, {len(encoded)} bytes base64.")
+        return encoded
+
+    async def get_base64(self, photos: Sequence[Any]) -> str:
+        """Base64 (JPEG) для сообщения с фотографией. Одновременные запросы одного файла скачивают его один раз."""
+        photo = select_photo_size(photos, self.max_pixels)
+        key = photo.file_unique_id
+        cached = self._images.get(key)
+        if cached is not None:
+            return cached
+
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Отменена загрузка, начатая другим запросом (а не этот запрос): загружаем сами
+                cached = self._images.get(key)
+                if cached is not None:
+                    return cached
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            encoded = await self._load(photo)
+            self._images.set(key, encoded)
+            future.set_result(encoded)
+            return encoded
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано вызывающему; ожидающих может не быть
+            future.exception()
+            raise
+        finally:
+            # Загрузка отменена (CancelledError): ожидающие не должны зависнуть
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def cache_key(photos: Sequence[Any]) -> str:
+        """Ключ изображения, не зависящий от выбранного размера (самый большой вариант)."""
+        return max(photos, key=lambda photo: photo.width * photo.height).file_unique_id
+
+    def get_description(self, photos: Sequence[Any]) -> Optional[str]:
+        return self._descriptions.get(self.cache_key(photos))
+
+    def store_description(self, photos: Sequence[Any], description: str) -> None:
+        self._descriptions.set(self.cache_key(photos), description)
+
+    def stats(self) -> Dict[str, Any]:
+        images = self._images.stats()
+        descriptions = self._descriptions.stats()
+        return {
+            "images": images["size"],
+            "image_hit_rate": images["hit_rate"],
+            "descriptions": descriptions["size"],
+            "description_hit_rate": descriptions["hit_rate"],
+            "downloads": self.downloads,
+            "downloaded_kb": round(self.downloaded_bytes / 1024, 1),
+            "encoded_kb": round(self.encoded_bytes / 1024, 1),
+            "pillow": Image is not None,
+        }
+
+
+class LazyImage:
+    """Изображение сообщения, которое скачивается при первом обращении к base64()."""
+    __slots__ = ("photos", "pipeline", "_encoded")
+
+    def __init__(self, photos: Sequence[Any], pipeline: ImagePipeline):
+        self.photos = tuple(photos)
+        self.pipeline = pipeline
+        self._encoded: Optional[str] = None
+
+    @property
+    def file_unique_id(self) -> str:
+        return ImagePipeline.cache_key(self.photos)
+
+    async def base64(self) -> str:
+        if self._encoded is None:
+            self._encoded = await self.pipeline.get_base64(self.photos)
+        return self._encoded
+
+
+__all__ = ["ImagePipeline", "LazyImage", "select_photo_size"]
@@ -0,0 +1,335 @@
+"""
+Потоковая инкрементальная загрузка базы знаний из CSV в векторное хранилище.
+
+CSV читается порциями, строки разбиваются на чанки с настройками TEXT_SPLITTER_SETTINGS,
+эмбеддинги считаются большими конкурентными батчами с повторами при rate limit.
+В существующее хранилище добавляются только новые чанки (дедупликация по хэшу содержимого),
+чанки измененных строк заменяются. Один чанк может использоваться несколькими строками:
+ключи строк хранятся в metadata["row_keys"], и чанк удаляется, только когда на него
+не ссылается ни одна строка.
+
+Запуск (из каталога src):
+    python -m utils.ingest
+    python -m utils.ingest --csv data/new_tickets.csv
+    python -m utils.ingest --rebuild
+"""
+
+import os
+import csv
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import openai
+from openai import AsyncOpenAI
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .config import (
+    EMBEDDING_MODEL, VECTOR_STORE_PATH, CSV_PATH, CSV_SETTINGS,
+    TEXT_SPLITTER_SETTINGS, INGEST_SETTINGS, RAG_INDEX_SETTINGS, VectorizationError
+)
+from .lexical_index import build_from_faiss_store
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых запрос эмбеддингов имеет смысл повторить
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def row_key(row: Dict[str, str]) -> Optional[str]:
+    """Идентификатор строки CSV: отправитель + дата + сообщение, на которое дан ответ."""
+    parts = [(row.get(name) or "").strip() for name in ("Sender_ID", "Date", "Reply_To_Message_ID")]
+    if not parts[0] or not parts[1]:
+        return None
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def row_to_text(row: Dict[str, str]) -> str:
+    """Текст документа: вопрос пользователя (если есть) и ответ поддержки."""
+    answer = (row.get("Text") or "").strip()
+    question = (row.get("Question") or "").strip()
+    if question and answer:
+        return f"Вопрос: {question}\nОтвет: {answer}"
+    return answer
+
+
+def iter_csv_chunks(csv_path: str, rows_per_chunk: int) -> Iterator[List[Dict[str, str]]]:
+    """Читает CSV потоково и отдает строки порциями, не загружая файл целиком."""
+    fieldnames = CSV_SETTINGS['fieldnames']
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(
+            f,
+            fieldnames=fieldnames,
+            delimiter=CSV_SETTINGS['delimiter'],
+            quotechar=CSV_SETTINGS['quotechar']
+        )
+        chunk: List[Dict[str, str]] = []
+        for row in reader:
+            # Пропускаем строку заголовка, если она есть в файле
+            if all((row.get(name) or "") == name for name in fieldnames):
+                continue
+            chunk.append(row)
+            if len(chunk) >= rows_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class EmbeddingBatcher:
+    """Конкурентные батчи эмбеддингов с экспоненциальной задержкой при rate limit."""
+    def __init__(self, client: AsyncOpenAI, model: str = EMBEDDING_MODEL,
+                 batch_size: int = INGEST_SETTINGS['embedding_batch_size'],
+                 concurrency: int = INGEST_SETTINGS['embedding_concurrency'],
+                 max_retries: int = INGEST_SETTINGS['max_retries'],
+                 initial_backoff: float = INGEST_SETTINGS['initial_backoff']):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.requests = 0
+        self.retries = 0
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        value = response.headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        backoff = self.initial_backoff
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.requests += 1
+                    response = await self.client.embeddings.create(model=self.model, input=texts)
+                    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise VectorizationError(f"Не удалось получить эмбеддинги после {attempt + 1} попыток: {e}")
+                    delay = self._retry_after(e) or backoff * (1 + random.random() * 0.25)
+                    self.retries += 1
+                    logger.warning(f"{type(e).__name__} при запросе эмбеддингов, повтор через {delay:.1f} с")
+                    await asyncio.sleep(delay)
+                    backoff = min(backoff * 2, 60.0)
+        raise VectorizationError("Не удалось получить эмбеддинги")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+
+class KnowledgeBaseIngestor:
+    """Инкрементальная загрузка CSV в хранилище langchain FAISS."""
+    def __init__(self, store_path: str = VECTOR_STORE_PATH, rebuild: bool = False,
+                 batcher: Optional[EmbeddingBatcher] = None):
+        self.store_path = store_path
+        self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        self.batcher = batcher or EmbeddingBatcher(AsyncOpenAI(max_retries=0))
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=TEXT_SPLITTER_SETTINGS['chunk_size'],
+            chunk_overlap=TEXT_SPLITTER_SETTINGS['chunk_overlap']
+        )
+        self.store: Optional[FAISS] = None
+        # Хэш содержимого -> id документа, ключ строки -> id ее чанков, id документа -> число ссылающихся строк
+        self._hashes: Dict[str, str] = {}
+        self._rows: Dict[str, Set[str]] = {}
+        self._refs: Dict[str, int] = {}
+        self.stats = {"rows": 0, "chunks_added": 0, "chunks_skipped": 0, "chunks_removed": 0}
+
+        if not rebuild and os.path.exists(os.path.join(store_path, "index.faiss")):
+            self._load_existing()
+
+    def _load_existing(self) -> None:
+        self.store = FAISS.load_local(self.store_path, self.embeddings, allow_dangerous_deserialization=True)
+        for doc_id in self.store.index_to_docstore_id.values():
+            doc = self.store.docstore.search(doc_id)
+            if not hasattr(doc, "page_content"):
+                continue
+            self._hashes[doc.metadata.get("content_hash") or content_hash(doc.page_content)] = doc_id
+            keys = doc.metadata.get("row_keys")
+            if keys is None:
+                # Хранилища до появления row_keys: известна только первая строка
+                keys = [doc.metadata["row_key"]] if doc.metadata.get("row_key") else []
+            for key in keys:
+                self._rows.setdefault(key, set()).add(doc_id)
+            # Чанки строк без ключа нельзя заменить, поэтому они закреплены навсегда
+            pinned = doc.metadata.get("pinned", not keys)
+            doc.metadata["row_keys"] = list(keys)
+            doc.metadata["pinned"] = pinned
+            self._refs[doc_id] = len(keys) + (1 if pinned else 0)
+        logger.info(f"Загружено существующее хранилище: {len(self._hashes)} чанков")
+
+    def _plan_rows(self, rows: List[Dict[str, str]]) -> Tuple[List[str], List[dict], List[str]]:
+        """Определяет новые чанки и документы, на которые больше не ссылается ни одна строка."""
+        texts: List[str] = []
+        metadatas: List[dict] = []
+        released: Set[str] = set()
+        planned: Dict[str, dict] = {}
+
+        for row in rows:
+            self.stats["rows"] += 1
+            text = row_to_text(row)
+            if not text:
+                continue
+            key = row_key(row)
+            chunks = {content_hash(chunk): chunk for chunk in self.splitter.split_text(text)}
+            doc_ids = {self._hashes.get(chunk_hash, chunk_hash) for chunk_hash in chunks}
+
+            if key and self._rows.get(key) == doc_ids:
+                self.stats["chunks_skipped"] += len(chunks)
+                continue
+            if key:
+                # Строка изменилась: снимаем ее ссылки со старых чанков
+                for doc_id in self._rows.pop(key, set()):
+                    if self._release(doc_id, key):
+                        released.add(doc_id)
+
+            for chunk_hash, chunk in chunks.items():
+                doc_id = self._hashes.get(chunk_hash, chunk_hash)
+                metadata = planned.get(chunk_hash)
+                if metadata is None and chunk_hash in self._hashes:
+                    metadata = self._metadata_of(doc_id)
+                    released.discard(doc_id)
+                if metadata is not None:
+                    self.stats["chunks_skipped"] += 1
+                else:
+                    metadata = planned[chunk_hash] = {
+                        "content_hash": chunk_hash,
+                        "row_key": key,
+                        "row_keys": [],
+                        "sender_name": row.get("Sender_Name"),
+                        "date": row.get("Date"),
+                    }
+                    texts.append(chunk)
+                    metadatas.append(metadata)
+                self._acquire(doc_id, key, metadata)
+            if key:
+                self._rows[key] = doc_ids
+        return texts, metadatas, list(released)
+
+    def _acquire(self, doc_id: str, key: Optional[str], metadata: Optional[dict]) -> None:
+        self._refs[doc_id] = self._refs.get(doc_id, 0) + 1
+        if metadata is None:
+            return
+        if key is None:
+            metadata["pinned"] = True
+        elif key not in metadata.setdefault("row_keys", []):
+            metadata["row_keys"].append(key)
+
+    def _release(self, doc_id: str, key: str) -> bool:
+        """Снимает ссылку строки key с документа. True, если на документ больше никто не ссылается."""
+        self._refs[doc_id] = self._refs.get(doc_id, 1) - 1
+        metadata = self._metadata_of(doc_id)
+        if metadata is not None and key in metadata.get("row_keys", []):
+            metadata["row_keys"].remove(key)
+        return self._refs[doc_id] <= 0
+
+    def _metadata_of(self, doc_id: str) -> Optional[dict]:
+        # Метаданные изменяются на месте и сохраняются вместе с хранилищем
+        doc = self.store.docstore.search(doc_id) if self.store else None
+        return doc.metadata if hasattr(doc, "metadata") else None
+
+    def _hash_of(self, doc_id: str) -> Optional[str]:
+        doc = self.store.docstore.search(doc_id) if self.store else None
+        if not hasattr(doc, "page_content"):
+            return None
+        return doc.metadata.get("content_hash") or content_hash(doc.page_content)
+
+    async def ingest(self, csv_path: str = CSV_PATH, rows_per_chunk: int = INGEST_SETTINGS['rows_per_chunk']) -> dict:
+        """
+        Загружает CSV в хранилище и сохраняет его.
+
+        Raises:
+            VectorizationError: при ошибках чтения CSV, эмбеддинга или сохранения
+        """
+        started = time.perf_counter()
+        try:
+            for rows in iter_csv_chunks(csv_path, rows_per_chunk):
+                texts, metadatas, stale_ids = self._plan_rows(rows)
+
+                stale = {doc_id for doc_id in stale_ids if self._hash_of(doc_id) is not None}
+                if stale:
+                    self.store.delete(list(stale))
+                    for chunk_hash in [h for h, doc_id in self._hashes.items() if doc_id in stale]:
+                        del self._hashes[chunk_hash]
+                    for doc_id in stale:
+                        self._refs.pop(doc_id, None)
+                    self.stats["chunks_removed"] += len(stale)
+
+                if not texts:
+                    continue
+
+                vectors = await self.batcher.embed(texts)
+                ids = [metadata["content_hash"] for metadata in metadatas]
+                text_embeddings = list(zip(texts, vectors))
+                if self.store is None:
+                    self.store = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+                else:
+                    self.store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+                for doc_id, metadata in zip(ids, metadatas):
+                    self._hashes[metadata["content_hash"]] = doc_id
+                self.stats["chunks_added"] += len(texts)
+                logger.info(f"Обработано строк: {self.stats['rows']}, добавлено чанков: {self.stats['chunks_added']}")
+
+            if self.store is None:
+                raise VectorizationError(f"В {csv_path} нет данных для индексации")
+            self.store.save_local(self.store_path)
+            # BM25 индекс строится по тем же чанкам в порядке позиций FAISS
+            build_from_faiss_store(self.store).save(self.store_path)
+        except VectorizationError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке базы знаний: {str(e)}")
+            raise VectorizationError(f"Ошибка загрузки базы знаний: {str(e)}")
+
+        self.stats["embedding_requests"] = self.batcher.requests
+        self.stats["embedding_retries"] = self.batcher.retries
+        self.stats["seconds"] = round(time.perf_counter() - started, 1)
+        logger.info(f"Хранилище сохранено в {self.store_path}: {self.stats}")
+        if RAG_INDEX_SETTINGS['type'] != "flat":
+            logger.info(f"Перестройте индекс {RAG_INDEX_SETTINGS['type']}: python -m utils.build_index")
+        return self.stats
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Инкрементальная загрузка CSV в векторное хранилище")
+    parser.add_argument("--csv", default=CSV_PATH, help="Путь к CSV с ответами поддержки")
+    parser.add_argument("--store", default=VECTOR_STORE_PATH, help="Путь к векторному хранилищу")
+    parser.add_argument("--rebuild", action="store_true", help="Построить хранилище заново, игнорируя существующее")
+    parser.add_argument("--batch-size", type=int, default=INGEST_SETTINGS['embedding_batch_size'])
+    parser.add_argument("--concurrency", type=int, default=INGEST_SETTINGS['embedding_concurrency'])
+    args = parser.parse_args()
+
+    batcher = EmbeddingBatcher(AsyncOpenAI(max_retries=0), batch_size=args.batch_size, concurrency=args.concurrency)
+    ingestor = KnowledgeBaseIngestor(args.store, rebuild=args.rebuild, batcher=batcher)
+    asyncio.run(ingestor.ingest(args.csv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Асинхронная запись журнала взаимодействий (InteractionLog) в SQLite.
+
+log() только кладет запись в ограниченную очередь. Фоновая задача собирает пачки
+(по размеру или по времени) и записывает их в отдельном потоке. Финальные промпты и
+RAG-контексты хранятся один раз в таблице blobs по sha1, строки interactions ссылаются
+на них по хэшу. Файл ротируется при превышении max_bytes; каждый файл самодостаточен.
+В многопроцессном режиме каждый рабочий процесс пишет в собственный файл (use_shard),
+поэтому ротация одного процесса не затрагивает открытые соединения других.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from .config import INTERACTION_LOG_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ("drop_newest", "drop_oldest")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, content TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS interactions ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, user_id INTEGER NOT NULL, "
+    "matched_rule_id TEXT, action TEXT NOT NULL, question TEXT, answer TEXT, "
+    "prompt_hash TEXT, rag_hashes TEXT)",
+    "CREATE INDEX IF NOT EXISTS interactions_user ON interactions (user_id, timestamp)",
+)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class InteractionLogSink:
+    """
+    Пакетная запись журнала взаимодействий.
+
+    Если запись не успевает за потоком событий и очередь заполнена, применяется
+    drop_policy: drop_newest отбрасывает новую запись, drop_oldest - самую старую в очереди.
+    """
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 2.0,
+                 queue_size: int = 10000, drop_policy: str = "drop_oldest",
+                 max_bytes: int = 100 * 1024 * 1024, backup_count: int = 5):
+        if drop_policy not in DROP_POLICIES:
+            logger.warning(f"Unknown drop policy '{drop_policy}', using 'drop_oldest'.")
+            drop_policy = "drop_oldest"
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._known_hashes: Set[str] = set()
+        self._pid: Optional[int] = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.rotations = 0
+
+    def use_shard(self, shard: int) -> None:
+        """Переключает запись на файл рабочего процесса: interactions.sqlite -> interactions.w<shard>.sqlite."""
+        base, ext = os.path.splitext(self.path)
+        self.path = f"{base}.w{shard}{ext}"
+
+    # ----- очередь (цикл событий) -----
+
+    def _ensure_started(self) -> None:
+        # Очередь и задача создаются в процессе и цикле событий, где пишется журнал
+        if self._pid == os.getpid() and self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._conn = None
+        self._known_hashes = set()
+        self._task = asyncio.get_running_loop().create_task(self._writer())
+        self._pid = os.getpid()
+
+    def log(self, entry: Any) -> bool:
+        """Ставит запись в очередь. Возвращает False, если запись отброшена."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.drop_policy == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self._queue.put_nowait(entry)
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Interaction log queue is full ({self.queue_size}). {self.dropped} entries dropped so far.")
+            return self.drop_policy == "drop_oldest"
+
+    async def _writer(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} interaction log entries: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def close(self) -> None:
+        """Дописывает очередь и закрывает файл."""
+        if self._task is None or self._pid != os.getpid():
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info(f"Interaction log closed ({self.written} entries written, {self.dropped} dropped).")
+
+    # ----- запись (поток) -----
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+            self._known_hashes = set()
+        return self._conn
+
+    def _rotate_if_needed(self) -> None:
+        if not self.max_bytes or not os.path.exists(self.path):
+            return
+        wal_path = self.path + "-wal"
+        size = os.path.getsize(self.path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+        if size < self.max_bytes:
+            return
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+        base, ext = os.path.splitext(self.path)
+        rotated = f"{base}-{datetime.now().strftime('%Y%m%d%H%M%S%f')}{ext}"
+        os.replace(self.path, rotated)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        self.rotations += 1
+
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(base) + "-"
+        backups = sorted(name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith(ext))
+        for name in backups[:max(0, len(backups) - self.backup_count)]:
+            os.remove(os.path.join(directory, name))
+        logger.info(f"Interaction log rotated to {rotated}.")
+
+    def _blob(self, conn: sqlite3.Connection, text: Optional[str]) -> Optional[str]:
+        if text is None:
+            return None
+        digest = content_hash(text)
+        if digest not in self._known_hashes:
+            conn.execute("INSERT OR IGNORE INTO blobs (hash, content) VALUES (?, ?)", (digest, text))
+            self._known_hashes.add(digest)
+        return digest
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        self._rotate_if_needed()
+        conn = self._connect()
+        rows = []
+        try:
+            for entry in batch:
+                rag_hashes = [self._blob(conn, context) for context in entry.rag_contexts] if entry.rag_contexts else None
+                rows.append((
+                    entry.timestamp.isoformat(),
+                    entry.user_id,
+                    entry.matched_rule_id,
+                    entry.action,
+                    entry.question,
+                    entry.answer,
+                    self._blob(conn, entry.final_prompt),
+                    json.dumps(rag_hashes) if rag_hashes else None,
+                ))
+            conn.executemany(
+                "INSERT INTO interactions (timestamp, user_id, matched_rule_id, action, question, answer, "
+                "prompt_hash, rag_hashes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Хэши из откаченной транзакции могли не сохраниться
+            self._known_hashes = set()
+            raise
+        self.written += len(rows)
+        self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+        }
+
+
+def create_interaction_sink(settings: Dict[str, Any] = INTERACTION_LOG_SETTINGS) -> Optional[InteractionLogSink]:
+    if not settings.get('enabled'):
+        return None
+    return InteractionLogSink(
+        settings['path'],
+        batch_size=settings['batch_size'],
+        flush_interval=settings['flush_interval'],
+        queue_size=settings['queue_size'],
+        drop_policy=settings['drop_policy'],
+        max_bytes=settings['max_bytes'],
+        backup_count=settings['backup_count'],
+    )
+
+
+__all__ = ["InteractionLogSink", "create_interaction_sink", "content_hash"]
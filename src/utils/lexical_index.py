@@ -0,0 +1,201 @@
+"""
+BM25 инвертированный индекс по тем же чанкам, что и векторное хранилище.
+
+Документы нумеруются позициями в индексе FAISS, поэтому индекс подходит для всех типов
+векторных индексов (flat, ivfpq, hnsw, sq8). На диске хранится компактно:
+словарь терминов (JSON) и CSR-массивы постингов (сжатый npz).
+
+Перестроение для существующего хранилища (из каталога src):
+    python -m utils.lexical_index
+"""
+
+import os
+import re
+import json
+import logging
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import EMBEDDING_MODEL, VECTOR_STORE_PATH, VectorizationError
+
+logger = logging.getLogger(__name__)
+
+VOCAB_FILENAME = "bm25_vocab.json"
+POSTINGS_FILENAME = "bm25_index.npz"
+LEXICAL_FILES = [VOCAB_FILENAME, POSTINGS_FILENAME]
+
+# Токен вместе с внутренними разделителями: коды ошибок (ERR-1042), версии (v2.1.0), хэши (0x9f...)
+_TOKEN_RE = re.compile(r"\w+(?:[.\-:/]\w+)*", re.UNICODE)
+_PART_SPLIT_RE = re.compile(r"[.\-:/_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Токенизация для BM25: составные токены сохраняются целиком и дополнительно по частям."""
+    tokens: List[str] = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = [part for part in _PART_SPLIT_RE.split(token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def _is_exact_token(word: str) -> bool:
+    """
+    Токен, который эмбеддинг передает плохо: хэш, адрес или код ошибки (0x9f..., EQD4...,
+    ERR-1042, ERR1042). Числа ("100"), тикеры ("USDT") и короткие слова с цифрой ("web3", "ERC20")
+    к ним не относятся.
+    """
+    has_digit = any(char.isdigit() for char in word)
+    has_alpha = any(char.isalpha() for char in word)
+    if not (has_digit and has_alpha):
+        return False
+    return bool(_PART_SPLIT_RE.search(word)) or len(word) >= 6
+
+
+def exact_match_tokens(query: str, max_tokens: int) -> List[str]:
+    """
+    Точные токены короткого запроса (в нижнем регистре, как в индексе).
+    Пустой список - запрос длиннее max_tokens слов или точных токенов в нем нет.
+    """
+    words = _TOKEN_RE.findall(query)
+    if not words or len(words) > max_tokens:
+        return []
+    return [word.lower() for word in words if _is_exact_token(word)]
+
+
+def is_exact_match_query(query: str, max_tokens: int) -> bool:
+    """Короткий запрос с точными токенами, для которого достаточно лексического поиска без эмбеддинга."""
+    return bool(exact_match_tokens(query, max_tokens))
+
+
+class LexicalIndex:
+    """BM25 поиск по CSR-массивам постингов."""
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths.astype(np.float32)
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(doc_lengths)
+        self.avgdl = float(self.doc_lengths.mean()) if self.n_docs else 1.0
+        df = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "LexicalIndex":
+        vocab: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        doc_lengths: List[int] = []
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = vocab[term] = len(vocab)
+                    postings.append([])
+                postings[term_id].append((doc, tf))
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(items) for items in postings])
+        doc_ids = np.fromiter((doc for items in postings for doc, _ in items), dtype=np.int32, count=int(indptr[-1]))
+        tfs = np.fromiter((min(tf, 65535) for items in postings for _, tf in items), dtype=np.uint16, count=int(indptr[-1]))
+        return cls(vocab, indptr, doc_ids, tfs, np.array(doc_lengths, dtype=np.int32))
+
+    def save(self, store_path: str) -> None:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with open(os.path.join(store_path, VOCAB_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False, separators=(",", ":"))
+        np.savez_compressed(
+            os.path.join(store_path, POSTINGS_FILENAME),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths.astype(np.int32),
+        )
+        logger.info(f"BM25 индекс сохранен в {store_path}: {self.n_docs} документов, {len(self.vocab)} терминов")
+
+    @classmethod
+    def load(cls, store_path: str) -> Optional["LexicalIndex"]:
+        """Загружает индекс или возвращает None, если он еще не построен."""
+        vocab_path = os.path.join(store_path, VOCAB_FILENAME)
+        postings_path = os.path.join(store_path, POSTINGS_FILENAME)
+        if not (os.path.exists(vocab_path) and os.path.exists(postings_path)):
+            return None
+        with open(vocab_path, encoding="utf-8") as f:
+            terms = json.load(f)
+        with np.load(postings_path) as data:
+            return cls(
+                {term: term_id for term_id, term in enumerate(terms)},
+                data["indptr"], data["doc_ids"], data["tfs"], data["doc_lengths"]
+            )
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Возвращает до k пар (позиция документа, BM25 score) по убыванию score."""
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not term_ids or not self.n_docs:
+            return []
+
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.avgdl)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / norm
+
+        candidates = np.flatnonzero(scores)
+        if candidates.size == 0:
+            return []
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return [(int(position), float(scores[position])) for position in top]
+
+
+    def contains_all(self, position: int, terms: List[str]) -> bool:
+        """Все ли термины встречаются в документе (постинги отсортированы по позиции)."""
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                return False
+            docs = self.doc_ids[self.indptr[term_id]:self.indptr[term_id + 1]]
+            index = int(np.searchsorted(docs, position))
+            if index == len(docs) or docs[index] != position:
+                return False
+        return True
+
+
+def build_from_faiss_store(store) -> LexicalIndex:
+    """Строит BM25 индекс по документам langchain FAISS в порядке позиций индекса."""
+    texts = []
+    for position in range(store.index.ntotal):
+        doc = store.docstore.search(store.index_to_docstore_id[position])
+        texts.append(doc.page_content if hasattr(doc, "page_content") else "")
+    return LexicalIndex.build(texts)
+
+
+def main() -> None:
+    from langchain_community.vectorstores import FAISS
+    from langchain_openai import OpenAIEmbeddings
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Построение BM25 индекса по векторному хранилищу")
+    parser.add_argument("--store", default=VECTOR_STORE_PATH, help="Путь к flat-хранилищу")
+    args = parser.parse_args()
+
+    try:
+        store = FAISS.load_local(args.store, OpenAIEmbeddings(model=EMBEDDING_MODEL), allow_dangerous_deserialization=True)
+        build_from_faiss_store(store).save(args.store)
+    except Exception as e:
+        raise VectorizationError(f"Ошибка построения BM25 индекса: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,44 @@
 import logging
+from typing import Optional
 from src.bot_agents.models import InteractionLog
+from src.utils.interaction_sink import InteractionLogSink, create_interaction_sink
+from src.utils.logging_setup import log_payload
 
 logger = logging.getLogger(__name__)
 
 class Logger:
     """
     Utility class for logging user interactions.
-    Currently logs to console, but will be extended to write to a database.
+    Entries are persisted by an asynchronous batched sink (SQLite); the console only gets a one-line summary.
     """
+    def __init__(self, sink: Optional[InteractionLogSink] = None):
+        self.sink = sink if sink is not None else create_interaction_sink()
+
     async def log_interaction(self, log_data: InteractionLog):
         """
         Logs the details of a user interaction.
 
         Args:
             log_data: A Pydantic model containing the structured log data.
-        
-        TODO: E6 - Replace this with logic to write to a persistent database.
         """
         try:
-            # Pydantic's model_dump_json is a good way to get a serializable representation
-            log_str = log_data.model_dump_json(indent=2)
-            logger.info(f"Interaction logged:\n{log_str}")
+            logger.info(
+                "Interaction logged: user=%s rule=%s action=%s prompt_chars=%d rag_contexts=%d",
+                log_data.user_id, log_data.matched_rule_id, log_data.action,
+                len(log_data.final_prompt), len(log_data.rag_contexts or [])
+            )
+            log_payload(logger, "Interaction details:\n%s", lambda: log_data.model_dump_json(indent=2))
+            if self.sink:
+                self.sink.log(log_data)
         except Exception as e:
             logger.error(f"Failed to serialize or log interaction data: {e}", exc_info=True)
 
-__all__ = ["Logger"] 
\ No newline at end of file
+    async def close(self):
+        """Flushes queued entries to the sink."""
+        if self.sink:
+            await self.sink.close()
+
+    def stats(self):
+        return self.sink.stats() if self.sink else None
+
+__all__ = ["Logger"]
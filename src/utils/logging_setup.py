@@ -0,0 +1,182 @@
+"""
+Неблокирующее логирование.
+
+setup_logging() переносит обработчики корневого логгера (консоль, bot.log) за очередь:
+вызывающий код только кладет запись в очередь, а запись в поток/файл выполняет фоновый
+поток QueueListener. Большие данные (промпты, контексты RAG, JSON роутера) пишутся через
+log_payload() в отдельный канал "payload.*" на уровне DEBUG: с выборкой и ленивым
+форматированием, поэтому при выключенном канале они ничего не стоят.
+"""
+
+import os
+import time
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from typing import Any, Callable, Dict, List, Optional, Union
+
+PAYLOAD_LOGGER = "payload"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_payload_sample_rate = 1.0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler с ограниченной очередью. При переполнении записи INFO и DEBUG отбрасываются
+    и учитываются, а WARNING и выше передаются обработчикам напрямую (синхронно), чтобы
+    ошибки с трассировкой не терялись.
+    """
+    def __init__(self, log_queue: queue.Queue, handlers: Optional[List[logging.Handler]] = None):
+        super().__init__(log_queue)
+        self.handlers = handlers or []
+        self.dropped = 0
+        self.direct = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+            self.direct += 1
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает число записей логгера (token bucket: rate в секунду, запас burst).
+    Записи WARNING и выше не ограничиваются. Число пропущенных записей добавляется
+    к следующей прошедшей записи.
+    """
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            self.suppressed += 1
+            return False
+        self._tokens -= 1
+        if self.suppressed:
+            record.msg = f"{record.msg} [{self.suppressed} messages suppressed by rate limit]"
+            self.suppressed = 0
+        return True
+
+
+class _Lazy:
+    """Аргумент лога, который вычисляется только при форматировании записи."""
+    __slots__ = ("_fn",)
+
+    def __init__(self, fn: Callable[[], Any]):
+        self._fn = fn
+
+    def __str__(self) -> str:
+        return str(self._fn())
+
+
+def parse_rate_limits(raw: str) -> Dict[str, float]:
+    """'src.tools.rag_tools=5,src.bot.message_handler=20' -> {имя логгера: записей в секунду}."""
+    limits = {}
+    for item in raw.split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            try:
+                limits[name.strip()] = float(rate)
+            except ValueError:
+                logging.getLogger(__name__).warning(f"Invalid log rate limit '{item}'. Expected name=rate.")
+    return limits
+
+
+def log_payload(logger: logging.Logger, msg: str, *args: Union[Any, Callable[[], Any]]) -> None:
+    """
+    Пишет большие данные в канал payload.<имя логгера> на уровне DEBUG.
+    Аргументы-функции вызываются только если запись действительно будет выведена.
+    """
+    payload_logger = logging.getLogger(f"{PAYLOAD_LOGGER}.{logger.name}")
+    if not payload_logger.isEnabledFor(logging.DEBUG):
+        return
+    if _payload_sample_rate < 1.0 and random.random() >= _payload_sample_rate:
+        return
+    payload_logger.debug(msg, *(_Lazy(arg) if callable(arg) else arg for arg in args))
+
+
+def _start_listener(handlers: List[logging.Handler], queue_size: int) -> None:
+    global _listener
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Останавливает фоновый поток, дописав очередь."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(queue_mode: bool = True, queue_size: int = 10000, payloads: bool = False,
+                  payload_sample_rate: float = 1.0, rate_limits: Optional[Dict[str, float]] = None) -> None:
+    """
+    Настраивает логирование поверх уже созданных обработчиков корневого логгера.
+    Вызывается один раз, после импорта модулей, которые конфигурируют logging.
+    """
+    global _queue_handler, _payload_sample_rate
+    root = logging.getLogger()
+    _payload_sample_rate = payload_sample_rate
+
+    # Канал больших данных: по умолчанию выключен
+    payload_root = logging.getLogger(PAYLOAD_LOGGER)
+    payload_root.setLevel(logging.DEBUG if payloads else logging.INFO)
+    if payloads:
+        for handler in root.handlers:
+            if handler.level > logging.DEBUG:
+                handler.setLevel(logging.DEBUG)
+
+    for name, rate in (rate_limits or {}).items():
+        logging.getLogger(name).addFilter(RateLimitFilter(rate))
+
+    if not queue_mode or _queue_handler is not None:
+        return
+
+    handlers = [handler for handler in root.handlers if not isinstance(handler, logging.handlers.QueueHandler)]
+    _queue_handler = DroppingQueueHandler(queue.Queue(), handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    _start_listener(handlers, queue_size)
+    atexit.register(stop_logging)
+    # Поток слушателя не переживает fork: рабочие процессы запускают собственный
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=lambda: _start_listener(handlers, queue_size))
+    logging.getLogger(__name__).info(f"Queue-based logging enabled ({len(handlers)} handlers, queue size {queue_size}).")
+
+
+def logging_stats() -> Dict[str, Any]:
+    return {
+        "queue_mode": _queue_handler is not None,
+        "queued": _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        "dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "written_directly": _queue_handler.direct if _queue_handler is not None else 0,
+        "payload_sample_rate": _payload_sample_rate,
+    }
+
+
+__all__ = ["setup_logging", "stop_logging", "log_payload", "RateLimitFilter", "parse_rate_limits", "logging_stats"]
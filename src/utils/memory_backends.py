@@ -0,0 +1,219 @@
+"""
+Хранилища истории диалогов для MemoryManager.
+
+MemoryManager держит горячие данные в памяти процесса, а бэкенд сохраняет их между
+перезапусками. SQLiteMemoryBackend пишет асинхронно (write-behind): add_message только
+кладет операцию в буфер, фоновый поток записывает буфер пачками. История пользователя
+читается с диска лениво, при первом обращении к нему.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import MEMORY_SETTINGS, NUM_STORED_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# (role, text, created)
+StoredMessage = Tuple[str, str, float]
+
+
+class MemoryBackend(ABC):
+    """Интерфейс хранилища истории диалогов."""
+
+    @abstractmethod
+    def load(self, user_id: int, limit: int) -> List[StoredMessage]:
+        """Последние limit сообщений пользователя в хронологическом порядке."""
+
+    @abstractmethod
+    def append(self, user_id: int, role: str, text: str, created: float) -> None:
+        """Сохраняет сообщение пользователя."""
+
+    @abstractmethod
+    def clear(self, user_id: int) -> None:
+        """Удаляет историю пользователя."""
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """
+    История в SQLite (режим WAL). Несколько рабочих процессов могут использовать один файл.
+
+    Операции записи копятся в буфере и сохраняются фоновым потоком раз в flush_interval
+    секунд или по достижении batch_size операций. При записи у пользователя остаются
+    только последние max_history_length сообщений.
+    Соединение и поток создаются при первом использовании в текущем процессе, поэтому
+    бэкенд можно создать до fork.
+    """
+    def __init__(self, path: str, max_history_length: int = NUM_STORED_MESSAGES,
+                 flush_interval: float = 0.5, batch_size: int = 100):
+        self.path = path
+        self.max_history_length = max_history_length
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: List[Tuple] = []
+        self._pending_lock = threading.Lock()
+        # Запись пачки и чтение пользователя не пересекаются: прочитанные строки и буфер согласованы
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.loads = 0
+        self.written = 0
+        self.batches = 0
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+            "role TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, id)")
+        self._conn = conn
+        # После fork буфер и поток родителя недействительны
+        self._pending = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._writer_loop, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+        logger.info(f"SQLite memory backend opened: {self.path}")
+
+    def load(self, user_id: int, limit: int) -> List[StoredMessage]:
+        self._ensure_started()
+        self.loads += 1
+        with self._io_lock:
+            rows = self._conn.execute(
+                "SELECT role, text, created FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+            rows.reverse()
+            with self._pending_lock:
+                pending = [op for op in self._pending if op[1] == user_id]
+        # Накладываем еще не записанные операции
+        for op in pending:
+            if op[0] == "clear":
+                rows = []
+            else:
+                rows.append(op[2:])
+        return [tuple(row) for row in rows[-limit:]]
+
+    def _enqueue(self, op: Tuple) -> None:
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending.append(op)
+            size = len(self._pending)
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def append(self, user_id: int, role: str, text: str, created: float) -> None:
+        self._enqueue(("append", user_id, role, text, created))
+
+    def clear(self, user_id: int) -> None:
+        self._enqueue(("clear", user_id))
+
+    def _writer_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self) -> None:
+        """Записывает накопленные операции одной транзакцией."""
+        if self._conn is None:
+            return
+        with self._io_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(batch)} memory operations: {e}", exc_info=True)
+                with self._pending_lock:
+                    self._pending = batch + self._pending
+
+    def _write_batch(self, batch: List[Tuple]) -> None:
+        touched = set()
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            for op in batch:
+                if op[0] == "clear":
+                    conn.execute("DELETE FROM messages WHERE user_id = ?", (op[1],))
+                else:
+                    conn.execute(
+                        "INSERT INTO messages (user_id, role, text, created) VALUES (?, ?, ?, ?)", op[1:]
+                    )
+                touched.add(op[1])
+            for user_id in touched:
+                conn.execute(
+                    "DELETE FROM messages WHERE user_id = ? AND id NOT IN "
+                    "(SELECT id FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?)",
+                    (user_id, user_id, self.max_history_length)
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        self.written += len(batch)
+        self.batches += 1
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self._conn.close()
+        self._conn = None
+        self._pid = None
+        logger.info("SQLite memory backend closed.")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "backend": "sqlite",
+            "pending_writes": pending,
+            "written": self.written,
+            "batches": self.batches,
+            "disk_loads": self.loads,
+        }
+
+
+def create_memory_backend(settings: Dict[str, Any] = MEMORY_SETTINGS) -> Optional[MemoryBackend]:
+    """Создает бэкенд по настройкам (None - история только в памяти процесса)."""
+    backend = settings.get('backend', 'memory')
+    if backend == 'sqlite':
+        return SQLiteMemoryBackend(
+            settings['db_path'],
+            flush_interval=settings.get('flush_interval', 0.5),
+            batch_size=settings.get('batch_size', 100),
+        )
+    if backend != 'memory':
+        logger.warning(f"Unknown memory backend '{backend}'. Conversation history is kept in memory only.")
+    return None
@@ -1,47 +1,204 @@
-from typing import Dict, List, Optional
+import sys
+import time
+import asyncio
+from collections import OrderedDict, deque
 from datetime import datetime
-from .config import NUM_STORED_MESSAGES
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from .config import NUM_STORED_MESSAGES, MEMORY_SETTINGS
+from .memory_backends import MemoryBackend
+
+
+class MessageRecord:
+    """Компактная запись сообщения. Поддерживает доступ как к dict: msg['text'], msg.get('role')."""
+    __slots__ = ("role", "text", "created", "line", "tokens")
+
+    def __init__(self, role: str, text: str, created: float):
+        self.role = sys.intern(role)
+        self.text = text
+        self.created = created
+        # Строка для текстовой истории, рендерится один раз
+        self.line = f"{'User' if role == 'user' else 'Assistant'}: {text}"
+        self.tokens: Optional[int] = None  # длина line в токенах, считается при первом использовании
+
+    @property
+    def timestamp(self) -> str:
+        return datetime.fromtimestamp(self.created).isoformat()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in ("role", "text", "timestamp"):
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ("role", "text", "timestamp"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {'role': self.role, 'text': self.text, 'timestamp': self.timestamp}
+
+
+class _UserMemory:
+    __slots__ = ("messages", "text", "last_access")
+
+    def __init__(self, max_length: int, now: float):
+        self.messages: Deque[MessageRecord] = deque(maxlen=max_length)
+        self.text = ""
+        self.last_access = now
+
 
 class MemoryManager:
-    def __init__(self):
-        self._memory: Dict[int, List[dict]] = {}
-        self.max_history_length = NUM_STORED_MESSAGES  # Хранить последние 10 сообщений для каждого пользователя
+    """
+    История диалогов в памяти процесса.
+
+    Сообщения каждого пользователя хранятся в кольцевом буфере фиксированного размера.
+    Пользователи упорядочены по последнему обращению (LRU): неактивные дольше idle_ttl
+    секунд и самые старые сверх max_users вытесняются. Текстовая история обновляется
+    инкрементально при добавлении сообщения.
+
+    Если задан backend, история сохраняется в нем, а пользователь, которого нет в памяти,
+    загружается из хранилища вызовом load_user (в отдельном потоке) или, если он не был
+    вызван, при первом обращении.
+    """
+    def __init__(self, max_history_length: int = NUM_STORED_MESSAGES,
+                 max_users: Optional[int] = MEMORY_SETTINGS["max_users"],
+                 idle_ttl: Optional[float] = MEMORY_SETTINGS["idle_ttl"],
+                 backend: Optional[MemoryBackend] = None):
+        self._memory: "OrderedDict[int, _UserMemory]" = OrderedDict()
+        self.backend = backend
+        self.max_history_length = max_history_length  # Хранить последние N сообщений для каждого пользователя
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+        # Вызывается с (user_id, MessageRecord) для сообщения, вытесненного из буфера пользователя
+        self.on_evict: Optional[Callable[[int, MessageRecord], None]] = None
+        # Вызывается с user_id, когда история пользователя удалена: clear_history или вытеснение
+        # из памяти без backend (с backend история будет загружена заново)
+        self.on_forget: Optional[Callable[[int], None]] = None
+
+    def _touch(self, user_id: int, create: bool) -> Optional[_UserMemory]:
+        now = time.monotonic()
+        self._evict_idle(now)
+        user = self._memory.get(user_id)
+        if user is None:
+            if not create and not self.backend:
+                return None
+            # Обработчики заранее вызывают load_user; синхронное чтение - запасной путь
+            stored = self.backend.load(user_id, self.max_history_length) if self.backend else []
+            user = self._insert(user_id, stored, now)
+        else:
+            self._memory.move_to_end(user_id)
+        user.last_access = now
+        return user
+
+    def _insert(self, user_id: int, stored: List[Tuple[str, str, float]], now: float) -> _UserMemory:
+        # Пользователь без сохраненной истории тоже попадает в память: пустая запись служит
+        # отметкой "уже загружен", и следующие обращения не читают диск
+        user = self._memory[user_id] = _UserMemory(self.max_history_length, now)
+        if stored:
+            user.messages.extend(MessageRecord(role, text, created) for role, text, created in stored)
+            user.text = "\n".join(record.line for record in user.messages)
+        self._evict_capacity()
+        return user
+
+    async def load_user(self, user_id: int) -> None:
+        """
+        Загружает историю пользователя из backend в отдельном потоке. Вызывается в начале
+        обработки обновления, чтобы add_message и get_history не читали диск в event loop.
+        """
+        if not self.backend or user_id in self._memory:
+            return
+        stored = await asyncio.to_thread(self.backend.load, user_id, self.max_history_length)
+        # Пока шло чтение, другая задача могла создать запись через add_message
+        if user_id not in self._memory:
+            self._evict_idle(time.monotonic())
+            self._insert(user_id, stored, time.monotonic())
+
+    def _evict_idle(self, now: float) -> None:
+        if not self.idle_ttl:
+            return
+        while self._memory:
+            user_id, user = next(iter(self._memory.items()))
+            if now - user.last_access <= self.idle_ttl:
+                break
+            del self._memory[user_id]
+            self.evicted_idle += 1
+            self._forget_evicted(user_id)
+
+    def _evict_capacity(self) -> None:
+        if not self.max_users:
+            return
+        while len(self._memory) > self.max_users:
+            user_id, _ = self._memory.popitem(last=False)
+            self.evicted_capacity += 1
+            self._forget_evicted(user_id)
+
+    def _forget_evicted(self, user_id: int) -> None:
+        if self.on_forget and not self.backend:
+            self.on_forget(user_id)
 
     def add_message(self, user_id: int, role: str, text: str) -> None:
         """Добавляет новое сообщение в историю диалога."""
-        if user_id not in self._memory:
-            self._memory[user_id] = []
-        
-        message = {
-            'role': role,
-            'text': text,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        self._memory[user_id].append(message)
-        
-        # Ограничиваем историю последними N сообщениями
-        if len(self._memory[user_id]) > self.max_history_length:
-            self._memory[user_id] = self._memory[user_id][-self.max_history_length:]
-
-    def get_history(self, user_id: int) -> List[dict]:
+        user = self._touch(user_id, create=True)
+        record = MessageRecord(role, text, time.time())
+        messages = user.messages
+
+        if len(messages) == messages.maxlen:
+            # Самое старое сообщение выпадает из буфера: отрезаем его строку в начале текста
+            evicted = messages[0]
+            user.text = user.text[len(evicted.line) + 1:]
+            if self.on_evict:
+                self.on_evict(user_id, evicted)
+        messages.append(record)
+        user.text = f"{user.text}\n{record.line}" if user.text else record.line
+        if self.backend:
+            self.backend.append(user_id, record.role, record.text, record.created)
+
+    def get_history(self, user_id: int) -> List[MessageRecord]:
         """Возвращает историю диалога для пользователя."""
-        return self._memory.get(user_id, [])
+        user = self._touch(user_id, create=False)
+        return list(user.messages) if user else []
 
     def get_history_as_text(self, user_id: int) -> str:
         """Возвращает историю диалога в текстовом формате."""
-        history = self.get_history(user_id)
-        if not history:
-            return ""
-        
-        formatted_messages = []
-        for msg in history:
-            role = "User" if msg['role'] == 'user' else "Assistant"
-            formatted_messages.append(f"{role}: {msg['text']}")
-        
-        return "\n".join(formatted_messages)
+        user = self._touch(user_id, create=False)
+        return user.text if user else ""
 
     def clear_history(self, user_id: int) -> None:
         """Очищает историю диалога для пользователя."""
-        if user_id in self._memory:
-            del self._memory[user_id] 
\ No newline at end of file
+        self._memory.pop(user_id, None)
+        if self.backend:
+            self.backend.clear(user_id)
+        if self.on_forget:
+            self.on_forget(user_id)
+
+    def close(self) -> None:
+        """Сохраняет незаписанную историю и закрывает хранилище."""
+        if self.backend:
+            self.backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика использования памяти (размер в байтах оценочный)."""
+        self._evict_idle(time.monotonic())
+        messages = 0
+        text_bytes = 0
+        for user in self._memory.values():
+            messages += len(user.messages)
+            text_bytes += sys.getsizeof(user.text)
+            for record in user.messages:
+                text_bytes += sys.getsizeof(record.text) + sys.getsizeof(record.line)
+        approx_bytes = (
+            text_bytes
+            + messages * sys.getsizeof(MessageRecord("user", "", 0.0))
+            + len(self._memory) * (sys.getsizeof(_UserMemory(1, 0.0)) + sys.getsizeof(deque(maxlen=1)))
+        )
+        return {
+            **(self.backend.stats() if self.backend else {"backend": "memory"}),
+            "users": len(self._memory),
+            "max_users": self.max_users,
+            "messages": messages,
+            "approx_kb": round(approx_bytes / 1024, 1),
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
@@ -3,16 +3,26 @@
 # TODO: Graph creation
 
 import os
-from typing import List, Dict, Optional
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Optional, Tuple, Any
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 import logging
 import logging.config
 from dotenv import load_dotenv
 from utils.config import (
-    LOGGING_CONFIG, EMBEDDING_MODEL, VECTOR_STORE_PATH,
-    RAG_SETTINGS, RetrievalError
+    LOGGING_CONFIG, EMBEDDING_MODEL, CHAT_MODEL, VECTOR_STORE_PATH,
+    RAG_SETTINGS, RAG_INDEX_SETTINGS, EMBEDDING_CACHE_SETTINGS, RetrievalError
 )
+from utils.context_packer import PackedContext, pack_context
+from utils.embedding_cache import EmbeddingCache
+from utils.lexical_index import LEXICAL_FILES, LexicalIndex, exact_match_tokens
+from utils.lru_cache import LRUCache, normalize_cache_key
+from utils.vector_index import INDEX_TYPES, MmapVectorStore, index_files
 
 # Настройка логирования
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -36,6 +46,25 @@ class DocumentRetriever:
             self.vector_store_path = vector_store_path
             self.embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
             self.vector_store = None
+            self.lexical_index: Optional[LexicalIndex] = None
+            # Ограниченный пул потоков для поиска FAISS, чтобы не блокировать event loop
+            self._search_executor = ThreadPoolExecutor(
+                max_workers=RAG_SETTINGS['search_workers'],
+                thread_name_prefix="faiss-search"
+            )
+            # Кэш эмбеддингов запросов (память + диск) и кэш результатов поиска по версии хранилища
+            self._embedding_cache = EmbeddingCache(
+                path=EMBEDDING_CACHE_SETTINGS['path'],
+                model=EMBEDDING_MODEL,
+                memory_size=EMBEDDING_CACHE_SETTINGS['memory_size']
+            )
+            self._result_cache = LRUCache(
+                maxsize=RAG_SETTINGS['result_cache_size'],
+                ttl=RAG_SETTINGS['result_cache_ttl']
+            )
+            # Одинаковые запросы, выполняющиеся одновременно, используют один поиск
+            self._inflight: Dict[Tuple, asyncio.Future] = {}
+            self.store_version: str = ""
             self._load_vector_store()
             logger.info("DocumentRetriever успешно инициализирован")
         except Exception as e:
@@ -50,17 +79,86 @@ class DocumentRetriever:
             RetrievalError: при ошибках загрузки векторного хранилища
         """
         try:
-            logger.info(f"Загрузка векторного хранилища из {self.vector_store_path}")
-            self.vector_store = FAISS.load_local(
-                self.vector_store_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
-            logger.info("Векторное хранилище успешно загружено")
+            index_type = RAG_INDEX_SETTINGS['type']
+            if index_type not in INDEX_TYPES:
+                raise RetrievalError(f"Неизвестный тип индекса: {index_type}. Допустимые: {', '.join(INDEX_TYPES)}")
+            logger.info(f"Загрузка векторного хранилища ({index_type}) из {self.vector_store_path}")
+            if index_type == "flat":
+                self.vector_store = FAISS.load_local(
+                    self.vector_store_path,
+                    self.embeddings,
+                    allow_dangerous_deserialization=True
+                )
+            else:
+                # Индекс через memory-mapping и SQLite docstore без pickle
+                self.vector_store = MmapVectorStore.load(self.vector_store_path, index_type)
+            # BM25 индекс по тем же чанкам (строится при загрузке базы знаний)
+            self.lexical_index = LexicalIndex.load(self.vector_store_path)
+            if self.lexical_index is None and RAG_SETTINGS['search_mode'] == "hybrid":
+                logger.warning("BM25 индекс не найден, гибридный поиск отключен. Постройте его: python -m utils.lexical_index")
+            self.store_version = self._compute_store_version()
+            self._result_cache.clear()
+            logger.info(f"Векторное хранилище успешно загружено (версия {self.store_version})")
         except Exception as e:
             logger.error(f"Ошибка при загрузке векторного хранилища: {str(e)}")
             raise RetrievalError(f"Ошибка загрузки векторного хранилища: {str(e)}")
 
+    def _compute_store_version(self) -> str:
+        """Версия хранилища: отпечаток размера и времени изменения файлов индекса."""
+        digest = hashlib.sha1()
+        for name in index_files(RAG_INDEX_SETTINGS['type']) + LEXICAL_FILES:
+            path = os.path.join(self.vector_store_path, name)
+            try:
+                stat = os.stat(path)
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+            except OSError:
+                digest.update(f"{name}:missing;".encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+    def _result_key(self, query: str, k: int, score_threshold: float) -> Tuple:
+        return (self.store_version, normalize_cache_key(query), k, score_threshold)
+
+    @staticmethod
+    def _copy_results(results: List[Dict]) -> List[Dict]:
+        # Вызывающий код может сортировать и изменять список, поэтому наружу отдаем копию
+        return [dict(result) for result in results]
+
+    def _embed_query(self, query: str):
+        """Синхронно возвращает эмбеддинг запроса, используя кэш (память, затем диск)."""
+        embedding = self._embedding_cache.load(query)
+        if embedding is None:
+            embedding = self._embedding_cache.store(query, self.embeddings.embed_query(query))
+        return embedding
+
+    async def _aembed_query(self, query: str):
+        """Асинхронно возвращает эмбеддинг запроса; обращения к SQLite идут в пуле потоков."""
+        embedding = self._embedding_cache.get_cached(query)
+        if embedding is not None:
+            return embedding
+
+        loop = asyncio.get_running_loop()
+        embedding = await loop.run_in_executor(self._search_executor, self._embedding_cache.load, query)
+        if embedding is None:
+            vector = await self.embeddings.aembed_query(query)
+            embedding = await loop.run_in_executor(self._search_executor, self._embedding_cache.store, query, vector)
+        return embedding
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """Эмбеддинг запроса через кэш эмбеддингов (используется и вне поиска, например кэшем ответов)."""
+        try:
+            return await self._aembed_query(query)
+        except Exception as e:
+            logger.error(f"Ошибка при получении эмбеддинга запроса: {str(e)}")
+            raise RetrievalError(f"Ошибка получения эмбеддинга: {str(e)}")
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэшей эмбеддингов и результатов поиска."""
+        return {
+            "embeddings": self._embedding_cache.stats(),
+            "results": self._result_cache.stats(),
+            "store_version": self.store_version,
+        }
+
     def search_similar_documents(
         self,
         query: str,
@@ -83,47 +181,384 @@ class DocumentRetriever:
         """
         try:
             logger.info(f"Поиск документов по запросу: {query}")
+
+            key = self._result_key(query, k, score_threshold)
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                logger.info(f"Результаты поиска взяты из кэша ({len(cached)} документов)")
+                return self._copy_results(cached)
             
-            # Получаем документы с их score
-            docs_and_scores = self.vector_store.similarity_search_with_score(
-                query,
-                k=k
-            )
+            results = self._lexical_only_results(query, k)
+            if results is None:
+                # Получаем документы с их score
+                docs_and_scores = self.vector_store.similarity_search_with_score_by_vector(
+                    self._embed_query(query),
+                    k=self._vector_k(k)
+                )
+                results = self._finalize_results(query, docs_and_scores, k, score_threshold)
+            self._result_cache.set(key, results)
+            logger.info(f"Найдено {len(results)} релевантных документов")
+            return self._copy_results(results)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при поиске документов: {str(e)}")
+            raise RetrievalError(f"Ошибка поиска документов: {str(e)}")
+
+    async def asearch_similar_documents(
+        self,
+        query: str,
+        k: int = RAG_SETTINGS['k'],
+        score_threshold: float = RAG_SETTINGS['score_threshold']
+    ) -> List[Dict]:
+        """
+        Асинхронный поиск похожих документов: эмбеддинг запроса через асинхронный клиент,
+        поиск FAISS в ограниченном пуле потоков.
+        
+        Args:
+            query: текст запроса
+            k: количество документов для возврата
+            score_threshold: минимальный порог схожести (0-1)
             
-            # Фильтруем и форматируем результаты
-            results = []
-            for doc, score in docs_and_scores:
-                # FAISS возвращает L2 distance, конвертируем в косинусное сходство
-                normalized_score = 1.0 / (1.0 + score)
-                
-                if normalized_score >= score_threshold:
-                    results.append({
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "score": normalized_score
-                    })
+        Returns:
+            List[Dict]: список найденных документов с их метаданными и score
             
+        Raises:
+            RetrievalError: при ошибках поиска документов
+        """
+        try:
+            logger.info(f"Асинхронный поиск документов по запросу: {query}")
+
+            key = self._result_key(query, k, score_threshold)
+            cached = self._result_cache.get(key)
+            if cached is not None:
+                logger.info(f"Результаты поиска взяты из кэша ({len(cached)} документов)")
+                return self._copy_results(cached)
+
+            inflight = self._inflight.get(key)
+            while inflight is not None:
+                logger.info("Такой же запрос уже выполняется, ожидаем его результат")
+                try:
+                    return self._copy_results(await asyncio.shield(inflight))
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    # Отменен запрос, начавший поиск (а не этот): выполняем поиск сами
+                    inflight = self._inflight.get(key)
+
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[key] = future
+            try:
+                results = self._lexical_only_results(query, k)
+                if results is None:
+                    embedding = await self._aembed_query(query)
+                    docs_and_scores = await loop.run_in_executor(
+                        self._search_executor,
+                        partial(self.vector_store.similarity_search_with_score_by_vector, embedding, k=self._vector_k(k))
+                    )
+                    results = self._finalize_results(query, docs_and_scores, k, score_threshold)
+                self._result_cache.set(key, results)
+                future.set_result(results)
+            except Exception as e:
+                future.set_exception(e)
+                # Помечаем исключение как полученное, если ожидающих запросов не было
+                future.exception()
+                raise
+            finally:
+                # Поиск отменен (CancelledError): ожидающие повторят его сами
+                if not future.done():
+                    future.cancel()
+                self._inflight.pop(key, None)
+
             logger.info(f"Найдено {len(results)} релевантных документов")
-            return results
+            return self._copy_results(results)
+
+        except Exception as e:
+            logger.error(f"Ошибка при асинхронном поиске документов: {str(e)}")
+            raise RetrievalError(f"Ошибка поиска документов: {str(e)}")
+
+    async def asearch_many(
+        self,
+        queries: List[str],
+        k: int = RAG_SETTINGS['k'],
+        score_threshold: float = RAG_SETTINGS['score_threshold']
+    ) -> List[Dict]:
+        """
+        Пакетный поиск по нескольким запросам: все недостающие эмбеддинги получаются одним
+        запросом к API, поиск FAISS выполняется одной матрицей запросов.
+        Результаты объединяются по рангам (reciprocal rank fusion), дубликаты чанков удаляются.
+        
+        Args:
+            queries: список запросов
+            k: количество документов для возврата на каждый запрос
+            score_threshold: минимальный порог схожести (0-1)
             
+        Returns:
+            List[Dict]: объединенный список документов, отсортированный по релевантности
+            
+        Raises:
+            RetrievalError: при ошибках поиска документов
+        """
+        try:
+            # Убираем пустые и повторяющиеся запросы
+            unique_queries: Dict[str, str] = {}
+            for query in queries:
+                if query and query.strip():
+                    unique_queries.setdefault(normalize_cache_key(query), query)
+            logger.info(f"Пакетный поиск документов по {len(unique_queries)} запросам: {list(unique_queries.values())}")
+
+            per_query_results: List[List[Dict]] = []
+            pending: List[str] = []
+            cached_count = 0
+            for query in unique_queries.values():
+                key = self._result_key(query, k, score_threshold)
+                cached = self._result_cache.get(key)
+                if cached is not None:
+                    cached_count += 1
+                    per_query_results.append(cached)
+                    continue
+                # Короткие запросы с точными токенами ищутся без эмбеддинга
+                results = self._lexical_only_results(query, k)
+                if results is not None:
+                    self._result_cache.set(key, results)
+                    per_query_results.append(results)
+                else:
+                    pending.append(query)
+
+            if pending:
+                loop = asyncio.get_running_loop()
+                embeddings = await self._aembed_queries(pending)
+                rows = await loop.run_in_executor(
+                    self._search_executor,
+                    partial(self._search_by_matrix, np.vstack(embeddings), self._vector_k(k))
+                )
+                for query, docs_and_scores in zip(pending, rows):
+                    results = self._finalize_results(query, docs_and_scores, k, score_threshold)
+                    self._result_cache.set(self._result_key(query, k, score_threshold), results)
+                    per_query_results.append(results)
+
+            merged = self._merge_results(per_query_results)
+            logger.info(
+                f"Найдено {len(merged)} уникальных релевантных документов "
+                f"({cached_count} запросов из кэша, {len(pending)} с эмбеддингом)"
+            )
+            return merged
+
         except Exception as e:
-            logger.error(f"Ошибка при поиске документов: {str(e)}")
+            logger.error(f"Ошибка при пакетном поиске документов: {str(e)}")
             raise RetrievalError(f"Ошибка поиска документов: {str(e)}")
 
+    async def _aembed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Эмбеддинги для списка запросов: из кэша, недостающие - одним запросом к API."""
+        loop = asyncio.get_running_loop()
+        embeddings: List[Optional[np.ndarray]] = []
+        for query in queries:
+            embedding = self._embedding_cache.get_cached(query)
+            if embedding is None:
+                embedding = await loop.run_in_executor(self._search_executor, self._embedding_cache.load, query)
+            embeddings.append(embedding)
+
+        missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            vectors = await self.embeddings.aembed_documents([queries[index] for index in missing])
+            for index, vector in zip(missing, vectors):
+                embeddings[index] = await loop.run_in_executor(
+                    self._search_executor, self._embedding_cache.store, queries[index], vector
+                )
+        return embeddings
+
+    def _search_by_matrix(self, matrix: np.ndarray, k: int) -> List[List[Tuple[Any, float]]]:
+        """Один вызов FAISS для матрицы запросов. Возвращает (документ, L2 distance) для каждого запроса."""
+        store = self.vector_store
+        if isinstance(store, MmapVectorStore):
+            return store.search_by_matrix(matrix, k)
+        vectors = np.array(matrix, dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+
+        distances, indices = store.index.search(vectors, k)
+        rows = []
+        for row_distances, row_indices in zip(distances, indices):
+            docs_and_scores = []
+            for distance, index in zip(row_distances, row_indices):
+                if index == -1:
+                    continue
+                doc = store.docstore.search(store.index_to_docstore_id[index])
+                # InMemoryDocstore возвращает строку с ошибкой, если документ не найден
+                if not hasattr(doc, "page_content"):
+                    logger.warning(f"Документ для индекса {index} не найден в docstore")
+                    continue
+                docs_and_scores.append((doc, float(distance)))
+            rows.append(docs_and_scores)
+        return rows
+
+    def _hybrid_enabled(self) -> bool:
+        return RAG_SETTINGS['search_mode'] == "hybrid" and self.lexical_index is not None
+
+    def _vector_k(self, k: int) -> int:
+        """В гибридном режиме из FAISS берется больше кандидатов для слияния с BM25."""
+        return max(k, RAG_SETTINGS['hybrid_candidates']) if self._hybrid_enabled() else k
+
+    def _documents_by_position(self, positions: List[int]) -> Dict[int, Any]:
+        """Документы по позициям в индексе FAISS (нумерация общая с BM25 индексом)."""
+        store = self.vector_store
+        if isinstance(store, MmapVectorStore):
+            return store.docstore.get_many(positions)
+        documents = {}
+        for position in positions:
+            doc_id = store.index_to_docstore_id.get(position)
+            doc = store.docstore.search(doc_id) if doc_id is not None else None
+            if hasattr(doc, "page_content"):
+                documents[position] = doc
+        return documents
+
+    def _lexical_search(self, query: str, k: int) -> List[Dict]:
+        """BM25 поиск. score нормирован на лучший результат (лучший = 1.0)."""
+        return self._lexical_results(self.lexical_index.search(query, k))
+
+    def _lexical_results(self, hits: List[Tuple[int, float]]) -> List[Dict]:
+        if not hits:
+            return []
+        documents = self._documents_by_position([position for position, _ in hits])
+        top_score = hits[0][1]
+        return [
+            {
+                "content": documents[position].page_content,
+                "metadata": documents[position].metadata,
+                "score": score / top_score,
+            }
+            for position, score in hits
+            if position in documents
+        ]
+
+    def _lexical_only_results(self, query: str, k: int) -> Optional[List[Dict]]:
+        """
+        В гибридном режиме для коротких запросов с точными токенами (хэши, адреса, коды ошибок)
+        возвращает результаты BM25 без обращения к API эмбеддингов. Проходят только документы,
+        содержащие все точные токены запроса. None - нужен векторный поиск.
+        """
+        if not RAG_SETTINGS['lexical_only'] or not self._hybrid_enabled():
+            return None
+        tokens = exact_match_tokens(query, RAG_SETTINGS['lexical_max_query_tokens'])
+        if not tokens:
+            return None
+        hits = [
+            (position, score)
+            for position, score in self.lexical_index.search(query, RAG_SETTINGS['hybrid_candidates'])
+            if self.lexical_index.contains_all(position, tokens)
+        ]
+        results = self._lexical_results(hits[:k])
+        if not results:
+            return None
+        logger.info(f"Лексический поиск без эмбеддинга: {len(results)} документов")
+        return results
+
+    def _finalize_results(self, query: str, docs_and_scores: List[Tuple[Any, float]], k: int,
+                          score_threshold: float) -> List[Dict]:
+        """
+        Векторный режим: фильтрация по порогу. Гибридный режим: слияние FAISS и BM25 через
+        reciprocal rank fusion; BM25 влияет только на порядок, порог проверяется по векторному score,
+        поэтому документ, найденный только BM25, не проходит.
+        """
+        if not self._hybrid_enabled():
+            return self._format_results(docs_and_scores, score_threshold)[:k]
+
+        rrf_k = RAG_SETTINGS['rrf_k']
+        fused: Dict[str, Dict] = {}
+        vector_results = self._format_results(docs_and_scores, 0.0)
+        lexical_results = self._lexical_search(query, RAG_SETTINGS['hybrid_candidates'])
+        for results, from_lexical in ((vector_results, False), (lexical_results, True)):
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result["content"], {**result, "rrf": 0.0, "passes": False})
+                entry["rrf"] += 1.0 / (rrf_k + rank + 1)
+                if not from_lexical:
+                    entry["passes"] = result["score"] >= score_threshold
+
+        # Нормируем так, что документ первый в обоих списках получает score 1.0
+        max_rrf = 2.0 / (rrf_k + 1)
+        ranked = sorted((entry for entry in fused.values() if entry["passes"]), key=lambda x: x["rrf"], reverse=True)
+        return [
+            {"content": entry["content"], "metadata": entry["metadata"], "score": entry["rrf"] / max_rrf}
+            for entry in ranked[:k]
+        ]
+
+    @staticmethod
+    def _merge_results(per_query_results: List[List[Dict]]) -> List[Dict]:
+        """
+        Объединяет результаты нескольких запросов без дубликатов. score разных запросов
+        несопоставимы (косинус, RRF, BM25 относительно лучшего), поэтому списки сливаются
+        по рангам через reciprocal rank fusion; score нормирован так, что чанк, первый
+        во всех списках, получает 1.0.
+        """
+        lists = [results for results in per_query_results if results]
+        if len(lists) == 1:
+            return [dict(result) for result in lists[0]]
+
+        rrf_k = RAG_SETTINGS['rrf_k']
+        fused: Dict[str, Dict] = {}
+        for results in lists:
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result["content"], {**result, "score": 0.0})
+                entry["score"] += 1.0 / (rrf_k + rank + 1)
+
+        max_rrf = len(lists) / (rrf_k + 1)
+        for entry in fused.values():
+            entry["score"] /= max_rrf
+        return sorted(fused.values(), key=lambda x: x["score"], reverse=True)
+
+    @staticmethod
+    def _format_results(docs_and_scores: List[Tuple[Any, float]], score_threshold: float) -> List[Dict]:
+        """Фильтрует и форматирует результаты поиска FAISS."""
+        results = []
+        for doc, score in docs_and_scores:
+            # FAISS возвращает L2 distance, конвертируем в косинусное сходство
+            normalized_score = 1.0 / (1.0 + score)
+            
+            if normalized_score >= score_threshold:
+                results.append({
+                    "content": doc.page_content,
+                    "metadata": doc.metadata,
+                    "score": normalized_score
+                })
+        return results
+
+    @staticmethod
+    def _pack_context(documents: List[Dict], max_tokens: int, query: str) -> PackedContext:
+        """Упаковывает найденные документы в бюджет токенов (по убыванию релевантности)."""
+        packed = pack_context(
+            documents,
+            max_tokens=max_tokens,
+            query=query,
+            duplicate_threshold=RAG_SETTINGS['duplicate_threshold'],
+            trim_sentences=RAG_SETTINGS['trim_sentences'],
+            min_chunk_tokens=RAG_SETTINGS['min_chunk_tokens'],
+            model=CHAT_MODEL,
+        )
+        if packed.text is None:
+            logger.info("Релевантные документы не найдены")
+        else:
+            logger.info(f"Контекст упакован: {packed.summary()}")
+        return packed
+
     def get_relevant_context(
         self,
         query: str,
         max_tokens: int = RAG_SETTINGS['max_tokens']
-    ) -> Optional[str]:
+    ) -> PackedContext:
         """
-        Получение релевантного контекста для запроса с учетом ограничения токенов
+        Получение релевантного контекста для запроса с учетом ограничения токенов:
+        чанки упаковываются жадно по релевантности, почти дубликаты отбрасываются,
+        не помещающийся чанк сокращается до самых релевантных предложений
         
         Args:
             query: текст запроса
             max_tokens: максимальное количество токенов для контекста
             
         Returns:
-            Optional[str]: объединенный контекст из релевантных документов
+            PackedContext: контекст из релевантных документов (text=None, если ничего не найдено)
+                и его размер в токенах
             
         Raises:
             RetrievalError: при ошибках получения контекста
@@ -131,22 +566,62 @@ class DocumentRetriever:
         try:
             # Получаем документы
             documents = self.search_similar_documents(query)
+            return self._pack_context(documents, max_tokens, query)
+            
+        except Exception as e:
+            logger.error(f"Ошибка при получении контекста: {str(e)}")
+            raise RetrievalError(f"Ошибка получения контекста: {str(e)}")
+
+    async def aget_relevant_context(
+        self,
+        query: str,
+        max_tokens: int = RAG_SETTINGS['max_tokens']
+    ) -> PackedContext:
+        """
+        Асинхронная версия get_relevant_context, не блокирующая event loop
+        
+        Args:
+            query: текст запроса
+            max_tokens: максимальное количество токенов для контекста
             
-            if not documents:
-                logger.info("Релевантные документы не найдены")
-                return None
+        Returns:
+            PackedContext: контекст из релевантных документов (text=None, если ничего не найдено)
+                и его размер в токенах
             
-            # Сортируем по релевантности
-            documents.sort(key=lambda x: x["score"], reverse=True)
+        Raises:
+            RetrievalError: при ошибках получения контекста
+        """
+        try:
+            documents = await self.asearch_similar_documents(query)
+            return self._pack_context(documents, max_tokens, query)
             
-            # Объединяем контекст
-            context = "\n\n".join([
-                f"Релевантность: {doc['score']:.2f}\n{doc['content']}"
-                for doc in documents
-            ])
+        except Exception as e:
+            logger.error(f"Ошибка при получении контекста: {str(e)}")
+            raise RetrievalError(f"Ошибка получения контекста: {str(e)}")
+
+    async def aget_relevant_context_many(
+        self,
+        queries: List[str],
+        max_tokens: int = RAG_SETTINGS['max_tokens']
+    ) -> PackedContext:
+        """
+        Объединенный релевантный контекст для нескольких запросов (см. asearch_many)
+        
+        Args:
+            queries: список запросов
+            max_tokens: максимальное количество токенов для контекста
+            
+        Returns:
+            PackedContext: контекст из релевантных документов (text=None, если ничего не найдено)
+                и его размер в токенах
             
-            return context
+        Raises:
+            RetrievalError: при ошибках получения контекста
+        """
+        try:
+            documents = await self.asearch_many(queries)
+            return self._pack_context(documents, max_tokens, " ".join(queries))
             
         except Exception as e:
             logger.error(f"Ошибка при получении контекста: {str(e)}")
-            raise RetrievalError(f"Ошибка получения контекста: {str(e)}")
\ No newline at end of file
+            raise RetrievalError(f"Ошибка получения контекста: {str(e)}")
@@ -0,0 +1,198 @@
+import os
+import json
+import sqlite3
+import logging
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .config import RAG_INDEX_SETTINGS, VectorizationError, RetrievalError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - faiss устанавливается вместе с векторным хранилищем
+    faiss = None
+
+# Поддерживаемые типы индексов (flat - исходное хранилище langchain FAISS)
+INDEX_TYPES = ("flat", "ivfpq", "hnsw", "sq8")
+
+DOCSTORE_FILENAME = "docstore.sqlite"
+
+
+def index_filename(index_type: str) -> str:
+    return f"index_{index_type}.faiss"
+
+
+def index_files(index_type: str) -> List[str]:
+    """Файлы, из которых состоит хранилище данного типа (используются для версии хранилища)."""
+    if index_type == "flat":
+        return ["index.faiss", "index.pkl"]
+    return [index_filename(index_type), DOCSTORE_FILENAME]
+
+
+def factory_string(index_type: str, dimension: int, ntotal: int, settings: Dict[str, Any] = RAG_INDEX_SETTINGS) -> str:
+    """Строка faiss.index_factory для выбранного типа индекса."""
+    if index_type == "hnsw":
+        return f"HNSW{settings['hnsw_m']},Flat"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "ivfpq":
+        nlist = settings.get('ivf_nlist') or max(1, min(int(4 * np.sqrt(ntotal)), ntotal // 39 or 1))
+        pq_m = settings['pq_m']
+        if dimension % pq_m != 0:
+            raise VectorizationError(f"Размерность {dimension} не делится на pq_m={pq_m}")
+        return f"IVF{nlist},PQ{pq_m}"
+    raise VectorizationError(f"Неизвестный тип индекса: {index_type}. Допустимые: {', '.join(INDEX_TYPES)}")
+
+
+class SQLiteDocstore:
+    """
+    Docstore без pickle: документы лежат в SQLite и читаются по позиции в индексе FAISS.
+    Файл открывается только на чтение, поэтому его могут разделять несколько процессов.
+    Соединение открывается лениво в каждом процессе (соединение SQLite нельзя переносить через fork).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._lock = Lock()
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def write(path: str, documents: List[Tuple[str, Document]], settings: Optional[Dict[str, str]] = None) -> None:
+        """
+        Записывает документы в порядке позиций индекса (перезаписывая файл).
+        settings - параметры построения индекса, нужные при поиске (например, normalize_L2).
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(
+                "CREATE TABLE documents (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, "
+                "content TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE TABLE settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", (settings or {}).items())
+            conn.executemany(
+                "INSERT INTO documents (position, doc_id, content, metadata) VALUES (?, ?, ?, ?)",
+                (
+                    (position, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+                    for position, (doc_id, doc) in enumerate(documents)
+                )
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        conn = self._connection()
+        with self._lock:
+            try:
+                row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+            except sqlite3.OperationalError:
+                # Docstore, построенный до появления таблицы settings
+                return default
+        return row[0] if row else default
+
+    def get_many(self, positions: List[int]) -> Dict[int, Document]:
+        if not positions:
+            return {}
+        placeholders = ",".join("?" * len(positions))
+        conn = self._connection()
+        with self._lock:
+            rows = conn.execute(
+                f"SELECT position, content, metadata FROM documents WHERE position IN ({placeholders})",
+                [int(position) for position in positions]
+            ).fetchall()
+        return {
+            position: Document(page_content=content, metadata=json.loads(metadata))
+            for position, content, metadata in rows
+        }
+
+
+class MmapVectorStore:
+    """
+    Хранилище на основе индекса FAISS, загруженного через memory-mapping, и SQLite docstore.
+    Загрузка почти мгновенная, страницы индекса разделяются между процессами через page cache.
+    Если векторы при построении нормализовались (normalize_L2 исходного хранилища), запросы
+    нормализуются так же, поэтому оценки совпадают с flat хранилищем.
+    """
+    def __init__(self, index, docstore: SQLiteDocstore, index_type: str, normalize_L2: bool = False):
+        self.index = index
+        self.docstore = docstore
+        self.index_type = index_type
+        self.normalize_L2 = normalize_L2
+
+    @classmethod
+    def load(cls, store_path: str, index_type: str, settings: Dict[str, Any] = RAG_INDEX_SETTINGS) -> "MmapVectorStore":
+        if faiss is None:
+            raise RetrievalError("Для индексов, отличных от flat, требуется пакет faiss")
+
+        index_path = os.path.join(store_path, index_filename(index_type))
+        docstore_path = os.path.join(store_path, DOCSTORE_FILENAME)
+        for path in (index_path, docstore_path):
+            if not os.path.exists(path):
+                raise RetrievalError(
+                    f"Файл {path} не найден. Постройте индекс: python -m utils.build_index --type {index_type}"
+                )
+
+        index = None
+        if settings.get('mmap', True):
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                logger.warning(f"Индекс {index_type} не поддерживает memory-mapping ({e}), загружаем в память")
+        if index is None:
+            index = faiss.read_index(index_path)
+
+        cls._apply_search_params(index, index_type, settings)
+        logger.info(f"Индекс {index_type} загружен из {index_path}: {index.ntotal} векторов")
+        docstore = SQLiteDocstore(docstore_path)
+        normalize_L2 = docstore.get_setting("normalize_L2") == "1"
+        return cls(index, docstore, index_type, normalize_L2=normalize_L2)
+
+    @staticmethod
+    def _apply_search_params(index, index_type: str, settings: Dict[str, Any]) -> None:
+        params = faiss.ParameterSpace()
+        if index_type == "ivfpq":
+            params.set_index_parameter(index, "nprobe", int(settings['nprobe']))
+        elif index_type == "hnsw":
+            params.set_index_parameter(index, "efSearch", int(settings['ef_search']))
+
+    def search_by_matrix(self, matrix: np.ndarray, k: int) -> List[List[Tuple[Document, float]]]:
+        """Поиск по матрице запросов. Возвращает (документ, L2 distance) для каждого запроса."""
+        vectors = np.array(matrix, dtype=np.float32)
+        if self.normalize_L2:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        distances, indices = self.index.search(np.ascontiguousarray(vectors), k)
+        documents = self.docstore.get_many(sorted({int(i) for i in indices.ravel() if i != -1}))
+
+        rows = []
+        for row_distances, row_indices in zip(distances, indices):
+            docs_and_scores = []
+            for distance, index in zip(row_distances, row_indices):
+                doc = documents.get(int(index))
+                if doc is not None:
+                    docs_and_scores.append((doc, float(distance)))
+            rows.append(docs_and_scores)
+        return rows
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4) -> List[Tuple[Document, float]]:
+        """Совместимо по сигнатуре с langchain FAISS.similarity_search_with_score_by_vector."""
+        return self.search_by_matrix(np.asarray([embedding], dtype=np.float32), k)[0]
+
+
+__all__ = ["INDEX_TYPES", "MmapVectorStore", "SQLiteDocstore", "factory_string", "index_files", "index_filename"]
@@ -0,0 +1,12 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули импортируются и как src.*, и как utils.* (запуск из src/), поэтому нужны оба пути
+for path in (ROOT, os.path.join(ROOT, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# utils.config требует ключ при импорте; сетевые вызовы в тестах не выполняются
+os.environ.setdefault("OPENAI_API_KEY", "test")
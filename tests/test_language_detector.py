@@ -0,0 +1,71 @@
+import pytest
+
+from src.bot_agents.language_detector import LocalLanguageDetector
+
+# Порог LANGUAGE_DETECTOR_CONFIDENCE по умолчанию
+THRESHOLD = 0.7
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return LocalLanguageDetector()
+
+
+@pytest.mark.parametrize("text", [
+    "Contact admin",
+    "Gas fee",
+    "Open app",
+    "Delete account",
+    "Done",
+    "Cool",
+    "Mint NFT",
+    "Airdrop date",
+    "Venom network down",
+    "wen moon",
+    "Salut",
+    "ok",
+])
+def test_short_english_is_never_rejected_locally(detector, text):
+    detection = detector.detect(text)
+    assert detection.is_english or detection.confidence < THRESHOLD
+
+
+@pytest.mark.parametrize("text", [
+    "How do I withdraw my tokens?",
+    "My wallet is not working",
+    "Where is my airdrop?",
+    "Hi, I can't connect my wallet to the site",
+    "Please help",
+])
+def test_english_with_common_words_is_settled_locally(detector, text):
+    detection = detector.detect(text)
+    assert detection.is_english
+    assert detection.confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text, language", [
+    ("Hola, necesito ayuda", "Spanish"),
+    ("Bonjour, je ne peux pas retirer mes tokens", "French"),
+    ("Ich möchte mein Konto löschen", "German"),
+    ("Olá, preciso de ajuda", "Portuguese"),
+    ("Ciao, ho un problema con il wallet", "Italian"),
+    ("Halo, saya tidak bisa login", "Indonesian"),
+    ("Cześć, nie mogę się zalogować", "Polish"),
+    ("Где мой токен?", "Russian"),
+])
+def test_foreign_text_is_rejected_locally(detector, text, language):
+    detection = detector.detect(text)
+    assert not detection.is_english
+    assert detection.language == language
+    assert detection.confidence >= THRESHOLD
+
+
+@pytest.mark.parametrize("text", ["Hola", "Merci beaucoup", "Quiero retirar mis fondos"])
+def test_weak_foreign_evidence_goes_to_agent(detector, text):
+    assert detector.detect(text).confidence < THRESHOLD
+
+
+def test_text_without_letters_is_english(detector):
+    detection = detector.detect("0x52908400098527886E0F7030069857D2E4169EE7 https://example.com")
+    assert detection.is_english
+    assert detection.confidence == 1.0
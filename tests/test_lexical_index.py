@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from utils import rag_retriever
+from utils.lexical_index import LexicalIndex, is_exact_match_query
+from utils.rag_retriever import DocumentRetriever
+
+TEXTS = [
+    "Error ERR-1042 means the node rejected the transaction. Retry in a minute.",
+    "How to withdraw USDT: open the wallet, choose the token and press Send.",
+    "Transaction 0x9f86d081884c7d659a2feaa0c55ad015 was confirmed on chain.",
+    "To withdraw 100 TON, make sure the fee is covered by your balance.",
+]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("ERR-1042", True),
+    ("error ERR-1042", True),
+    ("0x9f86d081884c7d659a2feaa0c55ad015", True),
+    ("EQD4FPq-PRDieyQKkizFTRtSDyucUIqrj0v_zXJmqaDp6_0t", True),
+    ("ERR1042 again", True),
+    ("ERC20 token", False),
+    ("How to withdraw USDT", False),
+    ("Withdraw 100 TON", False),
+    ("web3 wallet", False),
+    ("USDT", False),
+    ("What does error ERR-1042 mean for my transfer", False),
+    ("", False),
+])
+def test_is_exact_match_query(query, expected):
+    assert is_exact_match_query(query, max_tokens=4) is expected
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    documents = {str(position): Document(page_content=text) for position, text in enumerate(TEXTS)}
+    retriever = DocumentRetriever.__new__(DocumentRetriever)
+    retriever.lexical_index = LexicalIndex.build(TEXTS)
+    retriever.vector_store = SimpleNamespace(
+        docstore=InMemoryDocstore(documents),
+        index_to_docstore_id={position: str(position) for position in range(len(TEXTS))},
+    )
+    monkeypatch.setitem(rag_retriever.RAG_SETTINGS, "search_mode", "hybrid")
+    monkeypatch.setitem(rag_retriever.RAG_SETTINGS, "lexical_only", True)
+    return retriever
+
+
+def test_lexical_only_returns_documents_with_exact_token(retriever):
+    results = retriever._lexical_only_results("ERR-1042", k=5)
+    assert [result["content"] for result in results] == [TEXTS[0]]
+
+
+@pytest.mark.parametrize("query", ["How to withdraw USDT", "Withdraw 100 TON", "ERR-9999"])
+def test_lexical_only_falls_back_to_vector_search(retriever, query):
+    assert retriever._lexical_only_results(query, k=5) is None
+
+
+def test_lexical_only_is_disabled_in_vector_mode(retriever, monkeypatch):
+    monkeypatch.setitem(rag_retriever.RAG_SETTINGS, "search_mode", "vector")
+    assert retriever._lexical_only_results("ERR-1042", k=5) is None
+
+
+def test_lexical_only_requires_flag(retriever, monkeypatch):
+    monkeypatch.setitem(rag_retriever.RAG_SETTINGS, "lexical_only", False)
+    assert retriever._lexical_only_results("ERR-1042", k=5) is None
+
+
+def test_contains_all():
+    index = LexicalIndex.build(TEXTS)
+    assert index.contains_all(0, ["err-1042", "node"])
+    assert not index.contains_all(1, ["err-1042"])
+    assert not index.contains_all(0, ["missing"])
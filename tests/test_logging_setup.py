@@ -0,0 +1,29 @@
+import io
+import logging
+import queue
+
+from src.utils.logging_setup import DroppingQueueHandler
+
+
+def test_full_queue_drops_info_but_writes_errors_directly():
+    stream = io.StringIO()
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1), [logging.StreamHandler(stream)])
+    logger = logging.getLogger("tests.logging_setup")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        logger.info("queued")
+        logger.info("dropped")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        logger.removeHandler(handler)
+
+    assert handler.queue.get_nowait().getMessage() == "queued"
+    assert handler.dropped == 1
+    assert handler.direct == 1
+    assert "failed" in stream.getvalue()
+    assert "ValueError: boom" in stream.getvalue()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.utils.memory_backends import SQLiteMemoryBackend
+from src.utils.memory_manager import MemoryManager
+
+
+def test_ring_buffer_keeps_text_in_sync():
+    memory = MemoryManager(max_history_length=3, max_users=None, idle_ttl=None)
+    evicted = []
+    memory.on_evict = lambda user_id, record: evicted.append((user_id, record.text))
+    for index in range(5):
+        memory.add_message(1, "user" if index % 2 == 0 else "assistant", f"message {index}")
+
+    assert [record.text for record in memory.get_history(1)] == ["message 2", "message 3", "message 4"]
+    assert memory.get_history_as_text(1) == "User: message 2\nAssistant: message 3\nUser: message 4"
+    assert evicted == [(1, "message 0"), (1, "message 1")]
+
+
+def test_unknown_user_has_empty_history():
+    memory = MemoryManager(max_users=None, idle_ttl=None)
+    assert memory.get_history(42) == []
+    assert memory.get_history_as_text(42) == ""
+    assert memory.stats()["users"] == 0
+
+
+def test_capacity_eviction_drops_least_recently_used():
+    memory = MemoryManager(max_users=2, idle_ttl=None)
+    forgotten = []
+    memory.on_forget = forgotten.append
+    memory.add_message(1, "user", "a")
+    memory.add_message(2, "user", "b")
+    memory.get_history(1)
+    memory.add_message(3, "user", "c")
+
+    assert memory.get_history(2) == []
+    assert [record.text for record in memory.get_history(1)] == ["a"]
+    assert memory.stats()["evicted_capacity"] == 1
+    assert forgotten == [2]
+
+
+def test_idle_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.memory_manager.time.monotonic", lambda: now[0])
+    memory = MemoryManager(max_users=None, idle_ttl=60)
+    memory.add_message(1, "user", "a")
+    now[0] += 61
+    memory.add_message(2, "user", "b")
+
+    assert memory.get_history(1) == []
+    assert memory.stats()["evicted_idle"] == 1
+
+
+def test_clear_history_notifies_listener():
+    memory = MemoryManager(max_users=None, idle_ttl=None)
+    forgotten = []
+    memory.on_forget = forgotten.append
+    memory.add_message(1, "user", "a")
+    memory.clear_history(1)
+    assert memory.get_history(1) == []
+    assert forgotten == [1]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteMemoryBackend(str(tmp_path / "memory.sqlite"), max_history_length=5)
+    yield backend
+    backend.close()
+
+
+def test_history_survives_restart(backend):
+    first = MemoryManager(max_history_length=5, max_users=None, idle_ttl=None, backend=backend)
+    first.add_message(1, "user", "hello")
+    first.add_message(1, "assistant", "hi")
+    backend.flush()
+
+    second = MemoryManager(max_history_length=5, max_users=None, idle_ttl=None, backend=backend)
+    assert second.get_history_as_text(1) == "User: hello\nAssistant: hi"
+
+
+def test_load_user_reads_backend_off_the_event_loop(backend):
+    memory = MemoryManager(max_history_length=5, max_users=None, idle_ttl=None, backend=backend)
+    memory.add_message(1, "user", "hello")
+    backend.flush()
+    restarted = MemoryManager(max_history_length=5, max_users=None, idle_ttl=None, backend=backend)
+
+    load_threads = []
+    original_load = backend.load
+
+    def load(user_id, limit):
+        load_threads.append(threading.current_thread())
+        return original_load(user_id, limit)
+
+    backend.load = load
+
+    async def handle():
+        await restarted.load_user(1)
+        await restarted.load_user(2)
+        restarted.add_message(1, "assistant", "hi")
+        return restarted.get_history_as_text(1), restarted.get_history(2)
+
+    text, empty = asyncio.run(handle())
+    assert text == "User: hello\nAssistant: hi"
+    assert empty == []
+    # Оба пользователя загружены по одному разу, и не в главном потоке
+    assert len(load_threads) == 2
+    assert threading.main_thread() not in load_threads
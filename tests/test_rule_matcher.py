@@ -0,0 +1,132 @@
+import pytest
+
+from src.rules_manager.matcher import RuleMatcher
+from src.rules_manager.models import Rule
+
+
+def keyword(*keywords, match_type="any"):
+    return {"type": "keyword_match", "keywords": list(keywords), "match_type": match_type}
+
+
+def description(text="The user asks something specific."):
+    return {"type": "description_match", "description": text}
+
+
+def rule(rule_id, priority, *conditions, action="reply", behavioral=False, uses_history=False, **params):
+    if action == "reply" and not params:
+        params = {"response_text": f"{rule_id} reply"}
+    return Rule.model_validate({
+        "rule_id": rule_id,
+        "priority": priority,
+        "is_behavioral": behavioral,
+        "uses_history": uses_history,
+        "conditions": list(conditions),
+        "action": action,
+        "action_params": params,
+    })
+
+
+def matcher(*rules):
+    return RuleMatcher(sorted(rules, key=lambda item: item.priority))
+
+
+def test_first_matching_rule_by_priority_wins():
+    result = matcher(
+        rule("wallet", 5, keyword("wallet")),
+        rule("drop", 1, keyword("spam offer", match_type="all"), action="drop"),
+    ).evaluate("Spam offer for your wallet")
+    assert result.settled
+    assert result.matched_rule.rule_id == "drop"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("test drop please", "drop"),
+    ("TEST DROP PLEASE now", "drop"),
+    ("test drop", None),
+])
+def test_keyword_all_and_case_insensitive(text, expected):
+    result = matcher(rule("drop", 200, keyword("test drop please", match_type="all"), action="drop")).evaluate(text)
+    assert result.settled
+    assert (result.matched_rule.rule_id if result.matched_rule else None) == expected
+
+
+def test_failed_keyword_rejects_rule_without_llm():
+    result = matcher(
+        rule("hamster", 20, keyword("hmstr"), description()),
+        rule("drop", 200, keyword("test drop please"), action="drop"),
+    ).evaluate("test drop please")
+    assert result.settled
+    assert result.matched_rule.rule_id == "drop"
+
+
+def test_unknown_higher_priority_rule_blocks_by_default():
+    result = matcher(
+        rule("describe", 1, description()),
+        rule("drop", 200, keyword("test drop please"), action="drop"),
+    ).evaluate("test drop please")
+    assert not result.settled
+    assert result.pending_rule_ids == ["describe"]
+
+
+def test_keyword_precedence_skips_history_independent_unknown_rule():
+    result = matcher(
+        rule("describe", 1, description()),
+        rule("drop", 200, keyword("test drop please"), action="drop"),
+    ).evaluate("test drop please", keyword_precedence=True)
+    assert result.settled
+    assert result.matched_rule.rule_id == "drop"
+
+
+def test_keyword_precedence_never_skips_history_rule():
+    result = matcher(
+        rule("reask", 1, description(), uses_history=True),
+        rule("drop", 200, keyword("test drop please"), action="drop"),
+    ).evaluate("test drop please", keyword_precedence=True)
+    assert not result.settled
+    assert "reask" in result.pending_rule_ids
+
+
+def test_unknown_behavioral_rule_blocks_reply_that_uses_prompts():
+    rules = (
+        rule("greeting", 1, description(), behavioral=True, behavioral_prompts=["Greet back."]),
+        rule("wallet", 5, keyword("wallet"), system_prompt_key="default_prompt"),
+    )
+    assert not matcher(*rules).evaluate("hello, wallet", keyword_precedence=True).settled
+
+
+def test_unknown_behavioral_rule_does_not_block_direct_action():
+    result = matcher(
+        rule("greeting", 1, description(), behavioral=True, behavioral_prompts=["Greet back."]),
+        rule("drop", 200, keyword("test drop please"), action="drop"),
+    ).evaluate("hi, test drop please")
+    assert result.settled
+    assert result.matched_rule.rule_id == "drop"
+
+
+def test_no_match_is_settled():
+    result = matcher(rule("drop", 200, keyword("test drop please"), action="drop")).evaluate("hello")
+    assert result.settled
+    assert result.matched_rule is None
+
+
+def test_semantic_verdict_does_not_skip_history_rule():
+    rules = matcher(
+        rule("reask", 1, description(), uses_history=True),
+        rule("farewell", 10, description()),
+    )
+    verdicts = {("farewell", 0): "match"}
+    assert not rules.evaluate("thanks, bye", description_verdicts=verdicts).settled
+    verdicts[("reask", 0)] = "no_match"
+    result = rules.evaluate("thanks, bye", description_verdicts=verdicts)
+    assert result.settled
+    assert result.matched_rule.rule_id == "farewell"
+
+
+def test_unknown_rule_with_same_priority_blocks_match():
+    rules = matcher(
+        rule("farewell", 1, description()),
+        rule("birthday", 1, description(), uses_history=True),
+    )
+    result = rules.evaluate("bye", keyword_precedence=True, description_verdicts={("farewell", 0): "match"})
+    assert not result.settled
+    assert result.pending_rule_ids == ["birthday"]